@@ -0,0 +1,101 @@
+"""
+Concurrency benchmark for POST /chat.
+
+The upstream model is replaced by a stub that sleeps for a fixed latency, so
+the numbers show only how well one worker overlaps slow LLM calls. With a
+fully async chat path, N concurrent chats should finish in about the time of
+one.
+
+Usage:
+    python scripts/python/bench/chat_concurrency.py --n 32 --latency 2.0
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_URL", os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models import Base, User, LLMModel, Assistant, Thread
+
+
+def seed(n_threads: int) -> list[int]:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as session:
+        user = User(email="bench@example.com", role="admin")
+        llm_model = LLMModel(name="gpt-4o-mini-2024-07-18")
+        session.add_all([user, llm_model])
+        session.flush()
+        assistant = Assistant(
+            user_id=user.id, name="Bench Assistant", llm_model_id=llm_model.id
+        )
+        session.add(assistant)
+        session.flush()
+        threads = [
+            Thread(user_id=user.id, assistant_id=assistant.id, name=f"Thread {i}")
+            for i in range(n_threads)
+        ]
+        session.add_all(threads)
+        session.commit()
+        return [thread.id for thread in threads]
+
+
+def stub_model(latency: float):
+    async def _call(inputs):
+        await asyncio.sleep(latency)
+        return AIMessage(content=f"echo: {inputs['question']}")
+
+    return RunnableLambda(_call)
+
+
+async def run_chats(client: httpx.AsyncClient, thread_ids: list[int]) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *[
+            client.post("/chat/", json={"thread_id": tid, "input_message": "hi"})
+            for tid in thread_ids
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    failed = [r for r in responses if r.status_code != 200]
+    if failed:
+        raise RuntimeError(f"{len(failed)} requests failed: {failed[0].text}")
+    return elapsed
+
+
+async def main(n: int, latency: float):
+    thread_ids = seed(n)
+    bc_graph.chat_chain = stub_model(latency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await run_chats(client, thread_ids[:1])  # warm up
+        single = await run_chats(client, thread_ids[:1])
+        concurrent = await run_chats(client, thread_ids)
+    await message_writer.close()
+
+    print(f"upstream latency : {latency:.3f}s")
+    print(f"1 chat           : {single:.3f}s")
+    print(f"{n} concurrent chats: {concurrent:.3f}s")
+    print(f"ratio            : {concurrent / single:.2f}x (ideal 1.00x, serial {n}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=32, help="number of concurrent chats")
+    parser.add_argument("--latency", type=float, default=2.0, help="stub LLM latency")
+    args = parser.parse_args()
+    asyncio.run(main(args.n, args.latency))
@@ -0,0 +1,135 @@
+"""
+Concurrent write throughput on SQLite, before and after the engine factory.
+
+"before" is the engine app.database used to build: a default create_engine with
+the rollback journal and synchronous=FULL. "after" is create_db_engine, which
+sets WAL, synchronous=NORMAL, busy_timeout and mmap_size on connect and sizes
+the pool from Settings.
+
+Each worker thread commits one chat turn (a human and an AI message) per
+transaction while reader threads keep listing messages, which is what
+/chat, /messages and /threads do together in production.
+
+Usage:
+    python scripts/python/bench/db_write_throughput.py --writers 16 --turns 200
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import OperationalError
+
+from app.database import create_db_engine, get_database_url
+from app.models import Base, User, LLMModel, Assistant, Thread, Message
+
+
+def seed(engine, n_threads: int) -> list[int]:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": "bench@example.com", "role": "admin"}])
+        conn.execute(insert(LLMModel), [{"name": "gpt-4o-mini-2024-07-18"}])
+        conn.execute(
+            insert(Assistant), [{"user_id": 1, "name": "Bench", "llm_model_id": 1}]
+        )
+        conn.execute(
+            insert(Thread),
+            [
+                {"user_id": 1, "assistant_id": 1, "name": f"T{i}"}
+                for i in range(n_threads)
+            ],
+        )
+    return list(range(1, n_threads + 1))
+
+
+def run(engine, writers: int, readers: int, turns: int) -> tuple[float, int, int]:
+    thread_ids = seed(engine, writers)
+    stop = threading.Event()
+    errors = [0]
+    committed = [0]
+    lock = threading.Lock()
+
+    def writer(thread_id: int):
+        for i in range(turns):
+            now = datetime.now()
+            rows = [
+                {
+                    "thread_id": thread_id,
+                    "ai_generated": ai_generated,
+                    "content": f"turn {i}",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for ai_generated in (False, True)
+            ]
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(Message), rows)
+                with lock:
+                    committed[0] += 1
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(Message.id, Message.content)
+                        .where(Message.thread_id == thread_ids[0])
+                        .order_by(Message.id.desc())
+                        .limit(50)
+                    ).all()
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(t,)) for t in thread_ids]
+    for t in reader_threads:
+        t.start()
+    start = time.perf_counter()
+    for t in writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in reader_threads:
+        t.join()
+    engine.dispose()
+    return elapsed, committed[0], errors[0]
+
+
+def main(writers: int, readers: int, turns: int):
+    workdir = tempfile.mkdtemp()
+
+    before_path = os.path.join(workdir, "before.sqlite")
+    before = create_engine(
+        f"sqlite:///{before_path}", connect_args={"check_same_thread": False}
+    )
+    after = create_db_engine(get_database_url(os.path.join(workdir, "after.sqlite")))
+
+    print(f"{writers} writers x {turns} turns, {readers} readers")
+    for label, engine in (("before", before), ("after", after)):
+        elapsed, committed, errors = run(engine, writers, readers, turns)
+        print(
+            f"{label:<7} {committed / elapsed:9.1f} commits/s  "
+            f"elapsed={elapsed:6.2f}s  committed={committed}  errors={errors}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    main(args.writers, args.readers, args.turns)
@@ -0,0 +1,135 @@
+"""
+History query benchmark: ORM relationship loading vs the column-projected,
+index-backed query used by get_chat_history.
+
+The baseline is what get_chat_history used to do: load the Thread, let
+`lazy="selectin"` pull every Message entity, sort by created_at in Python and
+convert all of them. The projected variants select only the columns needed,
+in index order, and stop after the rows they need.
+
+Usage:
+    python scripts/python/bench/history_query.py --messages 10000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "DATABASE_URL", os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from sqlalchemy import insert, select
+
+from app.ai_cores.context import get_last_messages, load_recent_messages, select_window
+from app.database import AsyncSessionLocal, SessionLocal, engine
+from app.models import Base, User, LLMModel, Assistant, Thread, Message
+
+
+def seed(n_messages: int, n_other_threads: int) -> int:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as session:
+        user = User(email="bench@example.com", role="admin")
+        llm_model = LLMModel(name="gpt-4o-mini-2024-07-18")
+        session.add_all([user, llm_model])
+        session.flush()
+        assistant = Assistant(
+            user_id=user.id, name="Bench Assistant", llm_model_id=llm_model.id
+        )
+        session.add(assistant)
+        session.flush()
+        threads = [
+            Thread(user_id=user.id, assistant_id=assistant.id, name=f"Thread {i}")
+            for i in range(n_other_threads + 1)
+        ]
+        session.add_all(threads)
+        session.flush()
+
+        start = datetime(2025, 1, 1)
+        text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4
+        rows = [
+            {
+                "thread_id": threads[i % len(threads)].id,
+                "ai_generated": (i // len(threads)) % 2 == 1,
+                "content": text,
+                "context": text,
+                "created_at": start + timedelta(seconds=i),
+                "updated_at": start + timedelta(seconds=i),
+            }
+            for i in range(n_messages * len(threads))
+        ]
+        session.execute(insert(Message), rows)
+        session.commit()
+        return threads[0].id
+
+
+async def relationship_history(thread_id: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Thread).where(Thread.id == thread_id))
+        thread = result.scalars().first()
+        return [
+            (
+                AIMessage(content=msg.content)
+                if msg.ai_generated
+                else HumanMessage(content=msg.content)
+            )
+            for msg in sorted(thread.messages, key=lambda x: x.created_at)
+        ]
+
+
+async def projected_last_n(thread_id: int, n: int):
+    async with AsyncSessionLocal() as db:
+        return await get_last_messages(db, thread_id, n)
+
+
+async def projected_budget(thread_id: int, token_budget: int):
+    async with AsyncSessionLocal() as db:
+        tail, _ = await load_recent_messages(db, thread_id, token_budget)
+        return select_window(tail, token_budget)
+
+
+async def measure(label: str, make_call, repeat: int):
+    await make_call()  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        messages = await make_call()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{label:<34} rows={len(messages):>6}  "
+        f"median={statistics.median(timings):8.2f} ms  min={min(timings):8.2f} ms"
+    )
+
+
+async def main(n_messages: int, n_other_threads: int, repeat: int):
+    thread_id = seed(n_messages, n_other_threads)
+    print(f"{n_messages} messages in the benchmark thread, {n_other_threads} other threads")
+    await measure(
+        "relationship + python sort (full)", lambda: relationship_history(thread_id), repeat
+    )
+    await measure(
+        "projected last 50 rows", lambda: projected_last_n(thread_id, 50), repeat
+    )
+    await measure(
+        "projected, 4000 token budget", lambda: projected_budget(thread_id, 4000), repeat
+    )
+    await measure(
+        "projected last N = all rows",
+        lambda: projected_last_n(thread_id, n_messages),
+        repeat,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000, help="messages per thread")
+    parser.add_argument("--other-threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.other_threads, args.repeat))
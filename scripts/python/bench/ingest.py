@@ -0,0 +1,138 @@
+"""
+Ingestion throughput in pages per second, overall and per core.
+
+Writes --files synthetic text files of --pages pages (--words words each)
+into a temporary data directory, queues them in a temporary SQLite
+database and runs the ingestion worker until the queue is empty. It reports:
+
+- end to end: claim, chunk, embed, append and status updates;
+- per core: end to end divided by the number of worker processes;
+- the chunk+embed stage alone, timed in this process on one file.
+
+BLAS and OpenMP are pinned to one thread per process before NumPy is
+imported, so --processes is the number of cores in use.
+
+Usage:
+    python scripts/python/bench/ingest.py --files 200 --pages 20
+    python scripts/python/bench/ingest.py --processes 4 --embedder hashing-256
+"""
+
+import os
+
+for _var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ[_var] = "1"
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "setup hold slack clock tree synthesis insertion delay skew floorplan macro "
+    "placement routing congestion timing path cell library voltage drop power grid "
+    "netlist constraint corner margin buffer inverter latch flop sink source die"
+).split()
+
+
+def write_files(data_dir: str, args) -> list[str]:
+    rng = random.Random(args.seed)
+    os.makedirs(os.path.join(data_dir, "bench"), exist_ok=True)
+    names = []
+    for i in range(args.files):
+        name = f"doc{i}.txt"
+        pages = (" ".join(rng.choices(WORDS, k=args.words)) for _ in range(args.pages))
+        with open(os.path.join(data_dir, "bench", name), "w") as f:
+            f.write("\f".join(pages))
+        names.append(name)
+    return names
+
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Settings are read when `app` is first imported.
+        os.environ["DATABASE_URL"] = os.path.join(tmp_dir, "bench.sqlite")
+        os.environ["RETRIEVAL_DATA_DIR"] = os.path.join(tmp_dir, "indexes")
+        os.environ["INGEST_DATA_DIR"] = os.path.join(tmp_dir, "files")
+        os.environ["RETRIEVAL_EMBEDDER"] = args.embedder
+        return run(args, tmp_dir)
+
+
+def run(args, tmp_dir: str) -> int:
+    from app.ai_cores.ingestion import (
+        FileTask,
+        create_worker,
+        process_file,
+        remove_staged,
+        staging_path,
+    )
+    from app.core.config import settings
+    from app.database import SessionLocal, engine
+    from app.models import AISearchIndex, Base, File
+
+    names = write_files(settings.INGEST_DATA_DIR, args)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        index = AISearchIndex(index_name="bench")
+        db.add(index)
+        db.flush()
+        db.add_all(
+            File(
+                index_id=index.id,
+                name=name,
+                file_dir_name="bench",
+                size=os.path.getsize(os.path.join(settings.INGEST_DATA_DIR, "bench", name)),
+                process_type="text",
+            )
+            for name in names
+        )
+        db.commit()
+
+    path = os.path.join(settings.INGEST_DATA_DIR, "bench", names[0])
+    task = FileTask(-1, "bench", path, "text", staging_path("bench", -1))
+    chunk_words, overlap_words = settings.INGEST_CHUNK_WORDS, settings.INGEST_CHUNK_OVERLAP_WORDS
+    process_file(task, args.embedder, chunk_words, overlap_words)  # warm up
+    start = time.perf_counter()
+    process_file(task, args.embedder, chunk_words, overlap_words)
+    stage_seconds = time.perf_counter() - start
+    remove_staged(task)
+
+    worker = create_worker(args.processes)
+    start = time.perf_counter()
+    worker.run(once=True)
+    seconds = time.perf_counter() - start
+    stats = worker.stats()
+
+    pages_per_second = stats["pages"] / seconds
+    report = {
+        "files": stats["files"],
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "failed": stats["failed"],
+        "processes": worker.processes,
+        "embedder": args.embedder,
+        "seconds": seconds,
+        "pages_per_second": pages_per_second,
+        "pages_per_second_per_core": pages_per_second / worker.processes,
+        "chunk_embed_pages_per_second": args.pages / stage_seconds,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=20, help="pages per file")
+    parser.add_argument("--words", type=int, default=400, help="words per page")
+    parser.add_argument("--processes", type=int, help="INGEST_PROCESSES by default")
+    parser.add_argument("--embedder", default="hashing-256")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,279 @@
+"""
+End-to-end load test of /chat, /threads/{user_id} and /messages/{thread_id}.
+
+Seeds a fresh database with users, threads and message history, points every
+model at the local fake LLM (LLM_PROVIDER=fake, with its latency settings
+taken from the command line), then runs closed-loop workers that each pick
+an endpoint by weight and wait for the answer before sending the next
+request. Reports requests/s and p50/p95/p99 latency per endpoint.
+
+--mode inprocess drives the ASGI app directly, which measures the app
+without the network stack; --mode http starts uvicorn on the seeded
+database and goes through real sockets.
+
+Usage:
+    python scripts/python/bench/load_test.py --mode inprocess --workers 32 --duration 20
+    python scripts/python/bench/load_test.py --mode http --mix chat=1,threads=2,messages=4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+
+def configure(args) -> dict:
+    """Settings for the app under test; set before app modules are imported."""
+    env = {
+        "DATABASE_URL": args.database or os.path.join(tempfile.mkdtemp(), "load.sqlite"),
+        "OPENAI_API_KEY": "sk-bench",
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_TTFT_MS": str(args.ttft_ms),
+        "FAKE_LLM_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+        "FAKE_LLM_OUTPUT_TOKENS": str(args.output_tokens),
+        "WARMUP_ON_STARTUP": "true",
+    }
+    os.environ.update(env)
+    return env
+
+
+def seed(n_users: int, threads_per_user: int, messages_per_thread: int) -> dict:
+    from sqlalchemy import insert
+
+    from app.database import engine
+    from app.models import Assistant, Base, LLMModel, Message, Thread, User
+
+    Base.metadata.create_all(engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [{"email": f"user{i}@example.com", "role": "user"} for i in range(n_users)],
+        )
+        conn.execute(insert(LLMModel), [{"name": "fake/load-test"}])
+        conn.execute(
+            insert(Assistant), [{"user_id": 1, "name": "Load test", "llm_model_id": 1}]
+        )
+        conn.execute(
+            insert(Thread),
+            [
+                {"user_id": user_id, "assistant_id": 1, "name": f"Thread {i}"}
+                for user_id in range(1, n_users + 1)
+                for i in range(threads_per_user)
+            ],
+        )
+        n_threads = n_users * threads_per_user
+        rows = []
+        for thread_id in range(1, n_threads + 1):
+            for i in range(messages_per_thread):
+                created_at = now - timedelta(seconds=messages_per_thread - i)
+                rows.append(
+                    {
+                        "thread_id": thread_id,
+                        "ai_generated": i % 2 == 1,
+                        "content": f"Seeded message {i} of thread {thread_id}. " * 8,
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                    }
+                )
+            if len(rows) >= 10_000:
+                conn.execute(insert(Message), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Message), rows)
+    return {"users": n_users, "threads": n_threads}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"chat", "threads", "messages"}
+    if unknown:
+        raise ValueError(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def make_request(name: str, rng: random.Random, seeded: dict) -> tuple[str, str, dict | None]:
+    if name == "chat":
+        thread_id = rng.randint(1, seeded["threads"])
+        body = {"thread_id": thread_id, "input_message": f"Question {rng.random():.6f}"}
+        return "POST", "/chat/", body
+    if name == "threads":
+        return "GET", f"/threads/{rng.randint(1, seeded['users'])}", None
+    return "GET", f"/messages/{rng.randint(1, seeded['threads'])}", None
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, int(round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def worker(
+    client: httpx.AsyncClient,
+    worker_id: int,
+    weights: dict[str, float],
+    seeded: dict,
+    deadline: float,
+    results: dict[str, dict],
+    seed: int,
+):
+    rng = random.Random(seed + worker_id)
+    names, cum_weights = list(weights), []
+    for weight in weights.values():
+        cum_weights.append((cum_weights[-1] if cum_weights else 0) + weight)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, cum_weights=cum_weights)[0]
+        method, path, body = make_request(name, rng, seeded)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - start
+        result = results[name]
+        result["latencies"].append(elapsed)
+        if not ok:
+            result["errors"] += 1
+
+
+async def run_load(client: httpx.AsyncClient, args, seeded: dict) -> dict:
+    weights = parse_mix(args.mix)
+    results = {name: {"latencies": [], "errors": 0} for name in weights}
+    # Warm up connections, the graph and the model client.
+    for name in weights:
+        method, path, body = make_request(name, random.Random(0), seeded)
+        await client.request(method, path, json=body)
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *[
+            worker(client, i, weights, seeded, deadline, results, args.seed)
+            for i in range(args.workers)
+        ]
+    )
+    return summarize(results, time.perf_counter() - start)
+
+
+def summarize(results: dict[str, dict], elapsed: float) -> dict:
+    report = {}
+    everything = {"latencies": [], "errors": 0}
+    for name, result in results.items():
+        everything["latencies"] += result["latencies"]
+        everything["errors"] += result["errors"]
+    for name, result in {**results, "total": everything}.items():
+        latencies = sorted(result["latencies"])
+        report[name] = {
+            "requests": len(latencies),
+            "errors": result["errors"],
+            "rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return report
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_inprocess(args, seeded: dict) -> dict:
+    from app.ai_cores.message_writer import message_writer
+    from app.main import app, lifespan
+
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-test", timeout=None
+        ) as client:
+            report = await run_load(client, args, seeded)
+        await message_writer.flush()
+    return report
+
+
+async def run_http(args, env: dict, seeded: dict) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(args.server_workers), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+            for _ in range(600):
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.05)
+            else:
+                raise TimeoutError("Server did not start")
+            return await run_load(client, args, seeded)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in report.items():
+        print(
+            f"{name:<10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+        )
+
+
+def main(args) -> int:
+    env = configure(args)
+    seeded = seed(args.users, args.threads_per_user, args.messages_per_thread)
+    if args.mode == "inprocess":
+        report = asyncio.run(run_inprocess(args, seeded))
+    else:
+        report = asyncio.run(run_http(args, env, seeded))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--mix", default="chat=1,threads=2,messages=4",
+                        help="endpoint weights")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads-per-user", type=int, default=20)
+    parser.add_argument("--messages-per-thread", type=int, default=40)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--token-latency-ms", type=float, default=10)
+    parser.add_argument("--output-tokens", type=int, default=50)
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn workers (http)")
+    parser.add_argument("--database", help="SQLite path; a temporary file by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Startup benchmark: `import app.main` and time to the first 200 on `/`.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter and
+prints the slowest modules by cumulative time, then starts uvicorn and polls
+`/` until it answers 200. Both numbers are checked against
+startup_budget.json next to this script; the exit status is 1 when either is
+over budget, so this can run in CI.
+
+Usage:
+    python scripts/python/bench/startup_time.py --repeat 3 --top 15
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+
+def bench_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", os.path.join(tempfile.mkdtemp(), "bench.sqlite"))
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    return env
+
+
+def import_time(env: dict) -> tuple[float, list[tuple[int, str]]]:
+    """Wall time of `import app.main` and (cumulative us, module) per module."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return elapsed, modules
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_200(env: dict, timeout: float = 60) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError(f"No 200 on / within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(repeat: int, top: int) -> int:
+    env = bench_env()
+    with open(BUDGET_PATH) as f:
+        budget = json.load(f)
+
+    imports, first_200 = [], []
+    for _ in range(repeat):
+        elapsed, modules = import_time(env)
+        imports.append(elapsed)
+        first_200.append(time_to_first_200(env))
+
+    print("slowest imports (cumulative, last run):")
+    for cumulative, name in sorted(modules, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    results = {
+        "import_app_main_s": statistics.median(imports),
+        "first_200_s": statistics.median(first_200),
+    }
+    over = False
+    for key, value in results.items():
+        status = "ok" if value <= budget[key] else "OVER BUDGET"
+        over = over or value > budget[key]
+        print(f"{key:<20} median={value:6.3f}s  budget={budget[key]:6.3f}s  {status}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    sys.exit(main(args.repeat, args.top))
@@ -0,0 +1,166 @@
+"""
+Single-core latency and recall of the local vector index.
+
+Builds an index of --rows synthetic chunks whose vectors are drawn around
+--clusters random centers (real embeddings are clustered too; uniformly
+random vectors would leave partitions nothing to exploit), then measures:
+
+- an exact scan per query, and per query within a batch of --batch;
+- partitioned search for each --n-probe, with recall@k against the exact scan.
+
+BLAS and OpenMP are pinned to one thread before NumPy is imported. Query
+embedding is not included; see the hashing embedder line for its cost.
+
+Usage:
+    python scripts/python/bench/vector_search.py --rows 1000000 --dim 256
+    python scripts/python/bench/vector_search.py --rows 200000 --n-probe 8,16,32
+"""
+
+import os
+
+for _var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ[_var] = "1"
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.ai_cores.embeddings import HashingEmbedder
+from app.ai_cores.vector_index import Chunk, VectorIndex, build_index
+
+
+class ClusteredEmbedder:
+    """Ignores the text; row i is a noisy copy of one of the centers."""
+
+    def __init__(self, dim: int, n_clusters: int, noise: float, seed: int):
+        self.name = f"bench-clustered-{dim}"
+        self.dim = dim
+        rng = np.random.default_rng(seed)
+        self.centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+        self.noise = noise
+        self.seed = seed
+
+    def embed(self, texts):
+        rng = np.random.default_rng((self.seed, int(texts[0])))
+        centers = self.centers[rng.integers(0, len(self.centers), len(texts))]
+        noise = rng.standard_normal(centers.shape, dtype=np.float32)
+        return centers + self.noise * noise
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q))
+
+
+def timed(fn, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(args) -> int:
+    if args.dir is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            return run(args, os.path.join(tmp_dir, "bench-index"))
+    return run(args, os.path.join(args.dir, "bench-index"))
+
+
+def run(args, path: str) -> int:
+    embedder = ClusteredEmbedder(args.dim, args.clusters, args.noise, args.seed)
+    if not os.path.exists(path) or args.rebuild:
+        start = time.perf_counter()
+        chunks = (Chunk(str(i), source="bench", page=i) for i in range(args.rows))
+        meta = build_index(path, chunks, embedder, n_lists=args.n_lists, batch_size=8192)
+        print(f"built {meta['count']} rows, {meta['n_lists']} partitions "
+              f"in {time.perf_counter() - start:.1f} s")
+    index = VectorIndex.open(path, embedder=embedder)
+    try:
+        report = measure(index, args)
+    finally:
+        index.db.close()
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def measure(index: VectorIndex, args) -> dict:
+
+    rng = np.random.default_rng(args.seed + 1)
+    rows = rng.integers(0, len(index), args.queries)
+    queries = np.asarray(index.vectors[np.sort(rows)]) + 0.05 * rng.standard_normal(
+        (args.queries, args.dim), dtype=np.float32
+    )
+    # Touch the whole file once so every run reads from the page cache.
+    index._search_all(queries[:1], args.k)
+
+    report = {"rows": len(index), "dim": args.dim, "k": args.k}
+    n_exact = min(args.queries, 20)
+    exact_ms = timed(
+        lambda: [index._search_all(q[None], args.k) for q in queries[:n_exact]], 1
+    )[0] / n_exact
+    batch = queries[: args.batch]
+    batch_ms = timed(lambda: index._search_all(batch, args.k), 3)
+    report["exact_ms"] = exact_ms
+    report["exact_batch_ms_per_query"] = min(batch_ms) / len(batch)
+
+    if index.centroids is not None:
+        _, exact_ids = index.search_vectors(queries, args.k, n_probe=len(index.centroids))
+        for n_probe in args.n_probe:
+            latencies = timed_each(index, queries, args.k, n_probe)
+            _, probed = index.search_vectors(queries, args.k, n_probe=n_probe)
+            recall = np.mean(
+                [len(set(a) & set(b)) / args.k for a, b in zip(exact_ids, probed)]
+            )
+            start = time.perf_counter()
+            index.search_vectors(queries[: args.batch], args.k, n_probe=n_probe)
+            batched = (time.perf_counter() - start) * 1000 / min(args.batch, len(queries))
+            report[f"n_probe={n_probe}"] = {
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "batch_ms_per_query": batched,
+                f"recall@{args.k}": float(recall),
+            }
+
+    hashing = HashingEmbedder(args.dim)
+    text = "how do I fix hold violations after clock tree synthesis"
+    report["hashing_embed_ms"] = min(timed(lambda: hashing.embed([text]), 20))
+    return report
+
+
+def timed_each(index: VectorIndex, queries: np.ndarray, k: int, n_probe: int) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search_vectors(query, k, n_probe=n_probe)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=4096, help="synthetic topics")
+    parser.add_argument("--noise", type=float, default=0.5, help="spread around a topic")
+    parser.add_argument("--n-lists", type=int, help="partitions; sqrt(rows) by default")
+    parser.add_argument("--n-probe", default="8,16,32",
+                        type=lambda value: [int(n) for n in value.split(",")])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=64, help="queries per batched call")
+    parser.add_argument("--dir", help="keep the index here; a temporary directory by default")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild an index kept in --dir")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    sys.exit(main(parser.parse_args()))
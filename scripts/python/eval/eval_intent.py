@@ -0,0 +1,113 @@
+"""
+Offline evaluation of the local intent classifier against LLM labels.
+
+Reports, over a JSONL file of {"input": ..., "intent": ...} rows:
+- how many inputs the local fast path answers (coverage) and how often the
+  LLM fallback would be needed
+- accuracy of the local verdicts against the LLM labels, per stage
+- latency percentiles of the local path
+
+Labels can be produced from a plain text file of questions (one per line)
+with --label-with-llm, which calls few_shot_structured_llm for each of them.
+
+Usage:
+    python scripts/python/eval/eval_intent.py --label-with-llm questions.txt labels.jsonl
+    python scripts/python/eval/eval_intent.py labels.jsonl --model intent_model.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.ai_cores.chains.intent_classifier import (
+    IntentClassifier,
+    load_intent_model,
+    normalize_input,
+)
+from app.core.config import settings
+
+
+async def label_with_llm(questions_path: str, labels_path: str, concurrency: int):
+    from app.ai_cores.chains.intent import few_shot_structured_llm
+
+    with open(questions_path) as f:
+        questions = [line.strip() for line in f if line.strip()]
+    results = await few_shot_structured_llm.abatch(
+        [{"input": q} for q in questions], config={"max_concurrency": concurrency}
+    )
+    with open(labels_path, "w") as f:
+        for question, result in zip(questions, results):
+            f.write(json.dumps({"input": question, "intent": result.intent}) + "\n")
+    print(f"labelled {len(questions)} questions into {labels_path}")
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def evaluate(labels_path: str, model_path: str | None, threshold: float):
+    with open(labels_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    classifier = IntentClassifier(
+        model=load_intent_model(model_path), threshold=threshold, cache_size=0
+    )
+
+    per_source: dict[str, list[bool]] = {}
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        verdict = classifier.classify_local(normalize_input(row["input"]))
+        latencies.append((time.perf_counter() - start) * 1e6)
+        source = verdict.source if verdict else "llm-fallback"
+        per_source.setdefault(source, []).append(
+            verdict is not None and verdict.intent == row["intent"]
+        )
+
+    n = len(rows)
+    local = [
+        ok
+        for source, oks in per_source.items()
+        if source != "llm-fallback"
+        for ok in oks
+    ]
+    print(f"examples           : {n}")
+    print(f"local coverage     : {len(local) / n:.1%}")
+    print(f"llm fallback       : {len(per_source.get('llm-fallback', [])) / n:.1%}")
+    if local:
+        print(f"local accuracy     : {sum(local) / len(local):.1%}")
+    # The fallback returns the LLM's own label, so it is correct by definition.
+    overall = sum(local) + len(per_source.get("llm-fallback", []))
+    print(f"pipeline accuracy  : {overall / n:.1%}")
+    for source, oks in sorted(per_source.items()):
+        if source != "llm-fallback":
+            print(f"  {source:<6} n={len(oks):<6} accuracy={sum(oks) / len(oks):.1%}")
+    if len(latencies) >= 2:
+        print(
+            "local latency (us) : "
+            f"p50={percentile(latencies, 50):.1f} "
+            f"p95={percentile(latencies, 95):.1f} "
+            f"p99={percentile(latencies, 99):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("labels", nargs="?")
+    parser.add_argument("--model", default=settings.INTENT_MODEL_PATH)
+    parser.add_argument(
+        "--threshold", type=float, default=settings.INTENT_CONFIDENCE_THRESHOLD
+    )
+    parser.add_argument(
+        "--label-with-llm",
+        nargs=2,
+        metavar=("QUESTIONS", "LABELS"),
+        help="label a text file of questions with the LLM classifier",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    if args.label_with_llm:
+        asyncio.run(label_with_llm(*args.label_with_llm, args.concurrency))
+    else:
+        evaluate(args.labels, args.model, args.threshold)
@@ -0,0 +1,36 @@
+"""
+Train the local intent model from LLM-labelled examples.
+
+The labels file is JSONL with one {"input": ..., "intent": "no-RAG"|"do-RAG"}
+per line, as written by eval_intent.py --label-with-llm. Point
+INTENT_MODEL_PATH at the output to enable the model in the app.
+
+Usage:
+    python scripts/python/eval/train_intent.py labels.jsonl intent_model.json
+"""
+
+import argparse
+import json
+
+from app.ai_cores.chains.intent_classifier import LinearIntentModel, normalize_input
+
+
+def main(labels_path: str, model_path: str, epochs: int, n_features: int):
+    with open(labels_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    samples = [(normalize_input(row["input"]), row["intent"]) for row in rows]
+    model = LinearIntentModel(n_features=n_features).fit(samples, epochs=epochs)
+    model.save(model_path)
+    correct = sum(model.predict(text).intent == intent for text, intent in samples)
+    print(f"trained on {len(samples)} examples, train accuracy {correct / len(samples):.3f}")
+    print(f"saved {len(model.weights)} weights to {model_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("labels")
+    parser.add_argument("model")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--n-features", type=int, default=1 << 18)
+    args = parser.parse_args()
+    main(args.labels, args.model, args.epochs, args.n_features)
@@ -0,0 +1,249 @@
+"""
+Admission control in front of upstream model calls, per LLMModel.name.
+
+Each model has a request bucket and a token bucket, refilled continuously at
+the provider's per-minute quota (LLM_RATE_LIMITS, or the defaults; 0 means
+unlimited). A call reserves one request and its estimated tokens; when the
+buckets are short it sleeps until the reservation is covered, so callers are
+admitted in arrival order at the quota rate instead of all failing upstream.
+After the call the estimate is corrected with the reported usage.
+
+Waiting is bounded: a call that would wait longer than
+LLM_ADMISSION_MAX_WAIT_SECONDS is rejected with 429, and one that would have
+to queue behind LLM_ADMISSION_MAX_QUEUE others with 503, both carrying the
+seconds after which a retry should pass.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from app.core.config import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is covered, after earlier reservations."""
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float, now: float):
+        # May go negative: that is the debt later callers wait for.
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class ModelGate:
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def reserve(self, tokens: int, max_queue: int, max_wait: float) -> float:
+        """Reserve one request and `tokens`; returns how long to wait first."""
+        with self.lock:
+            now = time.monotonic()
+            delay = 0.0
+            if self.requests is not None:
+                delay = self.requests.delay(1, now)
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.delay(tokens, now))
+            if delay > max_wait:
+                self.rejected += 1
+                raise AdmissionRejected(429, "Upstream rate limit reached", delay)
+            if delay > 0 and self.waiting >= max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(503, "Too many requests waiting upstream", delay)
+            if self.requests is not None:
+                self.requests.take(1, now)
+            if self.tokens is not None:
+                self.tokens.take(tokens, now)
+            self.admitted += 1
+            self.wait_seconds_total += delay
+            self.max_wait_seconds = max(self.max_wait_seconds, delay)
+            if delay > 0:
+                self.waiting += 1
+            return delay
+
+    def cancel(self, tokens: int):
+        with self.lock:
+            now = time.monotonic()
+            if self.requests is not None:
+                self.requests.take(-1, now)
+            if self.tokens is not None:
+                self.tokens.take(-tokens, now)
+
+    def done_waiting(self):
+        with self.lock:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_seconds_total,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+
+@dataclass
+class Ticket:
+    gate: ModelGate
+    tokens: int
+
+    def record_usage(self, usage_metadata: dict | None):
+        """Replace the token estimate with what the provider reported."""
+        if not usage_metadata or self.gate.tokens is None:
+            return
+        with self.gate.lock:
+            self.gate.tokens.take(
+                usage_metadata["total_tokens"] - self.tokens, time.monotonic()
+            )
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limits: dict[str, dict[str, int]],
+        default_rpm: int,
+        default_tpm: int,
+        max_queue: int,
+        max_wait: float,
+    ):
+        self.limits = limits
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._gates: dict[str, ModelGate] = {}
+        self._lock = threading.Lock()
+
+    def gate(self, model_name: str) -> ModelGate:
+        gate = self._gates.get(model_name)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.get(model_name)
+                if gate is None:
+                    limits = self.limits.get(model_name, {})
+                    gate = ModelGate(
+                        limits.get("rpm", self.default_rpm),
+                        limits.get("tpm", self.default_tpm),
+                    )
+                    self._gates[model_name] = gate
+        return gate
+
+    @asynccontextmanager
+    async def admit(self, model_name: str, tokens: int):
+        gate = self.gate(model_name)
+        delay = gate.reserve(tokens, self.max_queue, self.max_wait)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                gate.cancel(tokens)
+                raise
+            finally:
+                gate.done_waiting()
+        yield Ticket(gate, tokens)
+
+    @contextmanager
+    def admit_sync(self, model_name: str, tokens: int):
+        gate = self.gate(model_name)
+        delay = gate.reserve(tokens, self.max_queue, self.max_wait)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                gate.done_waiting()
+        yield Ticket(gate, tokens)
+
+    def clear(self):
+        with self._lock:
+            self._gates.clear()
+
+    def stats(self) -> dict[str, dict]:
+        return {name: gate.stats() for name, gate in list(self._gates.items())}
+
+
+def result_usage(result) -> dict | None:
+    """usage_metadata of a model reply, or of the raw reply of structured output."""
+    if isinstance(result, dict) and "raw" in result:
+        result = result["raw"]
+    return getattr(result, "usage_metadata", None)
+
+
+def with_admission(
+    runnable: Runnable, model_name: str, completion_tokens: int | None = None
+) -> Runnable:
+    """
+    Wrap a chat model (or a chain ending in one) so every call is admitted
+    for `model_name` first. The estimate is the prompt's size plus
+    `completion_tokens` (LLM_COMPLETION_TOKENS_ESTIMATE by default), and is
+    corrected with the reply's usage. Structured output reports usage only
+    with include_raw=True.
+    """
+    from app.ai_cores.context import estimate_tokens
+
+    if completion_tokens is None:
+        completion_tokens = settings.LLM_COMPLETION_TOKENS_ESTIMATE
+
+    def estimate(prompt) -> int:
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        return estimate_tokens(text) + completion_tokens
+
+    def call(prompt, config):
+        with admission.admit_sync(model_name, estimate(prompt)) as ticket:
+            result = runnable.invoke(prompt, config)
+            ticket.record_usage(result_usage(result))
+            return result
+
+    async def acall(prompt, config):
+        async with admission.admit(model_name, estimate(prompt)) as ticket:
+            result = await runnable.ainvoke(prompt, config)
+            ticket.record_usage(result_usage(result))
+            return result
+
+    return RunnableLambda(call, afunc=acall, name=f"admit[{model_name}]")
+
+
+admission = AdmissionController(
+    limits=settings.LLM_RATE_LIMITS,
+    default_rpm=settings.LLM_DEFAULT_RPM,
+    default_tpm=settings.LLM_DEFAULT_TPM,
+    max_queue=settings.LLM_ADMISSION_MAX_QUEUE,
+    max_wait=settings.LLM_ADMISSION_MAX_WAIT_SECONDS,
+)
@@ -1,83 +1,344 @@
-from datetime import datetime
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langchain_core.runnables import RunnableConfig
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import START, MessagesState, StateGraph
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from app.models import Thread, Message
-from app.database import SessionLocal
+from app.core.config import settings
+from app.core.metrics import GRAPH_NODE_SECONDS, GRAPH_ROUTES
+from app.database import AsyncSessionLocal
+from app.ai_cores.admission import admission
+from app.ai_cores.chains.intent_classifier import DO_RAG, NO_RAG, intent_classifier
+from app.ai_cores.context import (
+    count_tokens,
+    get_token_budget,
+    load_recent_messages,
+    select_window,
+)
+from app.ai_cores.graph_registry import GraphConfig, GraphRegistry
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.llms import AssistantConfig, llm_registry
+from app.ai_cores.message_writer import message_writer
+from app.ai_cores.response_cache import cache_namespace, is_cacheable, response_cache
+from app.ai_cores.retrieval import RetrievedChunk, retrievers
+from app.ai_cores.summarizer import summarizer
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 
-def create_chat_model():
+SYSTEM_PROMPT = (
+    "You are a friendly AI Assistant! Your task is to provide clear and concise answers."
+)
+
+
+def route_chat_model(prompt_value, config: RunnableConfig):
+    # The returned client is invoked (or streamed) with the prompt and config.
+    return llm_registry.get_client(config["configurable"]["model_name"])
+
+
+def create_chat_model(system_prompt: str = SYSTEM_PROMPT):
+    # The system prompt is a literal message, not a template: braces in an
+    # assistant's prompt are text, and the same prompt renders to the same
+    # bytes on every turn, so the provider can reuse its cached prefix
+    # (system prompt, rolling summary, then history).
     prompt = ChatPromptTemplate.from_messages(
         [
-            (
-                "system",
-                "You are a friendly AI Assistant! Your task is to provide clear and concise answers.",
-            ),
+            SystemMessage(content=system_prompt),
+            MessagesPlaceholder(variable_name="summary", optional=True),
             MessagesPlaceholder(variable_name="history"),
+            # Retrieved excerpts change every turn, so they go after the
+            # cacheable prefix.
+            MessagesPlaceholder(variable_name="context", optional=True),
             ("human", "{question}"),
         ]
     )
-    return prompt | ChatOpenAI(model="gpt-4o-mini-2024-07-18")
+    return prompt | RunnableLambda(route_chat_model)
+
+
+# Built on first use (or by `warm_up` at startup), not at import.
+default_chain = None
+_build_lock = threading.Lock()
+# assistant id -> (Assistant.updated_at, system prompt, chain) for assistants
+# with their own system prompt, least recently used first. updated_at is the
+# one resolve_assistant last read from the database, so an edit rebuilds the
+# chain within ASSISTANT_CACHE_TTL_SECONDS; the prompt is compared too in case
+# two edits share a timestamp.
+assistant_chains: OrderedDict[int, tuple] = OrderedDict()
+# When set, used for every assistant instead of the chains above; tests and
+# benchmarks put a stub model here.
+chat_chain = None
+
 
+def get_system_prompt(assistant: AssistantConfig | None) -> str:
+    if assistant is None or not assistant.system_prompt:
+        return SYSTEM_PROMPT
+    return assistant.system_prompt
 
-chat_chain = create_chat_model()
+
+def get_chat_chain(assistant: AssistantConfig | None = None):
+    global default_chain
+    if chat_chain is not None:
+        return chat_chain
+    if assistant is None or not assistant.system_prompt:
+        if default_chain is None:
+            with _build_lock:
+                if default_chain is None:
+                    default_chain = create_chat_model()
+        return default_chain
+    cached = assistant_chains.get(assistant.id)
+    if cached is not None and cached[:2] == (assistant.updated_at, assistant.system_prompt):
+        assistant_chains.move_to_end(assistant.id)
+        return cached[2]
+    chain = create_chat_model(assistant.system_prompt)
+    assistant_chains[assistant.id] = (assistant.updated_at, assistant.system_prompt, chain)
+    assistant_chains.move_to_end(assistant.id)
+    while len(assistant_chains) > settings.ASSISTANT_CHAINS_MAX:
+        assistant_chains.popitem(last=False)
+    return chain
+
+
+async def get_chat_history(db: AsyncSession, thread_id: int) -> list[BaseMessage]:
+    history = history_cache.get(thread_id)
+    if history is not None:
+        return history
+    load_clock = history_cache.begin_load(thread_id)
+    try:
+        # Taken before reading, so a write flushed during the read is not lost.
+        unflushed = message_writer.unflushed_messages(thread_id)
+        token_budget = await get_token_budget(db, thread_id)
+        tail, complete = await load_recent_messages(
+            db, thread_id, token_budget, unflushed
+        )
+    except BaseException:
+        history_cache.abort_load(thread_id)
+        raise
+    history_cache.put(thread_id, token_budget, tail, complete, load_clock)
+    return select_window(tail, token_budget)
+
+
+def summary_messages(summary: str | None) -> list[BaseMessage]:
+    if not summary:
+        return []
+    return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")]
 
 
-def get_db_session():
-    with SessionLocal() as session:
-        yield session
+async def add_messages(thread_id: int, messages: list[BaseMessage], durable: bool = False):
+    """
+    Persist messages through the group-commit writer. The history cache sees
+    them immediately; pass durable=True to wait until they are committed.
+    """
+    history_cache.append(thread_id, messages)
+    message_writer.submit(thread_id, messages)
+    if durable or not settings.MESSAGE_WRITE_BEHIND:
+        await message_writer.flush()
 
 
-def get_chat_history(db: Session, thread_id: int) -> list[BaseMessage]:
-    thread = db.query(Thread).filter(Thread.id == thread_id).first()
-    if not thread or not thread.messages:
+def context_messages(context: list[str] | None) -> list[BaseMessage]:
+    if not context:
         return []
+    excerpts = "\n\n".join(context)
     return [
-        (
-            AIMessage(content=msg.content)
-            if msg.ai_generated
-            else HumanMessage(content=msg.content)
-        )
-        for msg in sorted(thread.messages, key=lambda x: x.created_at)
+        SystemMessage(content=f"Relevant excerpts from the knowledge base:\n\n{excerpts}")
     ]
 
 
-def add_messages(db: Session, thread_id: int, messages: list[BaseMessage]):
-    message_objects = [
-        Message(
-            thread_id=thread_id,
-            ai_generated=isinstance(msg, AIMessage),
-            content=msg.content,
-            created_at=datetime.now(),
-            updated_at=datetime.now(),
-        )
-        for msg in messages
-    ]
-    db.bulk_save_objects(message_objects)
-    db.commit()
+class ThreadNotFoundError(Exception):
+    pass
+
+
+async def get_thread_assistant_id(db: AsyncSession, thread_id: int) -> int:
+    # Every thread has an assistant, so None means there is no such thread.
+    assistant_id = await llm_registry.get_thread_assistant_id(db, thread_id)
+    if assistant_id is None:
+        raise ThreadNotFoundError(f"Thread {thread_id} not found")
+    return assistant_id
+
+
+class ChatState(MessagesState):
+    # Set by the intent node on graphs with retrieval.
+    question_intent: str
+    # Retrieved excerpts for this turn.
+    context: list[str]
 
 
-def call_model(state: MessagesState, config: RunnableConfig) -> dict:
-    with next(get_db_session()) as db:
-        thread_id = config["configurable"]["thread_id"]
-        chat_history = get_chat_history(db, thread_id)
-        ai_message = chat_chain.invoke(
-            {"history": chat_history, "question": state["messages"][-1].content}
+async def call_model(state: ChatState, config: RunnableConfig) -> dict:
+    thread_id = config["configurable"]["thread_id"]
+    # Do not hold a DB connection while waiting for the upstream model.
+    async with AsyncSessionLocal() as db:
+        assistant_id = await get_thread_assistant_id(db, thread_id)
+        chat_history = await get_chat_history(db, thread_id)
+        assistant = await llm_registry.resolve_assistant(db, assistant_id)
+        summary = await summarizer.get_summary(db, thread_id)
+    model_name = assistant.model_name
+    system_prompt = get_system_prompt(assistant)
+    # Inputs coalesced into this turn: earlier ones go after the history.
+    chat_history = chat_history + state["messages"][:-1]
+    question = state["messages"][-1].content
+
+    context = context_messages(state.get("context"))
+    # An answer grounded in retrieved excerpts is only valid for them.
+    cacheable = not context and is_cacheable(assistant_id, chat_history)
+    namespace = cache_namespace(system_prompt, model_name)
+    cached_answer = None
+    if cacheable:
+        cached_answer = response_cache.lookup(namespace, question)
+    if cached_answer is not None:
+        ai_message = AIMessage(content=cached_answer)
+    else:
+        configurable = {**config["configurable"], "model_name": model_name}
+        config = {**config, "configurable": configurable}
+        summary_prefix = summary_messages(summary)
+        n_tokens = count_tokens(system_prompt) + count_tokens(question)
+        n_tokens += sum(
+            count_tokens(message.content)
+            for message in summary_prefix + chat_history + context
         )
-        add_messages(db, thread_id, state["messages"] + [ai_message])
+        async with admission.admit(
+            model_name, n_tokens + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+        ) as ticket:
+            ai_message = await get_chat_chain(assistant).ainvoke(
+                {
+                    "summary": summary_prefix,
+                    "history": chat_history,
+                    "context": context,
+                    "question": question,
+                },
+                config,
+            )
+            ticket.record_usage(ai_message.usage_metadata)
+        if cacheable:
+            response_cache.store(namespace, question, ai_message.content)
+    await add_messages(thread_id, state["messages"] + [ai_message])
     return {"messages": ai_message}
 
 
-builder = StateGraph(state_schema=MessagesState)
-builder.add_edge(START, "model")
-builder.add_node("model", call_model)
-chat_graph = builder.compile()
+def timed_node(name: str, node, graph: GraphConfig):
+    async def run(state: ChatState, config: RunnableConfig) -> dict:
+        with GRAPH_NODE_SECONDS.time(graph=graph.name, node=name):
+            return await node(state, config)
+
+    return run
+
+
+async def classify_intent(state: ChatState, config: RunnableConfig) -> dict:
+    question = state["messages"][-1].content
+    try:
+        verdict = await intent_classifier.ainvoke(question)
+    except Exception as e:
+        # Answering without retrieval beats failing the turn.
+        logger.warning(f"Intent classification failed, answering directly: {str(e)}")
+        return {"question_intent": NO_RAG}
+    return {"question_intent": verdict.intent}
+
+
+def format_chunk(chunk: RetrievedChunk) -> str:
+    if not chunk.source:
+        return chunk.text
+    page = f", page {chunk.page}" if chunk.page is not None else ""
+    return f"[{chunk.source}{page}]\n{chunk.text}"
+
+
+async def search_index(index: str, question: str, k: int) -> list[RetrievedChunk]:
+    try:
+        retriever = await retrievers.aget(index)
+        if retriever is None:
+            return []
+        return await retriever.asearch(question, k)
+    except Exception as e:
+        # The other indexes, or no context at all, still give an answer.
+        logger.error(f"Error searching index {index}: {str(e)}")
+        return []
+
+
+def make_retrieve(indexes: tuple[str, ...]):
+    async def retrieve(state: ChatState, config: RunnableConfig) -> dict:
+        question = state["messages"][-1].content
+        k = settings.RETRIEVAL_TOP_K
+        results = await asyncio.gather(
+            *[search_index(index, question, k) for index in indexes]
+        )
+        chunks = sorted(
+            (chunk for result in results for chunk in result),
+            key=lambda chunk: chunk.score,
+            reverse=True,
+        )
+        return {"context": [format_chunk(chunk) for chunk in chunks[:k]]}
+
+    return retrieve
+
+
+def make_router(graph: GraphConfig):
+    def route(state: ChatState) -> str:
+        target = "retrieve" if state.get("question_intent") == DO_RAG else "model"
+        GRAPH_ROUTES.inc(graph=graph.name, route=target)
+        return target
+
+    return route
+
+
+async def summarize(state: ChatState, config: RunnableConfig) -> dict:
+    # Only schedules the rolling summary; it runs after the response.
+    if settings.SUMMARY_ENABLED:
+        summarizer.observe(config["configurable"]["thread_id"], state["messages"])
+    return {}
+
+
+def build_chat_graph(graph: GraphConfig = GraphConfig()):
+    """
+    START -> model -> summarize; with retrieval indexes, an intent node runs
+    first and sends do-RAG questions through retrieve before the model.
+    """
+    builder = StateGraph(state_schema=ChatState)
+    builder.add_node("model", timed_node("model", call_model, graph))
+    builder.add_node("summarize", timed_node("summarize", summarize, graph))
+    if not graph.retrieval_indexes:
+        builder.add_edge(START, "model")
+    else:
+        builder.add_node("intent", timed_node("intent", classify_intent, graph))
+        retrieve = make_retrieve(graph.retrieval_indexes)
+        builder.add_node("retrieve", timed_node("retrieve", retrieve, graph))
+        builder.add_edge(START, "intent")
+        builder.add_conditional_edges("intent", make_router(graph), ["retrieve", "model"])
+        builder.add_edge("retrieve", "model")
+    builder.add_edge("model", "summarize")
+    return builder.compile()
+
+
+graph_registry = GraphRegistry(build_chat_graph)
+
+
+def graph_config(assistant: AssistantConfig | None) -> GraphConfig:
+    if assistant is None:
+        return GraphConfig()
+    return GraphConfig(retrieval_indexes=assistant.retrieval_indexes)
+
+
+def get_chat_graph(graph: GraphConfig = GraphConfig()):
+    return graph_registry.get(graph)
+
+
+async def get_thread_graph(thread_id: int):
+    """The compiled graph for the thread's assistant."""
+    async with AsyncSessionLocal() as db:
+        assistant_id = await get_thread_assistant_id(db, thread_id)
+        assistant = await llm_registry.resolve_assistant(db, assistant_id)
+    return graph_registry.get(graph_config(assistant))
+
+
+def warm_up():
+    """Build the default chain, the graph and the default client ahead of traffic."""
+    try:
+        get_chat_chain()
+        get_chat_graph()
+        llm_registry.get_client(settings.DEFAULT_LLM_MODEL)
+    except Exception as e:
+        logger.warning(f"Warm-up failed, building on first use instead: {str(e)}")
+
 
 if __name__ == "__main__":
     config = {"configurable": {"thread_id": 1}}
@@ -92,6 +353,11 @@ if __name__ == "__main__":
     #     ):
     #         event["messages"][-1].pretty_print()
 
-    input_message = HumanMessage(content="Where is Taipei?")
-    result = chat_graph.invoke({"messages": [input_message]}, config)
+    async def main():
+        input_message = HumanMessage(content="Where is Taipei?")
+        result = await get_chat_graph().ainvoke({"messages": [input_message]}, config)
+        await message_writer.close()
+        return result
+
+    result = asyncio.run(main())
     print(result.get("messages")[-1].content)
@@ -2,13 +2,18 @@
 Reference: https://python.langchain.com/docs/how_to/structured_output/#the-with_structured_output-method
 """
 
+from functools import lru_cache
+
 from dotenv import load_dotenv
 
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain.schema.runnable import RunnableLambda
 
+from app.core.config import settings
+from app.ai_cores.admission import with_admission
+from app.ai_cores.llms import llm_registry
+
 
 load_dotenv()
 
@@ -52,7 +57,30 @@ def callback(result):
     return result  # Ensure the result is returned
 
 
-llm = init_chat_model(model="gpt-4o-mini", model_provider="openai")
-structured_llm = llm.with_structured_output(Intent)
-prompt = ChatPromptTemplate.from_messages([("system", system), ("human", "{input}")])
-few_shot_structured_llm = prompt | structured_llm | RunnableLambda(callback)
+def parsed(result: dict) -> Intent:
+    # with_structured_output(include_raw=True) does not raise on its own.
+    if result["parsing_error"] is not None:
+        raise result["parsing_error"]
+    return result["parsed"]
+
+
+@lru_cache(maxsize=None)
+def get_few_shot_structured_llm():
+    # Built on first use rather than at import; the client comes from the
+    # shared registry and every call passes admission control.
+    llm = llm_registry.get_client(settings.INTENT_LLM_MODEL)
+    # The raw reply carries the usage that corrects the admission estimate.
+    structured_llm = with_admission(
+        llm.with_structured_output(Intent, include_raw=True),
+        settings.INTENT_LLM_MODEL,
+        settings.INTENT_COMPLETION_TOKENS_ESTIMATE,
+    )
+    prompt = ChatPromptTemplate.from_messages([("system", system), ("human", "{input}")])
+    return prompt | structured_llm | RunnableLambda(parsed) | RunnableLambda(callback)
+
+
+def __getattr__(name):
+    # `from app.ai_cores.chains.intent import few_shot_structured_llm` still works.
+    if name == "few_shot_structured_llm":
+        return get_few_shot_structured_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,304 @@
+"""
+Local fast path for intent classification.
+
+Classifies a user message as "no-RAG" or "do-RAG" without an upstream call:
+keyword/regex rules first, then a logistic-regression model over hashed word
+unigrams and bigrams, loaded from a JSON file. Only when neither is confident
+enough does the message go to `few_shot_structured_llm`. Verdicts are cached
+per normalized input.
+
+Train a model with scripts/python/eval/train_intent.py and evaluate it with
+scripts/python/eval/eval_intent.py.
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+from app.core.config import settings
+
+NO_RAG = "no-RAG"
+DO_RAG = "do-RAG"
+
+# Small talk only when the whole message is greetings and punctuation; a
+# greeting followed by a question is left to the model or the LLM.
+GREETING = (
+    r"(hi|hello|hey|yo)( there| everyone| all)?|good (morning|afternoon|evening|night)|"
+    r"thanks?( you)?|thank you( very much| so much)?|bye|goodbye|see you|ok(ay)?|"
+    r"cool|great|how are you( doing)?|what'?s up|who are you|nice to meet you"
+)
+SMALL_TALK = re.compile(rf"^(({GREETING})\b[\s,!.?]*)+$")
+GENERAL_TASK = re.compile(
+    r"\b(weather|translate|joke|poem|story|recipe|what time is it|"
+    r"what day is it|your name)\b"
+)
+EXPLICIT_RAG = re.compile(
+    r"\b(do rag|use rag|search (the )?(docs|documents|knowledge base)|"
+    r"according to (the )?(docs|documents|spec|datasheet))\b"
+)
+# Terms that are unambiguous in this domain; generic words such as "layout",
+# "yield" or "etch" are left to the model or the LLM.
+TECHNICAL_TERMS = re.compile(
+    r"\b(mosfet|finfet|cmos|transistor|clock skew|setup time|hold time|"
+    r"timing (closure|violation|analysis)|drc|lvs|netlist|rtl|verilog|"
+    r"systemverilog|vhdl|logic synthesis|place and route|lithography|euv|"
+    r"duv|photoresist|wafer|leakage current|threshold voltage|"
+    r"parasitic extraction|standard cell|pll|sram|dram|"
+    r"line edge roughness|dopant|gate oxide)\b"
+)
+
+
+def normalize_input(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip("?!. ")
+
+
+@dataclass
+class IntentVerdict:
+    intent: str
+    confidence: float
+    source: str  # "rules", "model", "llm" or "cache"
+
+
+def match_rules(text: str) -> IntentVerdict | None:
+    if EXPLICIT_RAG.search(text):
+        return IntentVerdict(DO_RAG, 1.0, "rules")
+    technical = TECHNICAL_TERMS.search(text)
+    if SMALL_TALK.match(text) and not technical:
+        return IntentVerdict(NO_RAG, 1.0, "rules")
+    if technical:
+        return IntentVerdict(DO_RAG, 0.95, "rules")
+    if GENERAL_TASK.search(text):
+        return IntentVerdict(NO_RAG, 0.95, "rules")
+    return None
+
+
+def hashed_features(text: str, n_features: int) -> list[int]:
+    tokens = re.findall(r"[a-z0-9]+", text)
+    grams = [f"w:{t}" for t in tokens]
+    grams += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return sorted({zlib.crc32(g.encode("utf-8")) % n_features for g in grams})
+
+
+class LinearIntentModel:
+    """Logistic regression over hashed n-grams; predicts P(do-RAG)."""
+
+    def __init__(self, n_features: int = 1 << 18, weights=None, bias: float = 0.0):
+        self.n_features = n_features
+        self.weights: dict[int, float] = dict(weights or {})
+        self.bias = bias
+
+    def predict_proba(self, text: str) -> float:
+        z = self.bias + sum(
+            self.weights.get(f, 0.0) for f in hashed_features(text, self.n_features)
+        )
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def predict(self, text: str) -> IntentVerdict:
+        p = self.predict_proba(text)
+        if p >= 0.5:
+            return IntentVerdict(DO_RAG, p, "model")
+        return IntentVerdict(NO_RAG, 1.0 - p, "model")
+
+    def fit(
+        self,
+        samples: list[tuple[str, str]],
+        epochs: int = 20,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        seed: int = 0,
+    ) -> "LinearIntentModel":
+        """SGD on (normalized text, intent) pairs."""
+        data = [
+            (hashed_features(text, self.n_features), 1.0 if intent == DO_RAG else 0.0)
+            for text, intent in samples
+        ]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, label in data:
+                z = self.bias + sum(self.weights.get(f, 0.0) for f in features)
+                p = 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+                gradient = p - label
+                self.bias -= rate * gradient
+                for f in features:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - rate * (gradient + l2 * w)
+        return self
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "n_features": self.n_features,
+                    "bias": self.bias,
+                    "weights": {str(k): v for k, v in self.weights.items() if v},
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearIntentModel":
+        with open(path) as f:
+            data = json.load(f)
+        weights = {int(k): v for k, v in data["weights"].items()}
+        return cls(data["n_features"], weights, data["bias"])
+
+
+class IntentClassifier:
+    def __init__(
+        self,
+        model: LinearIntentModel | None,
+        threshold: float,
+        cache_size: int,
+        llm_chain=None,
+    ):
+        self.model = model
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._llm_chain = llm_chain
+        self._cache: OrderedDict[str, IntentVerdict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def llm_chain(self):
+        if self._llm_chain is None:
+            from app.ai_cores.chains.intent import get_few_shot_structured_llm
+
+            self._llm_chain = get_few_shot_structured_llm()
+        return self._llm_chain
+
+    def classify_local(self, text: str) -> IntentVerdict | None:
+        """Rules, then the linear model; None when neither is confident."""
+        verdict = match_rules(text)
+        if verdict is None and self.model is not None:
+            verdict = self.model.predict(text)
+        if verdict is not None and verdict.confidence >= self.threshold:
+            return verdict
+        return None
+
+    def _cached(self, key: str) -> IntentVerdict | None:
+        with self._lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+                return IntentVerdict(verdict.intent, verdict.confidence, "cache")
+        return None
+
+    def _remember(self, key: str, verdict: IntentVerdict):
+        with self._lock:
+            self._cache[key] = verdict
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _from_llm(self, result) -> IntentVerdict:
+        return IntentVerdict(result.intent, 1.0, "llm")
+
+    def invoke(self, text: str) -> IntentVerdict:
+        key = normalize_input(text)
+        verdict = self._cached(key)
+        if verdict is None:
+            verdict = self.classify_local(key) or self._from_llm(
+                self.llm_chain.invoke({"input": text})
+            )
+            self._remember(key, verdict)
+        return verdict
+
+    async def ainvoke(self, text: str) -> IntentVerdict:
+        key = normalize_input(text)
+        verdict = self._cached(key)
+        if verdict is None:
+            verdict = self.classify_local(key) or self._from_llm(
+                await self.llm_chain.ainvoke({"input": text})
+            )
+            self._remember(key, verdict)
+        return verdict
+
+    async def abatch_as_completed(
+        self,
+        inputs: Iterable[str] | AsyncIterable[str],
+        max_concurrency: int,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[tuple[int, str, IntentVerdict | Exception]]:
+        """
+        Classify many inputs, yielding (index, input, verdict) as each completes.
+
+        Identical inputs (after normalization) are classified once. Inputs the
+        local fast path cannot decide go to the LLM chain with `abatch`-style
+        concurrency limited to `max_concurrency`. Inputs are consumed in chunks,
+        so an async stream does not have to be read fully first. A failed LLM
+        call yields the exception in place of the verdict.
+        """
+        chunk: list[str] = []
+        offset = 0
+        async for text in _aiter(inputs):
+            chunk.append(text)
+            if len(chunk) >= chunk_size:
+                async for result in self._classify_chunk(chunk, offset, max_concurrency):
+                    yield result
+                offset += len(chunk)
+                chunk = []
+        if chunk:
+            async for result in self._classify_chunk(chunk, offset, max_concurrency):
+                yield result
+
+    async def _classify_chunk(
+        self, texts: list[str], offset: int, max_concurrency: int
+    ) -> AsyncIterator[tuple[int, str, IntentVerdict | Exception]]:
+        by_key: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            by_key.setdefault(normalize_input(text), []).append(i)
+
+        pending: list[str] = []
+        for key, indexes in by_key.items():
+            verdict = self._cached(key) or self.classify_local(key)
+            if verdict is None:
+                pending.append(key)
+                continue
+            if verdict.source != "cache":
+                self._remember(key, verdict)
+            for i in indexes:
+                yield offset + i, texts[i], verdict
+
+        if not pending:
+            return
+        llm_inputs = [{"input": texts[by_key[key][0]]} for key in pending]
+        async for j, result in self.llm_chain.abatch_as_completed(
+            llm_inputs,
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        ):
+            key = pending[j]
+            if isinstance(result, Exception):
+                verdict = result
+            else:
+                verdict = self._from_llm(result)
+                self._remember(key, verdict)
+            for i in by_key[key]:
+                yield offset + i, texts[i], verdict
+
+
+async def _aiter(inputs: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[str]:
+    if hasattr(inputs, "__aiter__"):
+        async for item in inputs:
+            yield item
+    else:
+        for item in inputs:
+            yield item
+
+
+def load_intent_model(path: str | None) -> LinearIntentModel | None:
+    return LinearIntentModel.load(path) if path else None
+
+
+intent_classifier = IntentClassifier(
+    model=load_intent_model(settings.INTENT_MODEL_PATH),
+    threshold=settings.INTENT_CONFIDENCE_THRESHOLD,
+    cache_size=settings.INTENT_CACHE_SIZE,
+)
@@ -0,0 +1,214 @@
+"""
+Token-budgeted context window for the chat history sent upstream.
+
+Walks the thread from the newest message backwards, a page at a time, and
+stops as soon as the next message would not fit the budget, so long threads
+only cost the rows that are actually sent.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable
+
+from sqlalchemy import Row, select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+
+from app.core.config import settings
+from app.models import Assistant, LLMModel, Message, Thread
+
+# Role markers and separators the chat format adds around each message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose with OpenAI tokenizers.
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str) -> Callable[[str], int]:
+    if tokenizer == "estimate":
+        return estimate_tokens
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(tokenizer)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter(settings.HISTORY_TOKENIZER)(text) + MESSAGE_OVERHEAD_TOKENS
+
+
+def resolve_token_budget(assistant_id: int | None, model_name: str | None) -> int:
+    if assistant_id in settings.HISTORY_TOKEN_BUDGET_BY_ASSISTANT:
+        return settings.HISTORY_TOKEN_BUDGET_BY_ASSISTANT[assistant_id]
+    if model_name in settings.HISTORY_TOKEN_BUDGET_BY_MODEL:
+        return settings.HISTORY_TOKEN_BUDGET_BY_MODEL[model_name]
+    return settings.HISTORY_TOKEN_BUDGET
+
+
+async def get_token_budget(db: AsyncSession, thread_id: int) -> int:
+    result = await db.execute(
+        select(Assistant.id, LLMModel.name)
+        .select_from(Thread)
+        .join(Assistant, Assistant.id == Thread.assistant_id)
+        .join(LLMModel, LLMModel.id == Assistant.llm_model_id)
+        .where(Thread.id == thread_id)
+    )
+    row = result.first()
+    if row is None:
+        return settings.HISTORY_TOKEN_BUDGET
+    return resolve_token_budget(row.id, row.name)
+
+
+# Columns needed to rebuild chat messages, plus the (created_at, id) sort key.
+# With ix_messages_thread_id_created_at_id, the ordering and the range below
+# are served by the index; only content is read from the table row.
+history_columns = (Message.id, Message.created_at, Message.ai_generated, Message.content)
+
+
+async def fetch_messages_before(
+    db: AsyncSession,
+    thread_id: int,
+    limit: int,
+    before: tuple[datetime, int] | None = None,
+) -> list[Row]:
+    """Newest-first page of a thread's messages older than `before`."""
+    query = select(*history_columns).where(Message.thread_id == thread_id)
+    if before is not None:
+        created_at, message_id = before
+        query = query.where(
+            or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < message_id),
+            )
+        )
+    query = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+    result = await db.execute(query)
+    return list(result)
+
+
+async def get_last_messages(
+    db: AsyncSession, thread_id: int, n: int
+) -> list[BaseMessage]:
+    """The last `n` messages of a thread, oldest first, selected in SQL."""
+    last_n = (
+        select(*history_columns)
+        .where(Message.thread_id == thread_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(n)
+        .subquery()
+    )
+    result = await db.execute(
+        select(last_n.c.ai_generated, last_n.c.content).order_by(
+            last_n.c.created_at, last_n.c.id
+        )
+    )
+    return [to_chat_message(row.ai_generated, row.content) for row in result]
+
+
+def to_chat_message(ai_generated: bool, content: str) -> BaseMessage:
+    return AIMessage(content=content) if ai_generated else HumanMessage(content=content)
+
+
+async def load_recent_messages(
+    db: AsyncSession,
+    thread_id: int,
+    token_budget: int,
+    unflushed: list[tuple[datetime, BaseMessage]] = (),
+) -> tuple[list[tuple[BaseMessage, int]], bool]:
+    """
+    Load the tail of a thread, oldest first, as (message, n_tokens) pairs.
+
+    `unflushed` are (created_at, message) pairs accepted for the thread but
+    possibly not committed yet; those newer than the latest row in the DB are
+    put on top of it.
+
+    Loading stops at the first message that does not fit the budget. That
+    message is kept as the boundary, so a caller appending newer messages can
+    tell whether the tail still covers a full window. The flag is True when
+    the tail reaches the start of the thread.
+    """
+    tail: list[tuple[BaseMessage, int]] = []
+    used = 0
+    before = None
+    while True:
+        rows = await fetch_messages_before(
+            db, thread_id, settings.HISTORY_FETCH_BATCH, before
+        )
+        page = [
+            (to_chat_message(row.ai_generated, row.content), row.content)
+            for row in rows
+        ]
+        if before is None and unflushed:
+            newest = rows[0].created_at if rows else None
+            page[:0] = [
+                (message, message.content)
+                for created_at, message in reversed(unflushed)
+                if newest is None or created_at > newest
+            ]
+        for message, content in page:
+            n_tokens = count_tokens(content)
+            tail.append((message, n_tokens))
+            used += n_tokens
+            if used > token_budget:
+                tail.reverse()
+                return tail, False
+        if len(rows) < settings.HISTORY_FETCH_BATCH:
+            tail.reverse()
+            return tail, True
+        before = (rows[-1].created_at, rows[-1].id)
+
+
+async def find_window_boundary(
+    db: AsyncSession, thread_id: int, token_budget: int
+) -> int | None:
+    """
+    Id of the newest message that no longer fits the history window; it and
+    everything older are left out of the prompt. None when the whole thread
+    fits.
+    """
+    used = 0
+    before = None
+    while True:
+        rows = await fetch_messages_before(
+            db, thread_id, settings.HISTORY_FETCH_BATCH, before
+        )
+        for row in rows:
+            used += count_tokens(row.content)
+            if used > token_budget:
+                return row.id
+        if len(rows) < settings.HISTORY_FETCH_BATCH:
+            return None
+        before = (rows[-1].created_at, rows[-1].id)
+
+
+def select_window(
+    tail: list[tuple[BaseMessage, int]], token_budget: int
+) -> list[BaseMessage]:
+    """
+    Most recent messages whose total token count fits the budget, oldest
+    first. When older messages were cut, the window never starts with an AI
+    reply whose question was cut off; a thread that fits whole is kept as is.
+    """
+    window: list[BaseMessage] = []
+    used = 0
+    cut = False
+    for message, n_tokens in reversed(tail):
+        if used + n_tokens > token_budget:
+            cut = True
+            break
+        used += n_tokens
+        window.append(message)
+    window.reverse()
+    while cut and window and isinstance(window[0], AIMessage):
+        window.pop(0)
+    return window
+
+
+async def build_chat_context(
+    db: AsyncSession, thread_id: int, token_budget: int
+) -> list[BaseMessage]:
+    tail, _ = await load_recent_messages(db, thread_id, token_budget)
+    return select_window(tail, token_budget)
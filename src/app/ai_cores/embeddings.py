@@ -0,0 +1,85 @@
+"""
+Text embedders for the retrieval indexes.
+
+An embedder turns texts into an (n, dim) float32 matrix of unit-length
+rows, so cosine similarity is a dot product. Every index records the name
+of the embedder it was built with and is searched with the same one.
+"hashing-<dim>" is a local, deterministic embedder (signed feature hashing
+of words and word pairs) for tests and offline development;
+"openai/<model>" embeds through the OpenAI API.
+"""
+
+import re
+import zlib
+from typing import Protocol, Sequence
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+OPENAI_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length in place; all-zero rows stay zero."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def features(self, text: str) -> list[str]:
+        words = WORD.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for i, text in enumerate(texts):
+            for feature in self.features(text):
+                h = zlib.crc32(feature.encode())
+                rows.append(i)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (rows, cols), signs)
+        return normalize(vectors)
+
+
+class LangChainEmbedder:
+    """Adapts a LangChain `Embeddings` model."""
+
+    def __init__(self, embeddings, name: str, dim: int):
+        self.embeddings = embeddings
+        self.name = name
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        return normalize(vectors.reshape(len(texts), self.dim))
+
+
+def get_embedder(name: str) -> Embedder:
+    kind, _, arg = name.partition("-")
+    if kind == "hashing" and arg.isdigit():
+        return HashingEmbedder(int(arg))
+    provider, _, model = name.partition("/")
+    if provider == "openai" and model in OPENAI_DIMENSIONS:
+        from langchain_openai import OpenAIEmbeddings
+
+        embeddings = OpenAIEmbeddings(model=model)
+        return LangChainEmbedder(embeddings, name, OPENAI_DIMENSIONS[model])
+    raise ValueError(f"Unknown embedder: {name}")
@@ -0,0 +1,126 @@
+"""
+Deterministic local chat model for load tests and offline development.
+
+Selected like any other provider: set LLM_PROVIDER="fake", or name an
+LLMModel "fake/<anything>". It waits FAKE_LLM_TTFT_MS before the first
+token and FAKE_LLM_TOKEN_LATENCY_MS per token after it, answers with
+FAKE_LLM_OUTPUT_TOKENS words chosen from the prompt's checksum (the same
+prompt always gets the same answer), and reports usage_metadata the way the
+OpenAI client does, so admission control and token accounting see real
+numbers. Structured output returns FAKE_LLM_STRUCTURED_RESPONSE.
+"""
+
+import asyncio
+import json
+import time
+import zlib
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from app.ai_cores.context import count_tokens
+
+WORDS = (
+    "the clock tree meets timing at the slow corner after buffering "
+    "so setup slack is positive while hold needs a few delay cells"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake"
+    ttft: float = 0.2
+    token_latency: float = 0.01
+    output_tokens: int = 50
+    structured_response: dict = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages: list[BaseMessage]) -> tuple[list[str], dict]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        start = zlib.crc32(prompt.encode())
+        words = [
+            WORDS[(start + i) % len(WORDS)] + " " for i in range(self.output_tokens)
+        ]
+        input_tokens = sum(count_tokens(str(message.content)) for message in messages)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": input_tokens + self.output_tokens,
+        }
+        return words, usage
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        words, usage = self._reply(messages)
+        message = AIMessage(content="".join(words), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _latency(self) -> float:
+        return self.ttft + self.token_latency * max(0, self.output_tokens - 1)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._latency())
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return self._result(messages)
+
+    def _chunks(self, messages: list[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        words, usage = self._reply(messages)
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            chunk = AIMessageChunk(content=word, usage_metadata=usage if last else None)
+            yield ChatGenerationChunk(message=chunk)
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(messages)):
+            time.sleep(self.ttft if i == 0 else self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for i, chunk in enumerate(self._chunks(messages)):
+            await asyncio.sleep(self.ttft if i == 0 else self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(
+        self, schema, *, include_raw: bool = False, **kwargs: Any
+    ) -> Runnable:
+        def result(prompt):
+            parsed = schema(**self.structured_response)
+            if not include_raw:
+                return parsed
+            content = json.dumps(self.structured_response)
+            messages = self._convert_input(prompt).to_messages()
+            input_tokens = sum(count_tokens(str(message.content)) for message in messages)
+            usage = {
+                "input_tokens": input_tokens,
+                "output_tokens": count_tokens(content),
+                "total_tokens": input_tokens + count_tokens(content),
+            }
+            raw = AIMessage(content=content, usage_metadata=usage)
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+        def respond(prompt):
+            time.sleep(self.ttft)
+            return result(prompt)
+
+        async def arespond(prompt):
+            await asyncio.sleep(self.ttft)
+            return result(prompt)
+
+        return RunnableLambda(respond, afunc=arespond, name="fake-structured")
@@ -0,0 +1,50 @@
+"""
+Compiled chat graphs, one per graph configuration.
+
+Compiling a StateGraph validates and wires every node, which is too slow to
+repeat per request; assistants that share a configuration share the
+compiled graph. A configuration is a frozen dataclass, so it is the cache key.
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class GraphConfig:
+    # Indexes searched for do-RAG questions; without any, every turn is
+    # answered directly without classifying it.
+    retrieval_indexes: tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        """Metric label for the graph."""
+        if not self.retrieval_indexes:
+            return "direct"
+        return "rag:" + "+".join(self.retrieval_indexes)
+
+
+class GraphRegistry:
+    def __init__(self, builder: Callable[[GraphConfig], object]):
+        self.builder = builder
+        self._graphs: dict[GraphConfig, object] = {}
+        self._lock = threading.Lock()
+        self.n_builds = 0
+
+    def get(self, config: GraphConfig = GraphConfig()):
+        graph = self._graphs.get(config)
+        if graph is None:
+            with self._lock:
+                graph = self._graphs.get(config)
+                if graph is None:
+                    graph = self._graphs[config] = self.builder(config)
+                    self.n_builds += 1
+        return graph
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+
+    def stats(self) -> dict:
+        return {"graphs": len(self._graphs), "builds": self.n_builds}
@@ -0,0 +1,184 @@
+"""
+In-process LRU cache of converted chat histories, keyed by thread_id.
+
+Each entry holds the tail of a thread as loaded by
+`context.load_recent_messages`: enough messages to fill the thread's token
+budget plus the boundary message that did not fit. `add_messages` appends new
+messages write-through, and the front of the tail is trimmed so that the entry
+never grows past what a window needs. Total size is bounded in bytes of
+message content; least recently used threads are evicted first.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+from app.ai_cores.context import count_tokens, select_window
+
+# Rough per-message cost of the Python objects around the content.
+MESSAGE_OVERHEAD_BYTES = 256
+
+
+def message_size(message: BaseMessage) -> int:
+    return len(str(message.content).encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+@dataclass
+class CachedHistory:
+    token_budget: int
+    complete: bool
+    messages: deque = field(default_factory=deque)  # (message, n_tokens, n_bytes)
+    n_tokens: int = 0
+    n_bytes: int = 0
+
+    def append(self, message: BaseMessage, n_tokens: int):
+        n_bytes = message_size(message)
+        self.messages.append((message, n_tokens, n_bytes))
+        self.n_tokens += n_tokens
+        self.n_bytes += n_bytes
+
+    def trim(self):
+        # Keep one message beyond the budget as the boundary of the window.
+        while self.messages and self.n_tokens - self.messages[0][1] > self.token_budget:
+            _, n_tokens, n_bytes = self.messages.popleft()
+            self.n_tokens -= n_tokens
+            self.n_bytes -= n_bytes
+            self.complete = False
+
+
+class HistoryCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, CachedHistory] = OrderedDict()
+        self._lock = threading.Lock()
+        self._n_bytes = 0
+        self._clock = 0
+        # thread_id -> [in-flight loads, clock of the last write seen meanwhile]
+        self._loads: dict[int, list[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, thread_id: int) -> list[BaseMessage] | None:
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(thread_id)
+            self.hits += 1
+            tail = [(message, n_tokens) for message, n_tokens, _ in entry.messages]
+        return select_window(tail, entry.token_budget)
+
+    def overflows(self, thread_id: int) -> bool | None:
+        """
+        True when the cached thread no longer fits its history window; None
+        when the thread is not cached (or was evicted), so nobody knows here.
+        """
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return None
+            return not entry.complete or entry.n_tokens > entry.token_budget
+
+    def begin_load(self, thread_id: int) -> int:
+        """
+        Call before reading a thread from the DB. The returned clock value is
+        passed to `put`, which drops the result if the thread was written to
+        while it was being loaded.
+        """
+        with self._lock:
+            self._loads.setdefault(thread_id, [0, -1])[0] += 1
+            return self._clock
+
+    def _end_load(self, thread_id: int) -> int:
+        """Finish a load started with `begin_load`; returns its last write clock."""
+        loads = self._loads[thread_id]
+        loads[0] -= 1
+        if loads[0] == 0:
+            del self._loads[thread_id]
+        return loads[1]
+
+    def put(
+        self,
+        thread_id: int,
+        token_budget: int,
+        tail: list[tuple[BaseMessage, int]],
+        complete: bool,
+        load_clock: int,
+    ):
+        entry = CachedHistory(token_budget=token_budget, complete=complete)
+        for message, n_tokens in tail:
+            entry.append(message, n_tokens)
+        entry.trim()
+        with self._lock:
+            if self._end_load(thread_id) > load_clock:
+                return
+            self._store(thread_id, entry)
+
+    def abort_load(self, thread_id: int):
+        with self._lock:
+            self._end_load(thread_id)
+
+    def append(self, thread_id: int, messages: list[BaseMessage]):
+        """Write-through for messages that were just persisted."""
+        sized = [(message, count_tokens(str(message.content))) for message in messages]
+        with self._lock:
+            self._clock += 1
+            if thread_id in self._loads:
+                self._loads[thread_id][1] = self._clock
+            entry = self._entries.pop(thread_id, None)
+            if entry is None:
+                return
+            self._n_bytes -= entry.n_bytes
+            for message, n_tokens in sized:
+                entry.append(message, n_tokens)
+            entry.trim()
+            self._store(thread_id, entry)
+
+    def invalidate(self, thread_id: int):
+        with self._lock:
+            self._clock += 1
+            if thread_id in self._loads:
+                self._loads[thread_id][1] = self._clock
+            entry = self._entries.pop(thread_id, None)
+            if entry is not None:
+                self._n_bytes -= entry.n_bytes
+
+    def clear(self):
+        with self._lock:
+            self._clock += 1
+            for loads in self._loads.values():
+                loads[1] = self._clock
+            self._entries.clear()
+            self._n_bytes = 0
+
+    def _store(self, thread_id: int, entry: CachedHistory):
+        old = self._entries.pop(thread_id, None)
+        if old is not None:
+            self._n_bytes -= old.n_bytes
+        if entry.n_bytes > self.max_bytes:
+            return
+        self._entries[thread_id] = entry
+        self._n_bytes += entry.n_bytes
+        while self._n_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._n_bytes -= evicted.n_bytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._n_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+history_cache = HistoryCache(max_bytes=settings.HISTORY_CACHE_MAX_BYTES)
@@ -0,0 +1,487 @@
+"""
+Ingestion worker: moves File rows from wait-for-process to uploaded, and
+from wait-for-delete to deleted.
+
+The worker claims queued files with a conditional UPDATE (only a row still
+in wait-for-process becomes processing, so two workers never take the same
+file), and streams each one through a process pool: pages are read one at
+a time, split into overlapping word windows and embedded in batches. A
+child writes its chunks and vectors to a staging directory and returns
+only counts. Staged files are then appended to their index in bulk, up to
+INGEST_COMMIT_FILES per new segment. After that their rows become uploaded
+with n_pages in one transaction. Deleted files are tombstoned, and a
+background thread compacts the indexes every INGEST_COMPACT_SECONDS (see
+segments.py); searches keep running on their snapshot throughout.
+
+Crash recovery relies on the order of those steps. A processing file
+whose last_change_at lease (renewed while it is in flight) has run out is
+queued again. When it is claimed again:
+- if the index already has its chunks, it is marked uploaded;
+- if it was staged, the staged result is appended;
+- otherwise it is processed again.
+Completed work is never redone or indexed twice.
+
+Usage:
+    python -m app.ai_cores.ingestion [--processes 4] [--once]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.ai_cores.embeddings import get_embedder
+from app.ai_cores.segments import (
+    append_segment,
+    compact,
+    delete_files,
+    index_names,
+    index_path,
+    open_index,
+)
+from app.ai_cores.vector_index import Chunk
+from app.models import AISearchIndex, File
+
+logger = logging.getLogger(__name__)
+
+WAITING = "wait-for-process"
+PROCESSING = "processing"
+UPLOADED = "uploaded"
+FAILED = "failed"
+UPLOAD_FAILED = "upload-failed"
+WAITING_DELETE = "wait-for-delete"
+DELETED = "deleted"
+DELETE_FAILED = "delete-failed"
+WORD = re.compile(r"\S+")
+
+
+@dataclass(frozen=True)
+class FileTask:
+    file_id: int
+    index_name: str
+    path: str
+    process_type: str
+    # Staging path without extension; see `staged_paths`.
+    staged: str
+
+
+def iter_pages(path: str, process_type: str) -> Iterator[str]:
+    """Text of each page; plain text files separate pages with form feeds."""
+    if process_type == "pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("pypdf is required to ingest pdf files")
+        for page in PdfReader(path).pages:
+            yield page.extract_text() or ""
+        return
+    if process_type not in ("text", "markdown"):
+        raise ValueError(f"Unsupported process_type: {process_type}")
+    with open(path, encoding="utf-8", errors="replace") as f:
+        page = []
+        for line in f:
+            *complete, rest = line.split("\f")
+            for part in complete:
+                page.append(part)
+                yield "".join(page)
+                page = []
+            page.append(rest)
+        if any(part.strip() for part in page):
+            yield "".join(page)
+
+
+def chunk_page(text: str, chunk_words: int, overlap_words: int) -> list[str]:
+    words = WORD.findall(text)
+    step = max(1, chunk_words - overlap_words)
+    return [
+        " ".join(words[start : start + chunk_words])
+        for start in range(0, max(1, len(words) - overlap_words), step)
+        if words[start : start + chunk_words]
+    ]
+
+
+def staging_path(index_name: str, file_id: int) -> str:
+    # Index names cannot start with ".", so this never collides with one.
+    return os.path.join(settings.RETRIEVAL_DATA_DIR, ".staging", index_name, str(file_id))
+
+
+def staged_paths(task: FileTask) -> tuple[str, str]:
+    return f"{task.staged}.jsonl", f"{task.staged}.npy"
+
+
+def is_staged(task: FileTask) -> bool:
+    return os.path.exists(staged_paths(task)[1])
+
+
+@lru_cache(maxsize=None)
+def process_embedder(name: str):
+    return get_embedder(name)
+
+
+def process_file(
+    task: FileTask,
+    embedder_name: str,
+    chunk_words: int,
+    overlap_words: int,
+    batch_size: int = 256,
+) -> dict:
+    """
+    Chunk and embed one file into its staging path (in a pool process).
+    The .npy is renamed into place last and marks the file as staged.
+    """
+    embedder = process_embedder(embedder_name)
+    meta_path, vectors_path = staged_paths(task)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    source = os.path.basename(task.path)
+    n_pages, batch, parts = 0, [], []
+    with open(f"{meta_path}.tmp", "w") as meta:
+        for n_pages, page in enumerate(iter_pages(task.path, task.process_type), 1):
+            for text in chunk_page(page, chunk_words, overlap_words):
+                meta.write(json.dumps({"text": text, "page": n_pages}) + "\n")
+                batch.append(text)
+                if len(batch) == batch_size:
+                    parts.append(embedder.embed(batch))
+                    batch = []
+        if batch:
+            parts.append(embedder.embed(batch))
+        meta.write(json.dumps({"source": source, "n_pages": n_pages}) + "\n")
+    vectors = np.concatenate(parts) if parts else np.empty((0, embedder.dim), np.float32)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    with open(f"{vectors_path}.tmp", "wb") as f:
+        np.save(f, vectors.astype(np.float32))
+    os.replace(f"{vectors_path}.tmp", vectors_path)
+    return {"file_id": task.file_id, "n_pages": n_pages, "n_chunks": len(vectors)}
+
+
+def load_staged(task: FileTask) -> tuple[list[Chunk], np.ndarray, int] | None:
+    meta_path, vectors_path = staged_paths(task)
+    if not os.path.exists(vectors_path):
+        return None
+    with open(meta_path) as f:
+        rows = [json.loads(line) for line in f]
+    footer = rows.pop()
+    chunks = [
+        Chunk(row["text"], footer["source"], row["page"], task.file_id) for row in rows
+    ]
+    return chunks, np.load(vectors_path), footer["n_pages"]
+
+
+def remove_staged(task: FileTask):
+    for path in staged_paths(task):
+        for name in (path, f"{path}.tmp"):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+class IngestionWorker:
+    def __init__(
+        self,
+        session_factory,
+        processes: int,
+        commit_files: int,
+        lease_seconds: float,
+        poll_seconds: float,
+        embedder_name: str,
+        chunk_words: int,
+        overlap_words: int,
+        compact_seconds: float = 0,
+    ):
+        self.session_factory = session_factory
+        self.processes = processes
+        self.commit_files = commit_files
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.embedder_name = embedder_name
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.compact_seconds = compact_seconds
+        self.n_files = 0
+        self.n_pages = 0
+        self.n_chunks = 0
+        self.n_failed = 0
+        self.n_resumed = 0
+        self.n_deleted = 0
+        self.n_compactions = 0
+
+    def requeue_expired(self, db: Session) -> int:
+        """Queue again the files whose worker stopped renewing their lease."""
+        expired = datetime.now() - timedelta(seconds=self.lease_seconds)
+        result = db.execute(
+            update(File)
+            .where(File.status == PROCESSING, File.last_change_at < expired)
+            .values(status=WAITING, last_change_at=datetime.now())
+        )
+        db.commit()
+        return result.rowcount
+
+    def claim(self, db: Session, limit: int) -> list[FileTask]:
+        rows = db.execute(
+            select(
+                File.id, File.file_dir_name, File.name, File.process_type,
+                AISearchIndex.index_name,
+            )
+            .join(AISearchIndex, File.index_id == AISearchIndex.id)
+            .where(File.status == WAITING)
+            .order_by(File.id)
+            .limit(limit)
+        ).all()
+        tasks = []
+        for row in rows:
+            # Compare-and-set: another worker may have claimed it meanwhile.
+            result = db.execute(
+                update(File)
+                .where(File.id == row.id, File.status == WAITING)
+                .values(status=PROCESSING, last_change_at=datetime.now())
+            )
+            if result.rowcount == 1:
+                path = os.path.join(settings.INGEST_DATA_DIR, row.file_dir_name, row.name)
+                staged = staging_path(row.index_name, row.id)
+                tasks.append(
+                    FileTask(row.id, row.index_name, path, row.process_type, staged)
+                )
+        db.commit()
+        return tasks
+
+    def renew(self, db: Session, file_ids: list[int]):
+        if file_ids:
+            db.execute(
+                update(File)
+                .where(File.id.in_(file_ids), File.status == PROCESSING)
+                .values(last_change_at=datetime.now())
+            )
+            db.commit()
+
+    def set_status(
+        self, db: Session, file_ids: list[int], status: str, current: str = PROCESSING
+    ) -> list[int]:
+        """Move the files still in `current` to `status`; returns the others."""
+        moved = []
+        for file_id in file_ids:
+            result = db.execute(
+                update(File)
+                .where(File.id == file_id, File.status == current)
+                .values(status=status, last_change_at=datetime.now())
+            )
+            if result.rowcount == 1:
+                moved.append(file_id)
+        db.commit()
+        return [file_id for file_id in file_ids if file_id not in moved]
+
+    def delete_queued(self, db: Session) -> int:
+        """Tombstone the chunks of wait-for-delete files, then mark them deleted."""
+        rows = db.execute(
+            select(File.id, AISearchIndex.index_name)
+            .join(AISearchIndex, File.index_id == AISearchIndex.id)
+            .where(File.status == WAITING_DELETE)
+            .order_by(File.id)
+        ).all()
+        by_index: dict[str, list[int]] = {}
+        for row in rows:
+            by_index.setdefault(row.index_name, []).append(row.id)
+        for index_name, file_ids in by_index.items():
+            try:
+                delete_files(index_path(index_name), file_ids)
+            except Exception as e:
+                logger.error(
+                    f"Error deleting {len(file_ids)} files from index {index_name}: {str(e)}"
+                )
+                self.set_status(db, file_ids, DELETE_FAILED, current=WAITING_DELETE)
+                continue
+            self.set_status(db, file_ids, DELETED, current=WAITING_DELETE)
+            self.n_deleted += len(file_ids)
+        return len(rows)
+
+    def compact_all(self):
+        for name in index_names():
+            try:
+                if compact(index_path(name)) is not None:
+                    self.n_compactions += 1
+            except Exception as e:
+                logger.error(f"Error compacting index {name}: {str(e)}")
+
+    def compact_loop(self, stop: threading.Event):
+        while not stop.wait(self.compact_seconds):
+            self.compact_all()
+
+    def commit(self, db: Session, index_name: str, tasks: list[FileTask]):
+        """Append the staged files of one index, then mark them uploaded."""
+        chunks, parts, n_pages = [], [], {}
+        indexed = open_index(index_name)
+        try:
+            for task in tasks:
+                if indexed is not None and indexed.has_file(task.file_id):
+                    # Appended before a crash; only the status was lost.
+                    n_pages[task.file_id] = load_staged(task)[2]
+                    continue
+                file_chunks, vectors, n_pages[task.file_id] = load_staged(task)
+                chunks += file_chunks
+                parts.append(vectors)
+        finally:
+            if indexed is not None:
+                indexed.close()
+        try:
+            if chunks:
+                append_segment(
+                    index_path(index_name),
+                    chunks,
+                    np.concatenate(parts),
+                    get_embedder(self.embedder_name),
+                )
+        except Exception as e:
+            logger.error(f"Error appending {len(tasks)} files to index {index_name}: {str(e)}")
+            self.set_status(db, [task.file_id for task in tasks], UPLOAD_FAILED)
+            self.n_failed += len(tasks)
+            return
+        moved = []
+        for task in tasks:
+            result = db.execute(
+                update(File)
+                .where(File.id == task.file_id, File.status == PROCESSING)
+                .values(
+                    status=UPLOADED,
+                    n_pages=n_pages[task.file_id],
+                    last_change_at=datetime.now(),
+                )
+            )
+            moved += [task.file_id] * result.rowcount
+        db.commit()
+        gone = db.scalars(
+            select(File.id).where(
+                File.id.in_([task.file_id for task in tasks if task.file_id not in moved]),
+                File.status.in_([WAITING_DELETE, DELETED]),
+            )
+        ).all()
+        if gone:
+            # Deleted while being processed, possibly already marked deleted
+            # by another worker that found no chunks to tombstone.
+            delete_files(index_path(index_name), gone)
+        for task in tasks:
+            remove_staged(task)
+        self.n_files += len(tasks)
+        self.n_pages += sum(n_pages.values())
+        self.n_chunks += len(chunks)
+
+    def run(self, once: bool = False):
+        """
+        Process queued files until stopped; with `once`, compact once the
+        queue is empty and return.
+        """
+        stop = threading.Event()
+        if self.compact_seconds > 0:
+            compactor = threading.Thread(
+                target=self.compact_loop, args=(stop,), name="compactor", daemon=True
+            )
+            compactor.start()
+        try:
+            self.process_queue(once)
+        finally:
+            stop.set()
+        if once:
+            self.compact_all()
+
+    def process_queue(self, once: bool):
+        in_flight: dict[Future, FileTask] = {}
+        staged: list[FileTask] = []
+        last_renewal = time.monotonic()
+        with ProcessPoolExecutor(self.processes) as pool, self.session_factory() as db:
+            self.requeue_expired(db)
+            while True:
+                n_deletes = self.delete_queued(db)
+                # Keep every process busy with one file queued behind it.
+                claimed = self.claim(db, 2 * self.processes - len(in_flight))
+                for task in claimed:
+                    if is_staged(task):
+                        self.n_resumed += 1
+                        staged.append(task)
+                    else:
+                        future = pool.submit(
+                            process_file,
+                            task,
+                            self.embedder_name,
+                            self.chunk_words,
+                            self.overlap_words,
+                        )
+                        in_flight[future] = task
+                if in_flight:
+                    done, _ = wait(
+                        in_flight, timeout=self.poll_seconds, return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        task = in_flight.pop(future)
+                        try:
+                            future.result()
+                            staged.append(task)
+                        except Exception as e:
+                            logger.error(f"Error processing file_id {task.file_id}: {str(e)}")
+                            remove_staged(task)
+                            self.set_status(db, [task.file_id], FAILED)
+                            self.n_failed += 1
+                if staged and (len(staged) >= self.commit_files or not in_flight):
+                    for index_name in sorted({task.index_name for task in staged}):
+                        self.commit(
+                            db, index_name, [t for t in staged if t.index_name == index_name]
+                        )
+                    staged = []
+                if time.monotonic() - last_renewal > self.lease_seconds / 3:
+                    self.renew(db, [t.file_id for t in [*in_flight.values(), *staged]])
+                    self.requeue_expired(db)
+                    last_renewal = time.monotonic()
+                if not (n_deletes or claimed or in_flight or staged):
+                    if once:
+                        return
+                    time.sleep(self.poll_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "files": self.n_files,
+            "pages": self.n_pages,
+            "chunks": self.n_chunks,
+            "failed": self.n_failed,
+            "resumed": self.n_resumed,
+            "deleted": self.n_deleted,
+            "compactions": self.n_compactions,
+        }
+
+
+def create_worker(processes: int | None = None) -> IngestionWorker:
+    from app.database import SessionLocal
+
+    return IngestionWorker(
+        SessionLocal,
+        processes=processes or settings.INGEST_PROCESSES or os.cpu_count() or 1,
+        commit_files=settings.INGEST_COMMIT_FILES,
+        lease_seconds=settings.INGEST_LEASE_SECONDS,
+        poll_seconds=settings.INGEST_POLL_SECONDS,
+        embedder_name=settings.RETRIEVAL_EMBEDDER,
+        chunk_words=settings.INGEST_CHUNK_WORDS,
+        overlap_words=settings.INGEST_CHUNK_OVERLAP_WORDS,
+        compact_seconds=settings.INGEST_COMPACT_SECONDS,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued files into their indexes.")
+    parser.add_argument("--processes", type=int, help="pool size; INGEST_PROCESSES by default")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    worker = create_worker(args.processes)
+    worker.run(once=args.once)
+    logger.info(f"Ingestion stats: {worker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,272 @@
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
+"""
+Registry of chat model clients, one per (provider, deployment).
 
-aoai_gpt4o = AzureChatOpenAI(model="gpt-4o")
-openai_gpt4o = ChatOpenAI(model="gpt-4o")
+An assistant points at an LLMModel whose name is the deployment; prefix it
+with "azure/" to use an Azure OpenAI deployment instead of LLM_PROVIDER, or
+with "fake/" for the local FakeChatModel.
+Each distinct deployment gets one client, built on first use, and all
+clients share one httpx connection pool per provider, so a chat turn pays
+neither client construction nor TLS setup. The assistant -> deployment
+mapping is cached as well, together with the assistant's system prompt,
+updated_at and retrieval indexes; the llm_models and assistants routers
+invalidate it when those records change, and entries expire after
+ASSISTANT_CACHE_TTL_SECONDS so that changes made elsewhere (another
+worker, an index being deactivated or relinked) are picked up too.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+
+from app.core.config import settings
+from app.core.metrics import LLM_REQUEST_SECONDS, LLM_TTFT_SECONDS
+from app.models import (
+    AISearchIndex,
+    Assistant,
+    LLMModel,
+    Thread,
+    assistant_index_association,
+)
+
+PROVIDERS = ("openai", "azure", "fake")
+
+
+def parse_deployment(model_name: str) -> tuple[str, str]:
+    """'azure/gpt-4o' -> ('azure', 'gpt-4o'); a bare name uses LLM_PROVIDER."""
+    provider, sep, deployment = model_name.partition("/")
+    if sep and provider in PROVIDERS:
+        return provider, deployment
+    return settings.LLM_PROVIDER, model_name
+
+
+def create_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    limits = httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+    )
+    timeout = httpx.Timeout(settings.LLM_HTTP_TIMEOUT)
+    return (
+        httpx.Client(limits=limits, timeout=timeout),
+        httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+
+
+@dataclass(frozen=True)
+class AssistantConfig:
+    id: int | None
+    model_name: str  # LLMModel.name
+    system_prompt: str | None
+    updated_at: datetime | None
+    # Active AISearchIndex names linked to the assistant.
+    retrieval_indexes: tuple[str, ...] = ()
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Time to first token and total latency of one client's calls."""
+
+    # Called on the caller's thread or loop, not through an executor.
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._starts: dict = {}
+        self._streaming: set = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._starts and run_id not in self._streaming:
+            self._streaming.add(run_id)
+            LLM_TTFT_SECONDS.observe(
+                time.perf_counter() - self._starts[run_id], model=self.model
+            )
+
+    def _finish(self, run_id, outcome: str):
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if run_id in self._streaming:
+            self._streaming.discard(run_id)
+        elif outcome == "ok":
+            LLM_TTFT_SECONDS.observe(elapsed, model=self.model)
+        LLM_REQUEST_SECONDS.observe(elapsed, model=self.model, outcome=outcome)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+
+def llm_callbacks(provider: str, deployment: str) -> list[BaseCallbackHandler]:
+    if not settings.METRICS_ENABLED:
+        return []
+    return [LLMTimingCallback(f"{provider}/{deployment}")]
+
+
+def create_chat_client(
+    provider: str, deployment: str, http_clients: tuple[httpx.Client, httpx.AsyncClient]
+) -> BaseChatModel:
+    http_client, http_async_client = http_clients
+    callbacks = llm_callbacks(provider, deployment)
+    if provider == "fake":
+        from app.ai_cores.fake_llm import FakeChatModel
+
+        return FakeChatModel(
+            model_name=deployment,
+            ttft=settings.FAKE_LLM_TTFT_MS / 1000,
+            token_latency=settings.FAKE_LLM_TOKEN_LATENCY_MS / 1000,
+            output_tokens=settings.FAKE_LLM_OUTPUT_TOKENS,
+            structured_response=settings.FAKE_LLM_STRUCTURED_RESPONSE,
+            callbacks=callbacks,
+        )
+    if provider == "azure":
+        from langchain_openai import AzureChatOpenAI
+
+        return AzureChatOpenAI(
+            azure_deployment=deployment,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            callbacks=callbacks,
+        )
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=deployment,
+        # Streamed turns report token usage too (Message.n_tokens).
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        callbacks=callbacks,
+    )
+
+
+class LLMRegistry:
+    def __init__(self, client_factory=create_chat_client, max_threads: int = 100_000):
+        self.client_factory = client_factory
+        self.max_threads = max_threads
+        self._clients: dict[tuple[str, str], BaseChatModel] = {}
+        self._http_clients: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+        # assistant id -> (time.monotonic() when resolved, config)
+        self._assistants: dict[int, tuple[float, AssistantConfig]] = {}
+        # thread id -> assistant id, which does not change for a thread; LRU
+        self._thread_assistants: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.clients_built = 0
+
+    def get_client(self, model_name: str) -> BaseChatModel:
+        key = parse_deployment(model_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                provider, deployment = key
+                if provider not in self._http_clients:
+                    self._http_clients[provider] = create_http_clients()
+                client = self.client_factory(
+                    provider, deployment, self._http_clients[provider]
+                )
+                self._clients[key] = client
+                self.clients_built += 1
+        return client
+
+    async def get_thread_assistant_id(self, db: AsyncSession, thread_id: int) -> int | None:
+        if thread_id in self._thread_assistants:
+            self._thread_assistants.move_to_end(thread_id)
+            return self._thread_assistants[thread_id]
+        result = await db.execute(
+            select(Thread.assistant_id).where(Thread.id == thread_id)
+        )
+        assistant_id = result.scalar()
+        if assistant_id is not None:
+            self._thread_assistants[thread_id] = assistant_id
+            while len(self._thread_assistants) > self.max_threads:
+                self._thread_assistants.popitem(last=False)
+        return assistant_id
+
+    async def resolve_assistant(
+        self, db: AsyncSession, assistant_id: int | None
+    ) -> AssistantConfig:
+        """
+        The assistant's model, system prompt and retrieval indexes;
+        DEFAULT_LLM_MODEL without a model.
+        """
+        if assistant_id is None:
+            return AssistantConfig(None, settings.DEFAULT_LLM_MODEL, None, None)
+        cached = self._assistants.get(assistant_id)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < settings.ASSISTANT_CACHE_TTL_SECONDS:
+            return cached[1]
+        result = await db.execute(
+            select(Assistant.system_prompt, Assistant.updated_at, LLMModel.name)
+            .outerjoin(LLMModel, Assistant.llm_model_id == LLMModel.id)
+            .where(Assistant.id == assistant_id)
+        )
+        row = result.first()
+        if row is None:
+            assistant = AssistantConfig(assistant_id, settings.DEFAULT_LLM_MODEL, None, None)
+        else:
+            indexes = await db.execute(
+                select(AISearchIndex.index_name)
+                .join(
+                    assistant_index_association,
+                    assistant_index_association.c.index_id == AISearchIndex.id,
+                )
+                .where(
+                    assistant_index_association.c.assistant_id == assistant_id,
+                    AISearchIndex.is_active.is_(True),
+                )
+                .order_by(AISearchIndex.index_name)
+            )
+            assistant = AssistantConfig(
+                assistant_id,
+                row.name or settings.DEFAULT_LLM_MODEL,
+                row.system_prompt,
+                row.updated_at,
+                tuple(indexes.scalars()),
+            )
+        self._assistants[assistant_id] = (now, assistant)
+        return assistant
+
+    def invalidate_assistant(self, assistant_id: int):
+        self._assistants.pop(assistant_id, None)
+
+    def invalidate_models(self):
+        """An LLMModel changed: any assistant may now resolve differently."""
+        self._assistants.clear()
+
+    def clear(self):
+        self._assistants.clear()
+        self._thread_assistants.clear()
+
+    async def aclose(self):
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._clients.clear()
+        for http_client, http_async_client in http_clients:
+            http_client.close()
+            await http_async_client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "clients_built": self.clients_built,
+            "assistants": len(self._assistants),
+            "threads": len(self._thread_assistants),
+        }
+
+
+llm_registry = LLMRegistry()
@@ -0,0 +1,301 @@
+"""
+Write-behind persistence of chat messages with group commit.
+
+`add_messages` hands each turn to the writer instead of committing inside the
+request. A single background task drains the queue and inserts everything
+that accumulated, from all threads, in one transaction: when MAX_BATCH
+messages are waiting or FLUSH_INTERVAL has passed since the first one,
+whichever comes first. With SQLite's single writer this turns one fsync per
+turn into one fsync per batch.
+
+Writes are visible to readers of the same process before they are flushed:
+the history cache is updated at submit time and `unflushed_messages` lets a
+cache miss merge them with what it reads from the DB. Endpoints that return
+rows with their ids call `flush_thread` first.
+
+The token usage reported on AI messages is written to Message.n_tokens and
+added to the hourly TokenUsage rollups in the same transaction.
+
+A batch that fails with an operational error ("database is locked", a
+dropped connection) is retried MESSAGE_WRITE_RETRIES times with backoff.
+If it still fails, or fails for another reason, each write is committed on
+its own, so one bad write (say, for a thread deleted meanwhile) only fails
+itself.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from langchain_core.messages import AIMessage, BaseMessage
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.token_usage import add_token_usage, assign_message_tokens, collect_usage
+from app.models import Message
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingWrite:
+    thread_id: int
+    messages: list[BaseMessage]
+    rows: list[dict]
+    usage: dict
+    done: asyncio.Future
+
+
+def _consume_exception(future: asyncio.Future):
+    # Failures are logged by the writer; callers that need durability await
+    # the future and see the exception themselves.
+    if not future.cancelled():
+        future.exception()
+
+
+class MessageWriter:
+    def __init__(
+        self,
+        session_factory,
+        max_batch: int,
+        flush_interval: float,
+        max_retries: int = 0,
+        retry_backoff: float = 0.05,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: list[PendingWrite] = []
+        self._in_flight: list[PendingWrite] = []
+        self._n_queued = 0
+        self._unflushed: dict[int, list[PendingWrite]] = {}
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._full = None
+        self.n_flushes = 0
+        self.n_flushed_messages = 0
+        self.n_retries = 0
+        self.n_failed_writes = 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def submit(self, thread_id: int, messages: list[BaseMessage]) -> asyncio.Future:
+        """
+        Queue messages for the next group commit. The returned future resolves
+        once they are committed; await it, or `flush`, as a durability barrier.
+        """
+        self._ensure_started()
+        rows = []
+        for message in messages:
+            now = datetime.now()
+            rows.append(
+                {
+                    "thread_id": thread_id,
+                    "ai_generated": isinstance(message, AIMessage),
+                    "content": message.content,
+                    "n_tokens": None,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+        assign_message_tokens(messages, rows)
+        usage = collect_usage(thread_id, messages, rows)
+        write = PendingWrite(
+            thread_id, messages, rows, usage, self._loop.create_future()
+        )
+        write.done.add_done_callback(_consume_exception)
+        self._queue.append(write)
+        self._unflushed.setdefault(thread_id, []).append(write)
+        self._n_queued += len(rows)
+        self._wakeup.set()
+        if self._n_queued >= self.max_batch:
+            self._full.set()
+        return write.done
+
+    def unflushed_messages(self, thread_id: int) -> list[tuple[datetime, BaseMessage]]:
+        """(created_at, message) pairs submitted for a thread but not yet committed."""
+        return [
+            (row["created_at"], message)
+            for write in self._unflushed.get(thread_id, [])
+            for row, message in zip(write.rows, write.messages)
+        ]
+
+    async def flush(self):
+        """Durability barrier: wait until everything submitted so far is committed."""
+        pending = [
+            write.done for write in self._in_flight + self._queue if not write.done.done()
+        ]
+        if not pending:
+            return
+        self._ensure_started()
+        self._full.set()
+        await asyncio.gather(*pending)
+
+    async def flush_thread(self, thread_id: int):
+        """
+        Wait until what was submitted for one thread so far is committed, so a
+        read of that thread sees its own writes. A failed write is left to the
+        caller that submitted it.
+        """
+        pending = [write.done for write in self._unflushed.get(thread_id, [])]
+        if not pending:
+            return
+        self._ensure_started()
+        self._full.set()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self):
+        """Flush what is queued and stop the background task."""
+        if self._task is None or self._task.done():
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self._flush_queued()
+        except asyncio.CancelledError:
+            # Shutdown: do not drop what was accepted.
+            await self._flush_queued()
+            raise
+
+    async def _flush_queued(self):
+        while self._queue:
+            batch, self._queue = self._queue, []
+            self._n_queued = 0
+            self._wakeup.clear()
+            self._full.clear()
+            self._in_flight = batch
+            write = asyncio.ensure_future(self._write(batch))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # Let the commit in progress finish before shutting down.
+                await write
+                raise
+            finally:
+                self._in_flight = []
+
+    async def _commit(self, writes: list[PendingWrite]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        insert(Message), [row for write in writes for row in write.rows]
+                    )
+                    await add_token_usage(db, [write.usage for write in writes])
+                    await db.commit()
+            except OperationalError as e:
+                if attempt == self.max_retries:
+                    raise
+                self.n_retries += 1
+                logger.warning(f"Retrying the commit of {len(writes)} chat turns: {str(e)}")
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+            else:
+                self.n_flushes += 1
+                self.n_flushed_messages += sum(len(write.rows) for write in writes)
+                return
+
+    async def _write(self, batch: list[PendingWrite]):
+        try:
+            await self._commit(batch)
+        except asyncio.CancelledError as e:
+            # The event loop is being torn down without `close`; whether the
+            # commit landed is unknown.
+            logger.warning(f"Persisting {len(batch)} chat turns was cancelled")
+            self._finish(batch, e)
+            raise
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning(
+                    f"Group commit of {len(batch)} chat turns failed, "
+                    f"committing them one by one: {str(e)}"
+                )
+                await self._write_each(batch)
+                return
+            logger.error(
+                f"Failed to persist a chat turn of thread {batch[0].thread_id}: {str(e)}"
+            )
+            self.n_failed_writes += 1
+            self._finish(batch, e)
+        else:
+            self._finish(batch, None)
+
+    async def _write_each(self, batch: list[PendingWrite]):
+        for i, write in enumerate(batch):
+            try:
+                await self._commit([write])
+            except asyncio.CancelledError as e:
+                logger.warning(f"Persisting {len(batch) - i} chat turns was cancelled")
+                self._finish(batch[i:], e)
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Failed to persist a chat turn of thread {write.thread_id}: {str(e)}"
+                )
+                self.n_failed_writes += 1
+                self._finish([write], e)
+            else:
+                self._finish([write], None)
+
+    def _finish(self, batch: list[PendingWrite], error: BaseException | None):
+        for write in batch:
+            writes = self._unflushed[write.thread_id]
+            writes.remove(write)
+            if not writes:
+                del self._unflushed[write.thread_id]
+            if error is not None:
+                # The cache already holds these messages; make the next read
+                # go back to the DB.
+                history_cache.invalidate(write.thread_id)
+            if write.done.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                write.done.cancel()
+            elif error is not None:
+                write.done.set_exception(error)
+            else:
+                write.done.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "queued_messages": self._n_queued,
+            "unflushed_threads": len(self._unflushed),
+            "flushes": self.n_flushes,
+            "flushed_messages": self.n_flushed_messages,
+            "retries": self.n_retries,
+            "failed_writes": self.n_failed_writes,
+        }
+
+
+message_writer = MessageWriter(
+    AsyncSessionLocal,
+    max_batch=settings.MESSAGE_WRITE_MAX_BATCH,
+    flush_interval=settings.MESSAGE_WRITE_FLUSH_INTERVAL_MS / 1000,
+    max_retries=settings.MESSAGE_WRITE_RETRIES,
+    retry_backoff=settings.MESSAGE_WRITE_RETRY_BACKOFF_MS / 1000,
+)
@@ -0,0 +1,150 @@
+"""
+Response cache in front of the chat model for repeated questions.
+
+Answers are keyed on the normalized question within a namespace made of the
+system prompt and the model, so changing either never serves a stale answer.
+Lookup tries an exact match first, then a canonical match: the question
+reduced to its words in order, without filler words ("a", "the", "please",
+...) and with simple plurals folded. Questions that differ in any content
+word, number or word order ("7nm" vs "5nm", "is a BJT faster than a MOSFET"
+vs the reverse) never share an answer. Both tiers are dictionary lookups.
+Entries expire after a TTL and the least recently used are evicted beyond
+MAX_ENTRIES.
+
+Only turns without (or with very little) history are eligible, and only for
+assistants listed in RESPONSE_CACHE_ASSISTANT_IDS.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+
+FILLER_WORDS = frozenset(
+    "a an the please pls kindly can could would will you u me i "
+    "tell want to know about just is are s".split()
+)
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.lower()).strip()
+    return question.rstrip("?!.。？！ ")
+
+
+def fold_plural(word: str) -> str:
+    if word.endswith("es") and word[:-2].endswith(("ss", "x", "ch", "sh")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def canonical_question(question: str) -> tuple[str, ...]:
+    words = re.findall(r"\w+", normalize_question(question))
+    return tuple(fold_plural(w) for w in words if w not in FILLER_WORDS)
+
+
+def cache_namespace(system_prompt: str, model_name: str) -> str:
+    return hashlib.sha256(f"{model_name}\x00{system_prompt}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    canonical: tuple[str, ...]
+    expires_at: float
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (namespace, normalized question) -> entry, in LRU order
+        self._entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        # (namespace, canonical question) -> key into _entries
+        self._canonical: dict[tuple[str, tuple[str, ...]], tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.canonical_hits = 0
+        self.misses = 0
+
+    def lookup(self, namespace: str, question: str) -> str | None:
+        question = normalize_question(question)
+        canonical = canonical_question(question)
+        now = time.monotonic()
+        with self._lock:
+            key = (namespace, question)
+            entry = self._live_entry(key, now)
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                key = self._canonical.get((namespace, canonical))
+                entry = self._live_entry(key, now) if key is not None else None
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self.canonical_hits += 1
+            self._entries.move_to_end(key)
+            return entry.answer
+
+    def _live_entry(self, key: tuple[str, str], now: float) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: tuple[str, str]):
+        entry = self._entries.pop(key)
+        canonical_key = (key[0], entry.canonical)
+        if self._canonical.get(canonical_key) == key:
+            del self._canonical[canonical_key]
+
+    def store(self, namespace: str, question: str, answer: str):
+        question = normalize_question(question)
+        key = (namespace, question)
+        entry = CachedResponse(
+            answer=answer,
+            canonical=canonical_question(question),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._canonical[(namespace, entry.canonical)] = key
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._canonical.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "canonical_hits": self.canonical_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+
+def is_cacheable(assistant_id: int | None, history: list[BaseMessage]) -> bool:
+    """Context-free (or short-history) turn of an assistant that opted in."""
+    if assistant_id not in settings.RESPONSE_CACHE_ASSISTANT_IDS:
+        return False
+    return len(history) <= settings.RESPONSE_CACHE_MAX_HISTORY
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
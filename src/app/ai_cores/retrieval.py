@@ -0,0 +1,117 @@
+"""
+Retrievers the chat graph's `retrieve` node searches, by index name.
+
+An assistant linked to AISearchIndex rows (assistant_index) gets a graph
+that routes do-RAG questions through retrieval before the model answers.
+Indexes are opened from RETRIEVAL_DATA_DIR on first use, unless a
+retriever was registered under their name, and move to the next snapshot
+once the ingestion worker publishes one; the manifest is checked for a new
+version at most every RETRIEVAL_STALE_CHECK_SECONDS per index.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Protocol
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    text: str
+    source: str | None
+    score: float
+    page: int | None = None
+
+
+class Retriever(Protocol):
+    async def asearch(self, query: str, k: int) -> list[RetrievedChunk]: ...
+
+
+def open_local_index(name: str) -> Retriever | None:
+    # NumPy is imported with the first index, not at startup.
+    from app.ai_cores.segments import open_index
+
+    return open_index(name)
+
+
+def is_stale(retriever: Retriever) -> bool:
+    # Local indexes know when a new version was published; other retrievers
+    # never go stale.
+    stale = getattr(retriever, "is_stale", None)
+    return stale is not None and stale()
+
+
+class RetrieverRegistry:
+    def __init__(self, loader: Callable[[str], Retriever | None] = open_local_index):
+        self.loader = loader
+        self._retrievers: dict[str, Retriever] = {}
+        # index name -> time.monotonic() of its last staleness check
+        self._checked: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.n_loads = 0
+        self.n_misses = 0
+
+    def register(self, name: str, retriever: Retriever):
+        self._retrievers[name] = retriever
+
+    def unregister(self, name: str):
+        self._retrievers.pop(name, None)
+        self._checked.pop(name, None)
+
+    def _check_due(self, name: str) -> bool:
+        last = self._checked.get(name)
+        return last is None or time.monotonic() - last >= settings.RETRIEVAL_STALE_CHECK_SECONDS
+
+    def get(self, name: str) -> Retriever | None:
+        """Blocking: may read the manifest and open segments."""
+        retriever = self._retrievers.get(name)
+        if retriever is not None and not self._check_due(name):
+            return retriever
+        with self._lock:
+            retriever = self._retrievers.get(name)
+            if retriever is None or (self._check_due(name) and is_stale(retriever)):
+                # Searches already running finish on the old snapshot; the
+                # new one shares its unchanged segments.
+                if retriever is None:
+                    retriever = self.loader(name)
+                else:
+                    retriever = retriever.reopen()
+                if retriever is not None:
+                    self._retrievers[name] = retriever
+                    self.n_loads += 1
+                else:
+                    self._retrievers.pop(name, None)
+            if retriever is not None:
+                self._checked[name] = time.monotonic()
+        if retriever is None:
+            # Not cached, so an index built later is picked up.
+            self.n_misses += 1
+            logger.warning(f"No retriever for index {name}")
+        return retriever
+
+    async def aget(self, name: str) -> Retriever | None:
+        """`get` for the event loop: loads and staleness checks run in a thread."""
+        retriever = self._retrievers.get(name)
+        if retriever is not None and not self._check_due(name):
+            return retriever
+        return await asyncio.to_thread(self.get, name)
+
+    def clear(self):
+        self._retrievers.clear()
+        self._checked.clear()
+
+    def stats(self) -> dict:
+        return {
+            "retrievers": len(self._retrievers),
+            "loads": self.n_loads,
+            "misses": self.n_misses,
+        }
+
+
+retrievers = RetrieverRegistry()
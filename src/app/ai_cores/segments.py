@@ -0,0 +1,482 @@
+"""
+Retrieval indexes as immutable segments plus tombstones, one directory per
+AISearchIndex under RETRIEVAL_DATA_DIR:
+
+    manifest.json                    version, embedder and live segments
+    seg-<id>/                        a VectorIndex directory, never modified
+    seg-<id>/tombstones-<v>.npy      packed bitmap of its deleted chunk ids
+
+Nothing a manifest refers to is ever changed:
+
+- ingestion writes each batch of files as a new segment;
+- deleting files writes new tombstone bitmaps for the segments holding
+  their chunks;
+- compaction merges small or mostly deleted segments into one, dropping
+  deleted rows.
+
+Each of these publishes its result by replacing the manifest. Only that
+swap runs under `index_lock`, so writers never hold the index for longer
+than a few file operations. Files a manifest stops referring to are
+removed right away. Readers that opened them keep them through their
+file handles and memory maps.
+
+A reader opens an IndexSnapshot: one manifest version with its segments
+memory-mapped and its tombstones in memory. Every query on it answers at
+that version, however the index changes meanwhile. The retriever registry
+moves to the next snapshot once the manifest is replaced, and reuses the
+segments the two versions share.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from app.core.config import settings
+from app.ai_cores.embeddings import Embedder, get_embedder, normalize
+from app.ai_cores.vector_index import (
+    Chunk,
+    Searchable,
+    VectorIndex,
+    connect_readonly,
+    file_chunk_ids,
+    index_lock,
+    lock_file,
+    unlock_file,
+    write_index,
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Unpublished files older than this were left by a crashed writer.
+ORPHAN_SECONDS = 3600
+
+
+def index_path(name: str) -> str:
+    if not name or os.path.basename(name) != name or name.startswith("."):
+        raise ValueError(f"Invalid index name: {name}")
+    return os.path.join(settings.RETRIEVAL_DATA_DIR, name)
+
+
+def index_names() -> list[str]:
+    """Names of the indexes under RETRIEVAL_DATA_DIR."""
+    if not os.path.isdir(settings.RETRIEVAL_DATA_DIR):
+        return []
+    return sorted(
+        name
+        for name in os.listdir(settings.RETRIEVAL_DATA_DIR)
+        if not name.startswith(".")
+        and os.path.exists(os.path.join(settings.RETRIEVAL_DATA_DIR, name, MANIFEST))
+    )
+
+
+def read_manifest(path: str) -> dict | None:
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_tombstones(path: str, entry: dict) -> np.ndarray:
+    """Deleted flags by chunk id of one manifest segment."""
+    if entry["tombstones"] is None:
+        return np.zeros(entry["count"], dtype=bool)
+    packed = np.load(os.path.join(path, entry["name"], entry["tombstones"]))
+    return np.unpackbits(packed, count=entry["count"]).astype(bool)
+
+
+def save_tombstones(path: str, entry: dict, version: int, deleted: np.ndarray) -> dict:
+    """The entry with `deleted` written as its tombstones for `version`."""
+    n_deleted = int(deleted.sum())
+    if not n_deleted:
+        return entry | {"deleted": 0, "tombstones": None}
+    name = f"tombstones-{version}.npy"
+    np.save(os.path.join(path, entry["name"], name), np.packbits(deleted))
+    return entry | {"deleted": n_deleted, "tombstones": name}
+
+
+def publish(path: str, old: dict | None, segments: list[dict], embedder: Embedder) -> dict:
+    """
+    Replace the manifest, then remove what only the old one referred to.
+    Call under `index_lock`.
+    """
+    manifest = {
+        "version": old["version"] + 1 if old else 1,
+        "embedder": embedder.name,
+        "dim": embedder.dim,
+        "segments": segments,
+    }
+    tmp_path = os.path.join(path, f"{MANIFEST}.tmp-{uuid.uuid4().hex}")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, MANIFEST))
+
+    live = {entry["name"]: entry for entry in segments}
+    for entry in old["segments"] if old else []:
+        if entry["name"] not in live:
+            shutil.rmtree(os.path.join(path, entry["name"]), ignore_errors=True)
+        elif entry["tombstones"] not in (None, live[entry["name"]]["tombstones"]):
+            os.remove(os.path.join(path, entry["name"], entry["tombstones"]))
+    return manifest
+
+
+def check_embedder(path: str, manifest: dict | None, embedder: Embedder):
+    if manifest is not None and manifest["embedder"] != embedder.name:
+        raise ValueError(
+            f"Index {path} was built with {manifest['embedder']}, not {embedder.name}"
+        )
+
+
+def new_segment_name() -> str:
+    return f"seg-{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+
+
+def append_segment(
+    path: str,
+    chunks: list[Chunk],
+    vectors: np.ndarray,
+    embedder: Embedder | None = None,
+) -> dict:
+    """
+    Add embedded chunks to the index at `path` as a new segment, creating
+    the index if needed. Returns the new manifest.
+    """
+    if embedder is None:
+        embedder = get_embedder(settings.RETRIEVAL_EMBEDDER)
+    check_embedder(path, read_manifest(path), embedder)
+    os.makedirs(path, exist_ok=True)
+    name = new_segment_name()
+    meta = write_index(os.path.join(path, name), embedder, [(chunks, vectors)])
+    entry = {"name": name, "count": meta["count"], "deleted": 0, "tombstones": None}
+    with index_lock(path):
+        manifest = read_manifest(path)
+        try:
+            check_embedder(path, manifest, embedder)
+        except ValueError:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+            raise
+        segments = manifest["segments"] if manifest else []
+        return publish(path, manifest, segments + [entry], embedder)
+
+
+def delete_files(path: str, file_ids: Iterable[int]) -> int:
+    """
+    Tombstone the chunks of `file_ids` in the index at `path`. Returns how
+    many chunks were deleted; deleting again is a no-op. Segments left with
+    no live chunk are dropped.
+    """
+    file_ids = [int(i) for i in file_ids]
+    if not file_ids:
+        return 0
+    with index_lock(path):
+        manifest = read_manifest(path)
+        if manifest is None:
+            return 0
+        n_deleted = 0
+        segments = []
+        for entry in manifest["segments"]:
+            db = connect_readonly(os.path.join(path, entry["name"]))
+            try:
+                ids = file_chunk_ids(db, file_ids)
+            finally:
+                db.close()
+            deleted = load_tombstones(path, entry)
+            fresh = ids[~deleted[ids]]
+            if len(fresh):
+                n_deleted += len(fresh)
+                deleted[fresh] = True
+                if deleted.all():
+                    continue
+                entry = save_tombstones(path, entry, manifest["version"] + 1, deleted)
+            segments.append(entry)
+        if n_deleted:
+            publish(path, manifest, segments, get_embedder(manifest["embedder"]))
+        return n_deleted
+
+
+@contextmanager
+def compaction_lock(path: str) -> Iterator[bool]:
+    """Yields False if another process is compacting the index."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.compact.lock", "a") as file:
+        if not lock_file(file, blocking=False):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            unlock_file(file)
+
+
+def segments_to_merge(manifest: dict) -> list[dict]:
+    """
+    Segments with fewer than RETRIEVAL_COMPACT_SMALL_ROWS live chunks, once
+    there are RETRIEVAL_COMPACT_MIN_SEGMENTS of them, plus any segment whose
+    deleted share reached RETRIEVAL_COMPACT_DELETED_RATIO.
+    """
+    segments = manifest["segments"]
+    small = [
+        entry["name"]
+        for entry in segments
+        if entry["count"] - entry["deleted"] < settings.RETRIEVAL_COMPACT_SMALL_ROWS
+    ]
+    if len(small) < settings.RETRIEVAL_COMPACT_MIN_SEGMENTS:
+        small = []
+    return [
+        entry
+        for entry in segments
+        if entry["name"] in small
+        or entry["deleted"] >= settings.RETRIEVAL_COMPACT_DELETED_RATIO * entry["count"]
+    ]
+
+
+def compact(path: str) -> dict | None:
+    """
+    Merge the index's `segments_to_merge` into one segment, without
+    blocking searches or other writers. Returns the new manifest, or None
+    if there was nothing to merge or another process is compacting.
+    """
+    with compaction_lock(path) as acquired:
+        manifest = read_manifest(path) if acquired else None
+        merging = segments_to_merge(manifest) if manifest else []
+        if not merging:
+            return None
+        embedder = get_embedder(manifest["embedder"])
+        kept = []
+
+        def batches():
+            for entry in merging:
+                deleted = load_tombstones(path, entry)
+                kept.append(np.flatnonzero(~deleted))
+                index = VectorIndex.open(os.path.join(path, entry["name"]), embedder)
+                try:
+                    start = 0
+                    for chunks, vectors in index.iter_batches():
+                        live = ~deleted[start : start + len(chunks)]
+                        start += len(chunks)
+                        yield [c for c, keep in zip(chunks, live) if keep], vectors[live]
+                finally:
+                    index.db.close()
+
+        name = new_segment_name()
+        began = time.perf_counter()
+        meta = write_index(os.path.join(path, name), embedder, batches())
+        with index_lock(path):
+            current = read_manifest(path)
+            by_name = {entry["name"]: entry for entry in current["segments"]}
+            # Chunks deleted while merging are deleted in the merged segment
+            # too; a segment dropped meanwhile had nothing left.
+            deleted = np.concatenate(
+                [
+                    load_tombstones(path, by_name[entry["name"]])[ids]
+                    if entry["name"] in by_name
+                    else np.ones(len(ids), dtype=bool)
+                    for entry, ids in zip(merging, kept)
+                ]
+                + [np.zeros(0, dtype=bool)]
+            )
+            merged = None
+            if not deleted.all():
+                merged = save_tombstones(
+                    path,
+                    {"name": name, "count": meta["count"]},
+                    current["version"] + 1,
+                    deleted,
+                )
+            if merged is None:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+            merging_names = {entry["name"] for entry in merging}
+            segments = []
+            for entry in current["segments"]:
+                if entry["name"] not in merging_names:
+                    segments.append(entry)
+                elif merged is not None:
+                    # Takes the place of the first segment it replaces.
+                    segments.append(merged)
+                    merged = None
+            manifest = publish(path, current, segments, embedder)
+        logger.info(
+            f"Compacted {len(merging)} segments of {path} into {meta['count']} chunks "
+            f"in {time.perf_counter() - began:.1f}s"
+        )
+        remove_orphans(path, manifest)
+        return manifest
+
+
+def remove_orphans(path: str, manifest: dict):
+    """Remove segments and temporary files left unpublished by a crash."""
+    live = {entry["name"]: entry for entry in manifest["segments"]}
+    expired = time.time() - ORPHAN_SECONDS
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        if name == MANIFEST or os.path.getmtime(file_path) > expired:
+            continue
+        if name not in live:
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path, ignore_errors=True)
+            else:
+                os.remove(file_path)
+            continue
+        for file_name in os.listdir(file_path):
+            tombstones = os.path.join(file_path, file_name)
+            if (
+                file_name.startswith("tombstones-")
+                and file_name != live[name]["tombstones"]
+                and os.path.getmtime(tombstones) < expired
+            ):
+                os.remove(tombstones)
+
+
+@dataclass(frozen=True)
+class Segment:
+    name: str
+    index: VectorIndex
+    # Flags by chunk id, and by row of index.vectors when any is set.
+    deleted: np.ndarray
+    deleted_rows: np.ndarray | None
+
+
+class IndexSnapshot(Searchable):
+    """
+    One version of a segmented index. Chunk ids are numbered across its
+    segments, in manifest order, and are only meaningful within it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        version: int,
+        embedder: Embedder,
+        segments: list[Segment],
+    ):
+        self.path = path
+        self.version = version
+        self.embedder = embedder
+        self.segments = segments
+        self.offsets = np.cumsum([0] + [len(segment.index) for segment in segments])
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        embedder: Embedder | None = None,
+        n_probe: int | None = None,
+        previous: "IndexSnapshot | None" = None,
+    ) -> "IndexSnapshot | None":
+        """
+        The current version of the index at `path`, or None if there is
+        none. Segments of `previous` still in use are shared, not reopened.
+        """
+        for attempt in range(3):
+            try:
+                return cls._open(path, embedder, n_probe, previous)
+            except (FileNotFoundError, sqlite3.OperationalError):
+                # A writer replaced the manifest just read and removed some
+                # of its files; read the new one.
+                if attempt == 2:
+                    raise
+
+    @classmethod
+    def _open(cls, path, embedder, n_probe, previous) -> "IndexSnapshot | None":
+        manifest = read_manifest(path)
+        if manifest is None:
+            return None
+        if embedder is None:
+            embedder = get_embedder(manifest["embedder"])
+        opened = {}
+        if previous is not None:
+            opened = {segment.name: segment.index for segment in previous.segments}
+        segments = []
+        for entry in manifest["segments"]:
+            index = opened.get(entry["name"])
+            if index is None:
+                index = VectorIndex.open(os.path.join(path, entry["name"]), embedder, n_probe)
+            deleted = load_tombstones(path, entry)
+            deleted_rows = index.row_mask(deleted) if entry["deleted"] else None
+            segments.append(Segment(entry["name"], index, deleted, deleted_rows))
+        return cls(path, manifest["version"], embedder, segments)
+
+    def __len__(self) -> int:
+        """Live chunks."""
+        return sum(
+            len(segment.index) - int(segment.deleted.sum()) for segment in self.segments
+        )
+
+    def is_stale(self) -> bool:
+        """True once a writer published a new version, or removed the index."""
+        # Compares versions, not the manifest's inode: os.replace frees the
+        # old inode and the filesystem may hand the same number straight
+        # back to the next manifest.
+        manifest = read_manifest(self.path)
+        return manifest is None or manifest["version"] != self.version
+
+    def reopen(self) -> "IndexSnapshot | None":
+        return IndexSnapshot.open(self.path, self.embedder, previous=self)
+
+    def close(self):
+        for segment in self.segments:
+            segment.index.db.close()
+
+    def has_file(self, file_id: int) -> bool:
+        return any(
+            not segment.deleted[ids].all()
+            for segment in self.segments
+            if len(ids := segment.index.file_chunk_ids([file_id]))
+        )
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int, n_probe: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top k live chunks for each query vector, as VectorIndex.search_vectors."""
+        queries = normalize(np.array(queries, dtype=np.float32, ndmin=2))
+        all_scores = [np.full((len(queries), k), -np.inf, dtype=np.float32)]
+        all_ids = [np.full((len(queries), k), -1, dtype=np.int64)]
+        for offset, segment in zip(self.offsets, self.segments):
+            scores, ids = segment.index.search_vectors(
+                queries, k, n_probe, segment.deleted_rows
+            )
+            all_scores.append(scores)
+            all_ids.append(np.where(ids >= 0, ids + offset, -1))
+        scores = np.concatenate(all_scores, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        ids = np.take_along_axis(np.concatenate(all_ids, axis=1), order, axis=1)
+        return np.take_along_axis(scores, order, axis=1), ids
+
+    def get_chunks(self, ids: Iterable[int]) -> dict[int, Chunk]:
+        ids = np.array([int(i) for i in ids if i >= 0], dtype=np.int64)
+        where = np.searchsorted(self.offsets, ids, side="right") - 1
+        chunks = {}
+        for position in np.unique(where):
+            if position >= len(self.segments):
+                continue
+            segment, offset = self.segments[position], int(self.offsets[position])
+            local = ids[where == position] - offset
+            found = segment.index.get_chunks(local[~segment.deleted[local]])
+            chunks.update({offset + i: chunk for i, chunk in found.items()})
+        return chunks
+
+    def iter_chunks(self) -> Iterator[Chunk]:
+        """Live chunks, segment by segment."""
+        for segment in self.segments:
+            start = 0
+            for chunks, _ in segment.index.iter_batches():
+                live = ~segment.deleted[start : start + len(chunks)]
+                start += len(chunks)
+                yield from (chunk for chunk, keep in zip(chunks, live) if keep)
+
+
+def open_index(name: str) -> IndexSnapshot | None:
+    """The current version of index `name`, or None if it was never written."""
+    return IndexSnapshot.open(index_path(name))
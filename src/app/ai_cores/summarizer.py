@@ -0,0 +1,319 @@
+"""
+Rolling summary of the part of a thread that no longer fits the history
+window.
+
+After each turn the graph's `summarize` node calls `observe`, which only
+counts the tokens the turn added. Once a thread overflows its window and
+SUMMARY_MIN_DELTA_TOKENS have accumulated, a background task (at most one per
+thread; a request that arrives meanwhile makes it run once more) folds the
+messages that fell out of the window since the last run into the stored
+summary, SUMMARY_CHUNK_TOKENS at a time. The whole thread is never
+re-summarized, and the chat request never waits for any of it.
+
+ThreadSummary.last_message_id is the last message folded in. Updates are
+conditional on it, so two workers summarizing the same thread cannot fold a
+delta twice. Prompts include the latest stored summary right after the
+system prompt; while a run is catching up, the turns it has not folded yet
+are neither in the summary nor in the window.
+"""
+
+import asyncio
+import contextvars
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.ai_cores.admission import with_admission
+from app.ai_cores.context import count_tokens, find_window_boundary, get_token_budget
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.llms import llm_registry
+from app.ai_cores.token_usage import add_token_usage, usage_hour
+from app.models import Message, ThreadSummary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an "
+    "assistant. Rewrite the summary so that it also covers the new messages. "
+    "Keep decisions, requirements, names, numbers and open questions; drop "
+    "small talk. Reply with the updated summary only, in at most {max_words} words."
+)
+
+
+def route_summary_model(prompt_value, config: RunnableConfig):
+    model_name = config["configurable"]["model_name"]
+    # About 1.3 tokens per word; the reported usage corrects it afterwards.
+    return with_admission(
+        llm_registry.get_client(model_name), model_name, 2 * settings.SUMMARY_MAX_WORDS
+    )
+
+
+@lru_cache(maxsize=None)
+def get_summary_chain():
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", SUMMARY_SYSTEM_PROMPT),
+            ("human", "Summary so far:\n{summary}\n\nNew messages:\n{messages}"),
+        ]
+    )
+    return prompt | RunnableLambda(route_summary_model)
+
+
+def format_messages(rows) -> str:
+    return "\n\n".join(
+        f"{'Assistant' if row.ai_generated else 'User'}: {row.content}" for row in rows
+    )
+
+
+def split_chunks(rows, chunk_tokens: int) -> list[list]:
+    """Consecutive chunks of at most `chunk_tokens`, at least one message each."""
+    chunks, chunk, used = [], [], 0
+    for row in rows:
+        n_tokens = count_tokens(row.content)
+        if chunk and used + n_tokens > chunk_tokens:
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(row)
+        used += n_tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class RollingSummarizer:
+    def __init__(
+        self,
+        session_factory,
+        min_delta_tokens: int,
+        chunk_tokens: int,
+        max_words: int,
+        cache_size: int,
+    ):
+        self.session_factory = session_factory
+        self.min_delta_tokens = min_delta_tokens
+        self.chunk_tokens = chunk_tokens
+        self.max_words = max_words
+        self.cache_size = cache_size
+        # thread id -> summary text, or None for "no summary"; LRU
+        self._summaries: OrderedDict[int, str | None] = OrderedDict()
+        # thread id -> tokens added since the last run was scheduled; LRU
+        self._pending_tokens: OrderedDict[int, int] = OrderedDict()
+        self._running: dict[int, asyncio.Task] = {}
+        self._rerun: set[int] = set()
+        self.n_runs = 0
+        self.n_folds = 0
+        self.n_folded_messages = 0
+        self.n_conflicts = 0
+        self.n_failures = 0
+
+    def _remember(self, thread_id: int, summary: str | None):
+        self._summaries[thread_id] = summary
+        self._summaries.move_to_end(thread_id)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+
+    async def get_summary(self, db: AsyncSession, thread_id: int) -> str | None:
+        if thread_id in self._summaries:
+            self._summaries.move_to_end(thread_id)
+            return self._summaries[thread_id]
+        result = await db.execute(
+            select(ThreadSummary.content).where(ThreadSummary.thread_id == thread_id)
+        )
+        summary = result.scalar()
+        self._remember(thread_id, summary)
+        return summary
+
+    def observe(self, thread_id: int, messages: list[BaseMessage]):
+        """Account for a finished turn; start a background run when one is due."""
+        pending = self._pending_tokens.pop(thread_id, 0)
+        pending += sum(count_tokens(str(message.content)) for message in messages)
+        # An uncached thread is scheduled anyway: the run measures the window
+        # in the DB and returns without a model call if nothing fell out.
+        if pending < self.min_delta_tokens or history_cache.overflows(thread_id) is False:
+            self._pending_tokens[thread_id] = pending
+            while len(self._pending_tokens) > self.cache_size:
+                self._pending_tokens.popitem(last=False)
+            return
+        self.schedule(thread_id)
+
+    def schedule(self, thread_id: int):
+        loop = asyncio.get_running_loop()
+        task = self._running.get(thread_id)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self._rerun.add(thread_id)
+            return
+        # A fresh context: the run must not report into the request's
+        # callbacks (e.g. stream its tokens to the client).
+        self._running[thread_id] = loop.create_task(
+            self._run(thread_id), context=contextvars.Context()
+        )
+
+    async def _run(self, thread_id: int):
+        try:
+            while True:
+                self._rerun.discard(thread_id)
+                self.n_runs += 1
+                try:
+                    await self.summarize(thread_id)
+                except Exception as e:
+                    self.n_failures += 1
+                    logger.error(f"Failed to summarize thread_id {thread_id}: {str(e)}")
+                    break
+                if thread_id not in self._rerun:
+                    break
+        finally:
+            if self._running.get(thread_id) is asyncio.current_task():
+                del self._running[thread_id]
+
+    async def summarize(self, thread_id: int) -> int:
+        """
+        Fold the messages that left the window since the last run into the
+        thread's summary; returns how many were folded.
+        """
+        async with self.session_factory() as db:
+            row = (
+                await db.execute(
+                    select(ThreadSummary.content, ThreadSummary.last_message_id).where(
+                        ThreadSummary.thread_id == thread_id
+                    )
+                )
+            ).first()
+            summary, last_id = (row.content, row.last_message_id) if row else (None, None)
+            boundary_id = await find_window_boundary(
+                db, thread_id, await get_token_budget(db, thread_id)
+            )
+            if boundary_id is None or (last_id is not None and boundary_id <= last_id):
+                return 0
+            query = select(Message.id, Message.ai_generated, Message.content).where(
+                Message.thread_id == thread_id, Message.id <= boundary_id
+            )
+            if last_id is not None:
+                query = query.where(Message.id > last_id)
+            rows = list(await db.execute(query.order_by(Message.id)))
+            assistant_id = await llm_registry.get_thread_assistant_id(db, thread_id)
+            assistant = await llm_registry.resolve_assistant(db, assistant_id)
+        model_name = settings.SUMMARY_LLM_MODEL or assistant.model_name
+
+        n_folded = 0
+        for chunk in split_chunks(rows, self.chunk_tokens):
+            ai_message = await get_summary_chain().ainvoke(
+                {
+                    "max_words": self.max_words,
+                    "summary": summary or "(none yet)",
+                    "messages": format_messages(chunk),
+                },
+                {"configurable": {"model_name": model_name}},
+            )
+            new_summary = str(ai_message.content).strip()
+            if not await self._save(
+                thread_id, new_summary, last_id, chunk[-1].id, ai_message.usage_metadata
+            ):
+                self.n_conflicts += 1
+                self._summaries.pop(thread_id, None)
+                break
+            summary, last_id = new_summary, chunk[-1].id
+            self._remember(thread_id, summary)
+            self.n_folds += 1
+            self.n_folded_messages += len(chunk)
+            n_folded += len(chunk)
+        return n_folded
+
+    async def _save(
+        self,
+        thread_id: int,
+        summary: str,
+        previous_id: int | None,
+        last_id: int,
+        usage: dict | None,
+    ) -> bool:
+        """Store the summary unless another run advanced it first."""
+        async with self.session_factory() as db:
+            values = {
+                "content": summary,
+                "last_message_id": last_id,
+                "n_tokens": count_tokens(summary),
+                "updated_at": datetime.now(),
+            }
+            if previous_id is None:
+                db.add(ThreadSummary(thread_id=thread_id, **values))
+            else:
+                result = await db.execute(
+                    update(ThreadSummary)
+                    .where(
+                        ThreadSummary.thread_id == thread_id,
+                        ThreadSummary.last_message_id == previous_id,
+                    )
+                    .values(**values)
+                )
+                if result.rowcount == 0:
+                    return False
+            if usage:
+                await add_token_usage(
+                    db,
+                    [
+                        {
+                            (thread_id, usage_hour(datetime.now())): [
+                                usage["input_tokens"], usage["output_tokens"], 1
+                            ]
+                        }
+                    ],
+                )
+            try:
+                await db.commit()
+            except IntegrityError:
+                return False
+        return True
+
+    async def drain(self):
+        """Wait for the background runs of the current loop to finish."""
+        loop = asyncio.get_running_loop()
+        while True:
+            tasks = [
+                task
+                for task in self._running.values()
+                if task.get_loop() is loop and not task.done()
+            ]
+            if not tasks:
+                return
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        tasks = [task for task in self._running.values() if task.get_loop() is loop]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def clear(self):
+        self._summaries.clear()
+        self._pending_tokens.clear()
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._summaries),
+            "running": len(self._running),
+            "runs": self.n_runs,
+            "folds": self.n_folds,
+            "folded_messages": self.n_folded_messages,
+            "conflicts": self.n_conflicts,
+            "failures": self.n_failures,
+        }
+
+
+summarizer = RollingSummarizer(
+    AsyncSessionLocal,
+    min_delta_tokens=settings.SUMMARY_MIN_DELTA_TOKENS,
+    chunk_tokens=settings.SUMMARY_CHUNK_TOKENS,
+    max_words=settings.SUMMARY_MAX_WORDS,
+    cache_size=settings.SUMMARY_CACHE_SIZE,
+)
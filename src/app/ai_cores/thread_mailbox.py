@@ -0,0 +1,163 @@
+"""
+Per-thread ordering of chat turns.
+
+A turn reads the thread's history and then appends to it, so two turns of
+the same thread must not overlap. Each thread gets a FIFO lock; turns of
+different threads never wait for each other.
+
+Inputs that arrive for a thread while its previous turn is still running are
+coalesced: they join the next pending turn and are answered together, in
+arrival order, by one upstream call. A request waits at most
+CHAT_THREAD_MAX_WAIT_SECONDS for its turn, and at most
+CHAT_THREAD_MAX_PENDING inputs may wait per thread; beyond either,
+ThreadBusyError is raised. Streamed turns hold the thread through
+`exclusive` and are never coalesced.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+
+
+class ThreadBusyError(Exception):
+    pass
+
+
+@dataclass
+class PendingTurn:
+    messages: list[BaseMessage]
+    done: asyncio.Future
+    started: bool = False
+
+
+@dataclass
+class Mailbox:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: PendingTurn | None = None
+    n_waiting: int = 0
+    n_users: int = 0
+
+
+def _fail(turn: PendingTurn, error: BaseException):
+    # Coalesced callers see the same failure as the caller that ran the turn.
+    if isinstance(error, asyncio.CancelledError):
+        turn.done.cancel()
+    else:
+        turn.done.set_exception(error)
+        turn.done.exception()  # mark retrieved when nobody else is waiting
+
+
+class ThreadMailbox:
+    def __init__(self, max_wait: float, max_pending: int, max_batch: int):
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._boxes: dict[int, Mailbox] = {}
+        self.n_turns = 0
+        self.n_coalesced = 0
+        self.n_rejected = 0
+
+    def _checkout(self, thread_id: int) -> Mailbox:
+        box = self._boxes.get(thread_id)
+        if box is None:
+            box = self._boxes[thread_id] = Mailbox()
+        box.n_users += 1
+        return box
+
+    def _release(self, thread_id: int, box: Mailbox):
+        box.n_users -= 1
+        if box.n_users == 0:
+            del self._boxes[thread_id]
+
+    async def _acquire(self, box: Mailbox):
+        if box.n_waiting >= self.max_pending:
+            self.n_rejected += 1
+            raise ThreadBusyError("Too many requests waiting for this thread")
+        box.n_waiting += 1
+        try:
+            await asyncio.wait_for(box.lock.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.n_rejected += 1
+            raise ThreadBusyError("Timed out waiting for the previous turn of this thread")
+        finally:
+            box.n_waiting -= 1
+
+    async def submit(
+        self,
+        thread_id: int,
+        message: BaseMessage,
+        run_turn: Callable[[list[BaseMessage]], Awaitable],
+    ):
+        """
+        Run `run_turn` with this input, plus any inputs coalesced into the same
+        turn, once the thread's previous turn has finished. Every coalesced
+        caller receives the same result.
+        """
+        box = self._checkout(thread_id)
+        try:
+            turn = box.pending
+            if turn is not None and not turn.started and len(turn.messages) < self.max_batch:
+                turn.messages.append(message)
+                self.n_coalesced += 1
+                return await asyncio.shield(turn.done)
+
+            turn = PendingTurn([message], asyncio.get_running_loop().create_future())
+            box.pending = turn
+            try:
+                await self._acquire(box)
+            except BaseException as e:
+                if box.pending is turn:
+                    box.pending = None
+                _fail(turn, e)
+                raise
+            try:
+                turn.started = True
+                if box.pending is turn:
+                    box.pending = None
+                self.n_turns += 1
+                result = await run_turn(turn.messages)
+            except BaseException as e:
+                _fail(turn, e)
+                raise
+            finally:
+                box.lock.release()
+            turn.done.set_result(result)
+            return result
+        finally:
+            self._release(thread_id, box)
+
+    @asynccontextmanager
+    async def exclusive(self, thread_id: int):
+        """Hold the thread for one turn without coalescing (streamed turns)."""
+        box = self._checkout(thread_id)
+        try:
+            box.pending = None  # later inputs queue behind this turn
+            await self._acquire(box)
+            try:
+                self.n_turns += 1
+                yield
+            finally:
+                box.lock.release()
+        finally:
+            self._release(thread_id, box)
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._boxes),
+            "waiting": sum(box.n_waiting for box in self._boxes.values()),
+            "turns": self.n_turns,
+            "coalesced": self.n_coalesced,
+            "rejected": self.n_rejected,
+        }
+
+
+thread_mailbox = ThreadMailbox(
+    max_wait=settings.CHAT_THREAD_MAX_WAIT_SECONDS,
+    max_pending=settings.CHAT_THREAD_MAX_PENDING,
+    max_batch=settings.CHAT_COALESCE_MAX_INPUTS,
+)
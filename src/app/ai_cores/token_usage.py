@@ -0,0 +1,123 @@
+"""
+Token usage reported by the upstream model, per message and per hour.
+
+The AIMessage of a turn carries `usage_metadata`; its completion tokens go to
+the AI message's Message.n_tokens and its prompt tokens to the human message
+it answered. The same numbers are added to the thread's TokenUsage row for
+the hour, with an upsert that copies user_id and assistant_id from the thread
+inside the statement, so maintaining the rollup costs no extra round trip.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from app.models import Thread, TokenUsage
+
+
+def usage_hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def assign_message_tokens(messages: list[BaseMessage], rows: list[dict]):
+    """Set `n_tokens` on the message rows from the AIMessages' usage_metadata."""
+    for i, message in enumerate(messages):
+        usage = getattr(message, "usage_metadata", None)
+        if not isinstance(message, AIMessage) or not usage:
+            continue
+        rows[i]["n_tokens"] = usage["output_tokens"]
+        # The prompt tokens belong to the input that was answered; coalesced
+        # inputs before it were sent in the same prompt.
+        for j in range(i - 1, -1, -1):
+            if isinstance(messages[j], HumanMessage):
+                rows[j]["n_tokens"] = usage["input_tokens"]
+                break
+
+
+def collect_usage(
+    thread_id: int, messages: list[BaseMessage], rows: list[dict]
+) -> dict[tuple[int, datetime], list[int]]:
+    """(thread_id, hour) -> [prompt_tokens, completion_tokens, n_calls]."""
+    usage_by_hour = {}
+    for message, row in zip(messages, rows):
+        usage = getattr(message, "usage_metadata", None)
+        if not isinstance(message, AIMessage) or not usage:
+            continue
+        totals = usage_by_hour.setdefault(
+            (thread_id, usage_hour(row["created_at"])), [0, 0, 0]
+        )
+        totals[0] += usage["input_tokens"]
+        totals[1] += usage["output_tokens"]
+        totals[2] += 1
+    return usage_by_hour
+
+
+def _upsert_statement(dialect_name: str):
+    thread = select(
+        Thread.id,
+        bindparam("u_hour", type_=DateTime),
+        Thread.user_id,
+        Thread.assistant_id,
+        bindparam("u_prompt_tokens", type_=Integer),
+        bindparam("u_completion_tokens", type_=Integer),
+        bindparam("u_n_calls", type_=Integer),
+    ).where(Thread.id == bindparam("u_thread_id"))
+    columns = [
+        "thread_id",
+        "hour",
+        "user_id",
+        "assistant_id",
+        "prompt_tokens",
+        "completion_tokens",
+        "n_calls",
+    ]
+    counters = ("prompt_tokens", "completion_tokens", "n_calls")
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(TokenUsage).from_select(columns, thread)
+        return stmt.on_duplicate_key_update(
+            {c: getattr(TokenUsage, c) + getattr(stmt.inserted, c) for c in counters}
+        )
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(TokenUsage).from_select(columns, thread)
+    return stmt.on_conflict_do_update(
+        index_elements=["thread_id", "hour"],
+        set_={c: getattr(TokenUsage, c) + getattr(stmt.excluded, c) for c in counters},
+    )
+
+
+async def add_token_usage(
+    db: AsyncSession, usages: list[dict[tuple[int, datetime], list[int]]]
+):
+    """Add `collect_usage` results to the hourly rollups, in the caller's transaction."""
+    usage_by_hour = {}
+    for usage in usages:
+        for key, counts in usage.items():
+            totals = usage_by_hour.setdefault(key, [0, 0, 0])
+            for i, count in enumerate(counts):
+                totals[i] += count
+    if not usage_by_hour:
+        return
+    # Core executemany; the ORM bulk path does not take INSERT ... SELECT.
+    connection = await db.connection()
+    await connection.execute(
+        _upsert_statement(connection.dialect.name),
+        [
+            {
+                "u_thread_id": thread_id,
+                "u_hour": hour,
+                "u_prompt_tokens": prompt_tokens,
+                "u_completion_tokens": completion_tokens,
+                "u_n_calls": n_calls,
+            }
+            for (thread_id, hour), (prompt_tokens, completion_tokens, n_calls)
+            in usage_by_hour.items()
+        ],
+    )
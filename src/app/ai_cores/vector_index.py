@@ -0,0 +1,511 @@
+"""
+In-process vector index of document chunks. Each directory is one
+immutable segment of an AISearchIndex (see segments.py):
+
+    vectors.npy    (n, dim) float32 unit rows, memory-mapped read-only
+    chunks.sqlite  chunk text and metadata by chunk id, plus the embedder
+    lists.npy      partition offsets into vectors.npy      (partitioned only)
+    centroids.npy  (n_lists, dim) partition centroids       (partitioned only)
+    ids.npy        chunk id of each row of vectors.npy     (partitioned only)
+
+Search is a dot product of the normalized query against the rows (cosine
+similarity) followed by an argpartition top-k. Small indexes are scanned
+exactly, in blocks, and a batch of queries is one matrix product per block
+instead of one pass over the file per query. A full scan is bound by
+memory bandwidth (about 100 ms per query for 1M rows of 256 dimensions on
+one core), so large indexes are built partitioned: rows are grouped by
+their nearest k-means centroid and a query scans only the RETRIEVAL_N_PROBE
+partitions whose centroids are closest, reading a few percent of the file.
+Rows deleted since the segment was written are masked out of the scores.
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from app.core.config import settings
+from app.ai_cores.embeddings import Embedder, get_embedder, normalize
+from app.ai_cores.retrieval import RetrievedChunk
+
+BLOCK_ROWS = 1 << 16
+SCHEMA = (
+    "CREATE TABLE chunks (id INTEGER PRIMARY KEY, file_id INTEGER, "
+    "source TEXT, page INTEGER, text TEXT NOT NULL)",
+    "CREATE INDEX ix_chunks_file_id ON chunks (file_id)",
+    "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+
+
+@dataclass
+class Chunk:
+    text: str
+    source: str | None = None
+    page: int | None = None
+    file_id: int | None = None
+
+
+def connect_readonly(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(
+        f"file:{os.path.join(path, 'chunks.sqlite')}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+    )
+
+
+def file_chunk_ids(db: sqlite3.Connection, file_ids: Iterable[int]) -> np.ndarray:
+    file_ids = [int(i) for i in file_ids]
+    rows = db.execute(
+        f"SELECT id FROM chunks WHERE file_id IN ({','.join('?' * len(file_ids))})",
+        file_ids,
+    ).fetchall()
+    return np.array([row[0] for row in rows], dtype=np.int64)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, highest first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    best = np.argpartition(scores, -k)[-k:]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class Searchable(ABC):
+    """Text search on top of `search_vectors` and `get_chunks`."""
+
+    embedder: Embedder
+
+    @abstractmethod
+    def search_vectors(
+        self, queries: np.ndarray, k: int, n_probe: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(scores, chunk ids) of the k best rows per query, ids -1 past the end."""
+
+    @abstractmethod
+    def get_chunks(self, ids: Iterable[int]) -> dict[int, Chunk]:
+        """Chunks by id; unknown ids, such as -1, are left out."""
+
+    def search_batch(self, queries: list[str], k: int) -> list[list[RetrievedChunk]]:
+        scores, ids = self.search_vectors(self.embedder.embed(queries), k)
+        chunks = self.get_chunks(np.unique(ids))
+        return [
+            [
+                RetrievedChunk(chunk.text, chunk.source, float(score), chunk.page)
+                for score, i in zip(query_scores, query_ids)
+                if (chunk := chunks.get(i)) is not None
+            ]
+            for query_scores, query_ids in zip(scores, ids.tolist())
+        ]
+
+    def search(self, query: str, k: int) -> list[RetrievedChunk]:
+        return self.search_batch([query], k)[0]
+
+    async def asearch(self, query: str, k: int) -> list[RetrievedChunk]:
+        # NumPy releases the GIL in the matrix product; keep the loop free.
+        return await asyncio.to_thread(self.search, query, k)
+
+
+class VectorIndex(Searchable):
+    def __init__(
+        self,
+        path: str,
+        db: sqlite3.Connection,
+        embedder: Embedder,
+        vectors: np.ndarray,
+        ids: np.ndarray | None = None,
+        lists: np.ndarray | None = None,
+        centroids: np.ndarray | None = None,
+        n_probe: int | None = None,
+    ):
+        self.path = path
+        # Opened up front, like the memory map: a reader keeps the files it
+        # opened when the index is rebuilt underneath it.
+        self.db = db
+        self.embedder = embedder
+        self.vectors = vectors
+        self.ids = ids
+        self.lists = lists
+        self.centroids = centroids
+        self.n_probe = n_probe or settings.RETRIEVAL_N_PROBE
+        self._db_lock = threading.Lock()
+
+    @classmethod
+    def open(
+        cls, path: str, embedder: Embedder | None = None, n_probe: int | None = None
+    ) -> "VectorIndex":
+        """Open the index at `path` with the embedder it was built with."""
+        db = connect_readonly(path)
+        meta = dict(db.execute("SELECT key, value FROM meta"))
+        if embedder is None:
+            embedder = get_embedder(meta["embedder"])
+        n, dim = int(meta["count"]), int(meta["dim"])
+        if n:
+            vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        else:
+            vectors = np.empty((0, dim), dtype=np.float32)
+        if vectors.shape != (n, dim) or dim != embedder.dim:
+            raise ValueError(f"Index {path} is inconsistent with its metadata")
+        if int(meta["n_lists"]) == 0:
+            index = cls(path, db, embedder, vectors, n_probe=n_probe)
+        else:
+            index = cls(
+                path,
+                db,
+                embedder,
+                vectors,
+                ids=np.load(os.path.join(path, "ids.npy")),
+                lists=np.load(os.path.join(path, "lists.npy")),
+                centroids=np.load(os.path.join(path, "centroids.npy")),
+                n_probe=n_probe,
+            )
+        return index
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def iter_batches(
+        self, batch_rows: int = BLOCK_ROWS
+    ) -> Iterator[tuple[list[Chunk], np.ndarray]]:
+        """All (chunks, vectors) in chunk id order."""
+        rows_by_id = np.argsort(self.ids) if self.ids is not None else None
+        for start in range(0, len(self), batch_rows):
+            end = min(start + batch_rows, len(self))
+            if rows_by_id is None:
+                vectors = np.asarray(self.vectors[start:end])
+            else:
+                vectors = self.vectors[rows_by_id[start:end]]
+            with self._db_lock:
+                rows = self.db.execute(
+                    "SELECT text, source, page, file_id FROM chunks "
+                    "WHERE id >= ? AND id < ? ORDER BY id",
+                    (start, end),
+                ).fetchall()
+            yield [Chunk(*row) for row in rows], vectors
+
+    def file_chunk_ids(self, file_ids: Iterable[int]) -> np.ndarray:
+        with self._db_lock:
+            return file_chunk_ids(self.db, file_ids)
+
+    def row_mask(self, deleted: np.ndarray) -> np.ndarray:
+        """Flags by chunk id -> flags by row of `vectors`."""
+        return deleted if self.ids is None else deleted[self.ids]
+
+    def search_vectors(
+        self,
+        queries: np.ndarray,
+        k: int,
+        n_probe: int | None = None,
+        deleted_rows: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top k rows for each query vector: (scores, chunk ids), both
+        (n_queries, k), best first, skipping rows flagged in `deleted_rows`
+        (see `row_mask`). Padded with -inf and -1 when the index has fewer
+        than k such rows.
+        """
+        queries = normalize(np.array(queries, dtype=np.float32, ndmin=2))
+        n_probe = n_probe or self.n_probe
+        if self.lists is not None and n_probe < len(self.centroids):
+            scores, rows = self._search_lists(queries, k, n_probe, deleted_rows)
+        else:
+            scores, rows = self._search_all(queries, k, deleted_rows)
+        if deleted_rows is not None:
+            rows = np.where(np.isneginf(scores), -1, rows)
+        if self.ids is not None:
+            rows = np.where(rows >= 0, self.ids[np.maximum(rows, 0)], -1)
+        return scores, rows
+
+    def _search_all(
+        self, queries: np.ndarray, k: int, deleted_rows: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        candidate_scores, candidate_rows = [], []
+        for start in range(0, len(self.vectors), BLOCK_ROWS):
+            # (n_queries, block rows): each query's scores are contiguous.
+            scores = queries @ self.vectors[start : start + BLOCK_ROWS].T
+            if deleted_rows is not None:
+                scores[:, deleted_rows[start : start + BLOCK_ROWS]] = -np.inf
+            kk = min(k, scores.shape[1])
+            best = np.argpartition(scores, -kk, axis=1)[:, -kk:]
+            candidate_scores.append(np.take_along_axis(scores, best, axis=1))
+            candidate_rows.append(best + start)
+        if not candidate_scores:
+            return self._pad(np.empty((len(queries), 0)), np.empty((len(queries), 0)), k)
+        scores = np.concatenate(candidate_scores, axis=1)
+        rows = np.concatenate(candidate_rows, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        return self._pad(scores, np.take_along_axis(rows, order, axis=1), k)
+
+    def _search_lists(
+        self,
+        queries: np.ndarray,
+        k: int,
+        n_probe: int,
+        deleted_rows: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        per_query: list[list] = [[] for _ in queries]
+        # Each probed partition is read once for all the queries that probe it.
+        for list_id in np.unique(probes):
+            start, end = int(self.lists[list_id]), int(self.lists[list_id + 1])
+            if start == end:
+                continue
+            query_ids = np.flatnonzero((probes == list_id).any(axis=1))
+            scores = self.vectors[start:end] @ queries[query_ids].T
+            if deleted_rows is not None:
+                scores[deleted_rows[start:end]] = -np.inf
+            for j, query_id in enumerate(query_ids):
+                per_query[query_id].append((scores[:, j], start))
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for query_id, parts in enumerate(per_query):
+            if not parts:
+                continue
+            scores = np.concatenate([part for part, _ in parts])
+            rows = np.concatenate(
+                [np.arange(start, start + len(part)) for part, start in parts]
+            )
+            best = top_k(scores, k)
+            all_scores[query_id, : len(best)] = scores[best]
+            all_rows[query_id, : len(best)] = rows[best]
+        return all_scores, all_rows
+
+    @staticmethod
+    def _pad(scores: np.ndarray, rows: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        missing = k - scores.shape[1]
+        if missing <= 0:
+            return scores, rows
+        return (
+            np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf),
+            np.pad(rows.astype(np.int64), ((0, 0), (0, missing)), constant_values=-1),
+        )
+
+    def get_chunks(self, ids: Iterable[int]) -> dict[int, Chunk]:
+        ids = [int(i) for i in ids if i >= 0]
+        if not ids:
+            return {}
+        with self._db_lock:
+            rows = self.db.execute(
+                "SELECT id, text, source, page, file_id FROM chunks "
+                f"WHERE id IN ({','.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+        return {row[0]: Chunk(*row[1:]) for row in rows}
+
+
+def train_centroids(
+    vectors: np.ndarray, n_lists: int, n_iter: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Spherical k-means on a sample of at most 64 rows per centroid."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = np.sort(rng.choice(n, size=min(n, n_lists * 64), replace=False))
+    sample = np.asarray(vectors[sample], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = assign_lists(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_lists)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        # Reseed empty partitions from random rows.
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        normalize(centroids)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + BLOCK_ROWS])
+        assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def default_n_lists(n: int) -> int:
+    if n < settings.RETRIEVAL_PARTITION_MIN_ROWS:
+        return 0
+    return int(np.sqrt(n))
+
+
+def lock_file(file, blocking: bool = True) -> bool:
+    """
+    Exclusive lock on an open file, across processes: flock on POSIX, a
+    one-byte msvcrt lock on Windows. False if `blocking` is off and another
+    process holds it.
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    while True:
+        file.seek(0)
+        try:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.05)
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def index_lock(path: str):
+    """Serializes writers of one index, across processes."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", "a") as file:
+        lock_file(file)
+        try:
+            yield
+        finally:
+            unlock_file(file)
+
+
+def write_index(
+    path: str,
+    embedder: Embedder,
+    batches: Iterable[tuple[list[Chunk], np.ndarray]],
+    n_lists: int | None = None,
+    centroids: np.ndarray | None = None,
+) -> dict:
+    """
+    Write (chunks, vectors) batches as a new index at `path`, numbering the
+    chunks in order, and swap it in. Readers that already opened the old
+    index keep reading it. Replacing an index other processes write to
+    needs `index_lock`.
+    """
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_path)
+    raw_path = os.path.join(tmp_path, "vectors.raw")
+    db = sqlite3.connect(os.path.join(tmp_path, "chunks.sqlite"))
+    try:
+        for statement in SCHEMA:
+            db.execute(statement)
+        n = 0
+        with open(raw_path, "wb") as raw:
+            for batch, vectors in batches:
+                vectors = np.array(vectors, dtype=np.float32)
+                vectors = vectors.reshape(len(batch), embedder.dim)
+                raw.write(normalize(vectors).tobytes())
+                db.executemany(
+                    "INSERT INTO chunks (id, file_id, source, page, text) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (n + i, chunk.file_id, chunk.source, chunk.page, chunk.text)
+                        for i, chunk in enumerate(batch)
+                    ],
+                )
+                n += len(batch)
+        if centroids is not None:
+            n_lists = len(centroids)
+        elif n_lists is None:
+            n_lists = default_n_lists(n)
+        n_lists = min(n_lists, n)
+        if n:
+            write_vectors(tmp_path, raw_path, n, embedder.dim, n_lists, centroids)
+        os.remove(raw_path)
+        meta = {
+            "embedder": embedder.name,
+            "dim": embedder.dim,
+            "count": n,
+            "n_lists": n_lists,
+        }
+        db.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in meta.items()],
+        )
+        db.commit()
+    except BaseException:
+        db.close()
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    db.close()
+
+    old_path = f"{path}.old-{uuid.uuid4().hex}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return meta
+
+
+def build_index(
+    path: str,
+    chunks: Iterable[Chunk],
+    embedder: Embedder | None = None,
+    n_lists: int | None = None,
+    batch_size: int = 512,
+) -> dict:
+    """
+    Embed `chunks` (with RETRIEVAL_EMBEDDER by default) into a new index at
+    `path`, replacing any index there.
+    """
+    if embedder is None:
+        embedder = get_embedder(settings.RETRIEVAL_EMBEDDER)
+    chunks = iter(chunks)
+
+    def batches():
+        while batch := list(islice(chunks, batch_size)):
+            yield batch, embedder.embed([chunk.text for chunk in batch])
+
+    with index_lock(path):
+        return write_index(path, embedder, batches(), n_lists)
+
+
+def write_vectors(
+    path: str,
+    raw_path: str,
+    n: int,
+    dim: int,
+    n_lists: int,
+    centroids: np.ndarray | None = None,
+):
+    flat = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(n, dim))
+    out = np.lib.format.open_memmap(
+        os.path.join(path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(n, dim)
+    )
+    if n_lists:
+        if centroids is None:
+            centroids = train_centroids(flat, n_lists)
+        assign = assign_lists(flat, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_lists)
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        np.save(os.path.join(path, "lists.npy"), np.concatenate([[0], np.cumsum(counts)]))
+        np.save(os.path.join(path, "ids.npy"), order.astype(np.int64))
+        for start in range(0, n, BLOCK_ROWS):
+            out[start : start + BLOCK_ROWS] = flat[order[start : start + BLOCK_ROWS]]
+    else:
+        for start in range(0, n, BLOCK_ROWS):
+            out[start : start + BLOCK_ROWS] = flat[start : start + BLOCK_ROWS]
+    out.flush()
+    del out, flat
@@ -2,6 +2,8 @@ import os
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
+load_dotenv()
+
 
 class Settings(BaseSettings):
     APP_NAME: str = "FastAPI App"
@@ -9,5 +11,148 @@ class Settings(BaseSettings):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
+    # Connection pool, per engine (sync and async each have one).
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    # SQLite pragmas applied on every new connection.
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+
+    # /metrics, and the HTTP, DB, LLM and graph timings behind it.
+    METRICS_ENABLED: bool = True
+
+    # Build the chat graph and default client in the background at startup.
+    WARMUP_ON_STARTUP: bool = True
+
+    # Chat model clients. LLMModel.name is the deployment; "azure/<name>"
+    # selects Azure OpenAI and "fake/<name>" the local fake model regardless
+    # of LLM_PROVIDER. Threads whose assistant has no model use
+    # DEFAULT_LLM_MODEL.
+    LLM_PROVIDER: str = "openai"
+    DEFAULT_LLM_MODEL: str = "gpt-4o-mini-2024-07-18"
+    # Connection pool shared by all clients of a provider.
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_TIMEOUT: float = 120
+    # Resolved assistants (model, system prompt, indexes) are reused for this
+    # long; the routers also invalidate them on change within this process.
+    ASSISTANT_CACHE_TTL_SECONDS: float = 30
+    # Chat chains kept for assistants with their own system prompt (LRU).
+    ASSISTANT_CHAINS_MAX: int = 1000
+    # Local fake model (LLM_PROVIDER="fake" or "fake/<name>"), for load tests.
+    FAKE_LLM_TTFT_MS: float = 200
+    FAKE_LLM_TOKEN_LATENCY_MS: float = 10
+    FAKE_LLM_OUTPUT_TOKENS: int = 50
+    FAKE_LLM_STRUCTURED_RESPONSE: dict = {"intent": "no-RAG"}
+
+    # Admission control per LLMModel.name: LLM_RATE_LIMITS maps a model to
+    # {"rpm": ..., "tpm": ...}; other models use the defaults, 0 is unlimited.
+    LLM_RATE_LIMITS: dict[str, dict[str, int]] = {}
+    LLM_DEFAULT_RPM: int = 0
+    LLM_DEFAULT_TPM: int = 0
+    LLM_ADMISSION_MAX_QUEUE: int = 64
+    LLM_ADMISSION_MAX_WAIT_SECONDS: float = 10
+    # Completion tokens reserved per call until the real usage is known.
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = 512
+
+    # Chat history sent upstream, in tokens. Per-model and per-assistant
+    # overrides take precedence over the default, assistant first.
+    HISTORY_TOKEN_BUDGET: int = 4000
+    HISTORY_TOKEN_BUDGET_BY_MODEL: dict[str, int] = {}
+    HISTORY_TOKEN_BUDGET_BY_ASSISTANT: dict[int, int] = {}
+    # "estimate" (characters / 4) or a tiktoken encoding name such as "o200k_base".
+    HISTORY_TOKENIZER: str = "estimate"
+    # Rows fetched per round trip while filling the budget.
+    HISTORY_FETCH_BATCH: int = 32
+    # Memory bound of the in-process thread history cache.
+    HISTORY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Rolling summary of the messages that no longer fit the history window,
+    # refreshed in the background once SUMMARY_MIN_DELTA_TOKENS more have
+    # been added to a thread that overflows its window. Each upstream call
+    # folds at most SUMMARY_CHUNK_TOKENS of new messages into the summary.
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_MIN_DELTA_TOKENS: int = 1000
+    SUMMARY_CHUNK_TOKENS: int = 4000
+    SUMMARY_MAX_WORDS: int = 300
+    # Model for summaries; the assistant's model when unset.
+    SUMMARY_LLM_MODEL: str | None = None
+    SUMMARY_CACHE_SIZE: int = 10000
+
+    # Chat messages are group-committed by a background writer. Without write
+    # behind, each turn waits for its own commit.
+    MESSAGE_WRITE_BEHIND: bool = True
+    MESSAGE_WRITE_MAX_BATCH: int = 256
+    MESSAGE_WRITE_FLUSH_INTERVAL_MS: int = 20
+    # Retries of a batch that hit a transient error, backing off from
+    # MESSAGE_WRITE_RETRY_BACKOFF_MS; then each write is committed alone.
+    MESSAGE_WRITE_RETRIES: int = 3
+    MESSAGE_WRITE_RETRY_BACKOFF_MS: int = 50
+
+    # Turns of one thread run one at a time; inputs that arrive while a turn
+    # runs are coalesced into the next one, up to CHAT_COALESCE_MAX_INPUTS.
+    CHAT_THREAD_MAX_WAIT_SECONDS: float = 60
+    CHAT_THREAD_MAX_PENDING: int = 16
+    CHAT_COALESCE_MAX_INPUTS: int = 8
+
+    # Response cache for repeated questions, opt-in per assistant. Turns with
+    # more than RESPONSE_CACHE_MAX_HISTORY messages of history are not cached.
+    RESPONSE_CACHE_ASSISTANT_IDS: list[int] = []
+    RESPONSE_CACHE_MAX_HISTORY: int = 0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_TTL_SECONDS: int = 24 * 3600
+
+    # Local intent classifier; below the threshold the LLM classifier decides.
+    INTENT_MODEL_PATH: str | None = None
+    INTENT_LLM_MODEL: str = "gpt-4o-mini"
+    # Reply tokens reserved for one classification ({"intent": ...}).
+    INTENT_COMPLETION_TOKENS_ESTIMATE: int = 32
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.8
+    INTENT_CACHE_SIZE: int = 10000
+    # Batch classification: upper bound on concurrent LLM calls per request.
+    INTENT_BATCH_MAX_CONCURRENCY: int = 16
+
+    # Assistants linked to an index classify each question and retrieve
+    # RETRIEVAL_TOP_K chunks for do-RAG ones. Indexes with at least
+    # RETRIEVAL_PARTITION_MIN_ROWS chunks are built partitioned, and a query
+    # scans the RETRIEVAL_N_PROBE partitions nearest to it.
+    RETRIEVAL_TOP_K: int = 4
+    RETRIEVAL_DATA_DIR: str = "./data/indexes"
+    RETRIEVAL_EMBEDDER: str = "hashing-256"
+    RETRIEVAL_PARTITION_MIN_ROWS: int = 50_000
+    RETRIEVAL_N_PROBE: int = 16
+    # Searches reuse an open index snapshot for this long before checking
+    # whether a newer version was published.
+    RETRIEVAL_STALE_CHECK_SECONDS: float = 1.0
+    # Compaction merges the segments with fewer than
+    # RETRIEVAL_COMPACT_SMALL_ROWS live chunks once there are
+    # RETRIEVAL_COMPACT_MIN_SEGMENTS of them, and rewrites any segment whose
+    # deleted share reached RETRIEVAL_COMPACT_DELETED_RATIO.
+    RETRIEVAL_COMPACT_SMALL_ROWS: int = 50_000
+    RETRIEVAL_COMPACT_MIN_SEGMENTS: int = 4
+    RETRIEVAL_COMPACT_DELETED_RATIO: float = 0.3
+
+    # Ingestion worker (python -m app.ai_cores.ingestion): files live under
+    # INGEST_DATA_DIR and are chunked into word windows by INGEST_PROCESSES
+    # processes (0: one per CPU). Up to INGEST_COMMIT_FILES files are
+    # appended to an index at once. A processing file whose worker stopped
+    # renewing it for INGEST_LEASE_SECONDS is queued again.
+    INGEST_DATA_DIR: str = "./data/files"
+    INGEST_PROCESSES: int = 0
+    INGEST_CHUNK_WORDS: int = 200
+    INGEST_CHUNK_OVERLAP_WORDS: int = 40
+    INGEST_COMMIT_FILES: int = 16
+    INGEST_LEASE_SECONDS: int = 300
+    INGEST_POLL_SECONDS: float = 5
+    # How often the worker compacts the indexes in the background.
+    INGEST_COMPACT_SECONDS: float = 60
+
     class Config:
         case_sensitive = True
+
+
+settings = Settings()
@@ -0,0 +1,287 @@
+"""
+In-process metrics in the Prometheus text exposition format, without a
+client library.
+
+Histograms, counters and gauges keep their samples per label set in plain
+dicts under a lock; an observation is a bisect and two additions. Stats
+collectors (the caches, the writer, the mailbox, admission control) are read
+only when /metrics is scraped. MetricsMiddleware is a pure ASGI middleware,
+so it adds no task or buffering per request and streamed responses are
+timed until their last chunk.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+# Routing nodes take milliseconds, the model node seconds.
+NODE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        lines = self._header()
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: list[Metric] = []
+        # name -> (stats function, label name for nested stats or None)
+        self._collectors: dict[str, tuple[Callable[[], dict], str | None]] = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labelnames, buckets))
+
+    def register_stats(self, name: str, stats: Callable[[], dict], label: str | None = None):
+        """
+        Export a `stats()` dict as `<prefix><name>_<key>` samples when scraped.
+        With `label`, stats() returns {label value: {key: number}}.
+        """
+        self._collectors[name] = (stats, label)
+
+    def _render_stats(self, name: str, stats: Callable[[], dict], label: str | None) -> list[str]:
+        samples: dict[str, list[str]] = {}
+        values = stats()
+        rows = values.items() if label else [(None, values)]
+        for label_value, row in rows:
+            labels = _labels((label,), (label_value,)) if label else ""
+            for key, value in row.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{self.prefix}{name}_{key}"
+                samples.setdefault(metric, []).append(f"{metric}{labels} {_number(value)}")
+        lines = []
+        for metric, metric_lines in samples.items():
+            lines.append(f"# TYPE {metric} untyped")
+            lines.extend(metric_lines)
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, (stats, label) in list(self._collectors.items()):
+            lines.extend(self._render_stats(name, stats, label))
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(prefix="chatbot_")
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = metrics.gauge(
+    "http_requests_in_flight", "Requests being served.", ("method",)
+)
+LLM_TTFT_SECONDS = metrics.histogram(
+    "llm_time_to_first_token_seconds",
+    "Upstream model time to first token; the full latency when not streaming.",
+    ("model",),
+    LLM_BUCKETS,
+)
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_duration_seconds",
+    "Upstream model call latency.",
+    ("model", "outcome"),
+    LLM_BUCKETS,
+)
+GRAPH_NODE_SECONDS = metrics.histogram(
+    "graph_node_duration_seconds",
+    "Chat graph node run time.",
+    ("graph", "node"),
+    NODE_BUCKETS,
+)
+GRAPH_ROUTES = metrics.counter(
+    "graph_routes_total", "Turns routed by the intent node.", ("graph", "route")
+)
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_duration_seconds",
+    "Statement execution time, by engine and statement type.",
+    ("engine", "statement"),
+    DB_BUCKETS,
+)
+DB_ERRORS = metrics.counter(
+    "db_errors_total", "Statements that raised.", ("engine",)
+)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request by route template, e.g. /messages/{thread_id},
+    so per-id paths do not create a series each.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method=method)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+
+def statement_type(statement: str) -> str:
+    keyword = statement.lstrip()[:8].split(None, 1)
+    keyword = keyword[0].upper() if keyword else ""
+    if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        return keyword
+    return "OTHER"
+
+
+def instrument_engine(engine, name: str):
+    """Time statements on a (sync) Engine through its cursor events."""
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.observe(
+            time.perf_counter() - start, engine=name, statement=statement_type(statement)
+        )
+
+    def error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+        DB_ERRORS.inc(engine=name)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", error)
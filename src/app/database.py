@@ -1,15 +1,101 @@
-from os import getenv
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.models import Base  # noqa: F401  (single declarative base for the app)
 
-load_dotenv()
-DATABASE_URL = getenv("DATABASE_URL", "sqlite:///./test.db")
-connect_string = f"sqlite:///{DATABASE_URL}"
-engine = create_engine(connect_string, connect_args={"check_same_thread": False})
+# Async drivers for the chat path, by sync dialect name.
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def get_database_url(database_url: str) -> URL:
+    """
+    Full SQLAlchemy URLs are used as given. A bare path is taken as a SQLite
+    file, which is how DATABASE_URL was configured before full URLs were
+    supported.
+    """
+    if "://" not in database_url:
+        database_url = f"sqlite:///{database_url}"
+    return make_url(database_url)
+
+
+def get_async_database_url(url: URL) -> URL:
+    if "+" in url.drivername or url.drivername not in ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=f"{url.drivername}+{ASYNC_DRIVERS[url.drivername]}")
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        # Readers no longer block the writer and commits append to the WAL
+        # instead of rewriting pages, which is what keeps concurrent chat
+        # writes from failing with "database is locked".
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def is_sqlite_memory(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(url: URL) -> dict:
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if is_sqlite_memory(url):
+            # In-memory databases live in a single connection.
+            return options
+    else:
+        options = {"pool_pre_ping": True, "pool_recycle": settings.DB_POOL_RECYCLE}
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def create_db_engine(url: URL) -> Engine:
+    engine = create_engine(url, **engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def create_async_db_engine(url: URL):
+    url = get_async_database_url(url)
+    options = engine_options(url)
+    if url.get_backend_name() == "sqlite":
+        options.pop("connect_args")
+    async_engine = create_async_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return async_engine
+
+
+database_url = get_database_url(settings.DATABASE_URL)
+engine = create_db_engine(database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+
+# Async engine for the chat path, so that history reads and message writes
+# do not block the event loop.
+async_engine = create_async_db_engine(database_url)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+if settings.METRICS_ENABLED:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
 
 
 def get_db():
@@ -18,3 +104,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,10 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-# from .routers import users, llm_models, assistants, chat_stream
-from app.routers import chat, threads, messages
+# from .routers import users, chat_stream
+from app.routers import (
+    chat,
+    threads,
+    messages,
+    intent,
+    llm_models,
+    assistants,
+    usage,
+    metrics as metrics_router,
+)
+from app.ai_cores import bc_graph
+from app.ai_cores.admission import admission
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.llms import llm_registry
+from app.ai_cores.response_cache import response_cache
+from app.ai_cores.retrieval import retrievers
+from app.ai_cores.summarizer import summarizer
+from app.ai_cores.thread_mailbox import thread_mailbox
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics
+from app.ai_cores.message_writer import message_writer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy AI objects are built lazily; warm them up off the event loop so
+    # the app serves requests right away and the first chat does not pay.
+    warm_up = None
+    if settings.WARMUP_ON_STARTUP:
+        warm_up = asyncio.create_task(asyncio.to_thread(bc_graph.warm_up))
+    yield
+    if warm_up is not None:
+        await asyncio.gather(warm_up, return_exceptions=True)
+    # Summaries are best effort; the next turn of the thread reschedules them.
+    await summarizer.close()
+    # Commit chat messages still buffered by the write-behind queue.
+    await message_writer.close()
+    await llm_registry.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -16,15 +56,30 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    metrics.register_stats("history_cache", history_cache.stats)
+    metrics.register_stats("response_cache", response_cache.stats)
+    metrics.register_stats("message_writer", message_writer.stats)
+    metrics.register_stats("thread_mailbox", thread_mailbox.stats)
+    metrics.register_stats("llm_registry", llm_registry.stats)
+    metrics.register_stats("summarizer", summarizer.stats)
+    metrics.register_stats("graph_registry", bc_graph.graph_registry.stats)
+    metrics.register_stats("retrievers", retrievers.stats)
+    metrics.register_stats("admission", admission.stats, label="model")
 
 
 # app.include_router(users.router)
-# app.include_router(llm_models.router)
-# app.include_router(assistants.router)
 # app.include_router(chat_stream.router)
 app.include_router(chat.router)
 app.include_router(threads.router)
 app.include_router(messages.router)
+app.include_router(intent.router)
+app.include_router(llm_models.router)
+app.include_router(assistants.router)
+app.include_router(usage.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
 
 
 @app.get("/")
@@ -1,10 +1,16 @@
 from datetime import datetime
 from sqlalchemy import (
+    Column,
+    Enum,
+    Float,
+    Index,
     Integer,
+    PrimaryKeyConstraint,
     Boolean,
     String,
     DateTime,
     ForeignKey,
+    Table,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
@@ -71,6 +77,88 @@ class Assistant(Base):
     activated: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
 
 
+assistant_index_association = Table(
+    "assistant_index",
+    Base.metadata,
+    Column("assistant_id", Integer, ForeignKey("assistants.id"), primary_key=True),
+    Column("index_id", Integer, ForeignKey("ai_search_index.id"), primary_key=True),
+)
+
+
+class AISearchIndex(Base):
+    """
+    A document collection assistants can retrieve from.
+
+    index_name: Directory of the index under RETRIEVAL_DATA_DIR.
+    """
+
+    __tablename__ = "ai_search_index"
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, index=True, autoincrement=True
+    )
+    index_name: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=func.now(), onupdate=func.now()
+    )
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+
+
+FileStatusEnum = Enum(
+    "wait-for-process",
+    "processing",
+    "upload-failed",
+    "uploaded",
+    "wait-for-delete",
+    "deleted",
+    "delete-failed",
+    "failed",
+    name="file_status_enum",
+    create_constraint=True,  # Ensures only allowed values are stored
+    validate_strings=True,
+)
+
+
+class File(Base):
+    """
+    A document of an AISearchIndex, stored at
+    INGEST_DATA_DIR/<file_dir_name>/<name>.
+
+    The ingestion worker moves it from wait-for-process to processing, then
+    to uploaded once its chunks are in the index (or failed / upload-failed).
+    last_change_at doubles as the lease of a processing file.
+    """
+
+    __tablename__ = "files"
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, index=True, autoincrement=True
+    )
+    index_id: Mapped[int] = mapped_column(
+        ForeignKey("ai_search_index.id"), index=True, nullable=False
+    )
+
+    name: Mapped[str] = mapped_column(String(128), nullable=False)
+    file_dir_name: Mapped[str] = mapped_column(String(128), nullable=False)
+    n_pages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    size: Mapped[float] = mapped_column(Float, nullable=False)
+    process_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(
+        FileStatusEnum, nullable=False, default="wait-for-process"
+    )
+    last_change_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=func.now()
+    )
+
+    __table_args__ = (
+        # The worker's queue: oldest files of a status first.
+        Index("ix_files_status_id", "status", "id"),
+    )
+
+
 class Thread(Base):
     """
     Equivalent to a chat session in the chatbot.
@@ -106,6 +194,11 @@ class Thread(Base):
         lazy="selectin",
     )
 
+    __table_args__ = (
+        # Thread list of a user, newest first.
+        Index("ix_threads_user_id_activated_id", "user_id", "activated", "id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -131,3 +224,59 @@ class Message(Base):
 
     # relationship
     thread = relationship("Thread", back_populates="messages")
+
+    __table_args__ = (
+        # Chat history: a thread's messages in conversation order.
+        Index("ix_messages_thread_id_created_at_id", "thread_id", "created_at", "id"),
+        # Cursor pagination of GET /messages/{thread_id}.
+        Index("ix_messages_thread_id_id", "thread_id", "id"),
+    )
+
+
+class ThreadSummary(Base):
+    """
+    Rolling summary of a thread's older messages, those with id up to
+    last_message_id. Maintained in the background by `summarizer`, which
+    folds in only the messages after last_message_id each time.
+    """
+
+    __tablename__ = "thread_summaries"
+
+    thread_id: Mapped[int] = mapped_column(ForeignKey("threads.id"), primary_key=True)
+    content: Mapped[str] = mapped_column(String(None), nullable=False)
+    last_message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    n_tokens: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=func.now(), onupdate=func.now()
+    )
+
+
+class TokenUsage(Base):
+    """
+    Upstream token usage of a thread, rolled up per hour.
+
+    Maintained incrementally by the message writer in the same transaction
+    as the messages, so usage over a time range is a sum over a few hourly
+    rows instead of over `messages`. user_id and assistant_id are copied
+    from the thread for the per-user and per-assistant indexes.
+    """
+
+    __tablename__ = "token_usage"
+
+    thread_id: Mapped[int] = mapped_column(ForeignKey("threads.id"), nullable=False)
+    hour: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    assistant_id: Mapped[int] = mapped_column(
+        ForeignKey("assistants.id"), nullable=False
+    )
+    prompt_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    n_calls: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("thread_id", "hour"),
+        Index("ix_token_usage_user_id_hour", "user_id", "hour"),
+        Index("ix_token_usage_assistant_id_hour", "assistant_id", "hour"),
+        # Top threads over a time range.
+        Index("ix_token_usage_hour", "hour"),
+    )
@@ -5,6 +5,7 @@ from datetime import datetime
 
 from ..database import get_db
 from ..models import Assistant
+from ..ai_cores.llms import llm_registry
 from ..schemas.assistants import AssistantCreate, AssistantUpdate, AssistantResponse
 
 router = APIRouter(prefix="/api/assistant", tags=["Assistant"])
@@ -47,6 +48,7 @@ def update_assistant(
         setattr(assistant, key, value)
     assistant.updated_at = datetime.now()
     db.commit()
+    llm_registry.invalidate_assistant(assistant_id)
     db.refresh(assistant)
     return assistant
 
@@ -59,6 +61,7 @@ def delete_assistant(assistant_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Assistant not found")
     db.delete(assistant)
     db.commit()
+    llm_registry.invalidate_assistant(assistant_id)
     return {"message": "Assistant deleted successfully"}
 
 
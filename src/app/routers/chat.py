@@ -1,9 +1,16 @@
+import json
+import logging
+from typing import AsyncIterable
 from fastapi import APIRouter, HTTPException
-from langchain_core.messages import HumanMessage
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage, AIMessageChunk
 from pydantic import BaseModel
-from app.ai_cores.bc_graph import chat_graph
+from app.ai_cores.admission import AdmissionRejected
+from app.ai_cores.bc_graph import ThreadNotFoundError, get_thread_graph
+from app.ai_cores.thread_mailbox import ThreadBusyError, thread_mailbox
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
+logger = logging.getLogger(__name__)
 
 
 class ChatRequest(BaseModel):
@@ -11,6 +18,47 @@ class ChatRequest(BaseModel):
     input_message: str
 
 
+def format_sse(data: dict, event: str | None = None) -> str:
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+async def stream_chat_events(
+    input_message: HumanMessage, config: dict
+) -> AsyncIterable[str]:
+    """
+    Run the thread's graph in "messages" stream mode and yield one SSE event per token.
+
+    The graph node persists the full AI message through add_messages once the
+    model finishes, so the stream ends with an "end" event carrying the whole
+    completion after it has been stored.
+    """
+    content = []
+    try:
+        async with thread_mailbox.exclusive(config["configurable"]["thread_id"]):
+            chat_graph = await get_thread_graph(config["configurable"]["thread_id"])
+            async for message, metadata in chat_graph.astream(
+                {"messages": [input_message]}, config, stream_mode="messages"
+            ):
+                if metadata.get("langgraph_node") != "model" or not message.content:
+                    continue
+                if not isinstance(message, AIMessageChunk) and content:
+                    # Final message of a turn that was already streamed token by token.
+                    continue
+                content.append(message.content)
+                yield format_sse({"token": message.content})
+        yield format_sse({"message": "".join(content)}, event="end")
+    except (ThreadBusyError, ThreadNotFoundError) as e:
+        yield format_sse({"detail": str(e)}, event="error")
+    except AdmissionRejected as e:
+        yield format_sse(
+            {"detail": e.detail, "retry_after": e.headers["Retry-After"]}, event="error"
+        )
+    except Exception as e:
+        logger.error(f"Error streaming chat for config {config}: {str(e)}")
+        yield format_sse({"detail": f"Internal Server Error: {str(e)}"}, event="error")
+
+
 @router.post("/")
 async def chat(request: ChatRequest):
     # Prepare the configuration dynamically
@@ -23,10 +71,45 @@ async def chat(request: ChatRequest):
     # Construct the user input message
     input_message = HumanMessage(content=request.input_message)
 
-    # Invoke the chat model
+    async def run_turn(messages: list[HumanMessage]) -> str:
+        chat_graph = await get_thread_graph(request.thread_id)
+        result = await chat_graph.ainvoke({"messages": messages}, config)
+        return result.get("messages")[-1].content
+
+    # Turns of one thread run in order; inputs sent while the previous turn
+    # runs are answered together.
     try:
-        result = chat_graph.invoke({"messages": [input_message]}, config)
-        ai_message = result.get("messages")[-1].content
+        ai_message = await thread_mailbox.submit(request.thread_id, input_message, run_turn)
         return {"message": ai_message}
+    except ThreadBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ThreadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
     except Exception as e:
+        if getattr(e, "status_code", None) == 429:
+            # The provider's own rate limit, e.g. openai.RateLimitError.
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            retry_after = headers.get("retry-after", "1")
+            raise HTTPException(
+                status_code=429,
+                detail="Upstream rate limit reached",
+                headers={"Retry-After": retry_after},
+            )
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    config = {
+        "configurable": {
+            "thread_id": request.thread_id,
+        }
+    }
+    input_message = HumanMessage(content=request.input_message)
+    return StreamingResponse(
+        stream_chat_events(input_message, config),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import AsyncIterable
 from dotenv import load_dotenv
 
@@ -6,7 +7,7 @@ from fastapi.responses import StreamingResponse
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain.chat_models import init_chat_model
+from app.ai_cores.llms import llm_registry
 
 
 load_dotenv()
@@ -21,7 +22,6 @@ async def send_message(chain, question: str) -> AsyncIterable[str]:
 
 
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
-llm = init_chat_model(model="gpt-4o-mini", model_provider="openai")
 prompt_rag = ChatPromptTemplate.from_messages(
     [
         (
@@ -33,9 +33,14 @@ prompt_rag = ChatPromptTemplate.from_messages(
 )
 
 
+@lru_cache(maxsize=None)
+def get_chain():
+    return prompt_rag | llm_registry.get_client("gpt-4o-mini") | StrOutputParser()
+
+
 @router.get("/stream")
 async def stream_llm_response(query: str):
-    chain = prompt_rag | llm | StrOutputParser()
+    chain = get_chain()
     generator = send_message(chain, query)
     return StreamingResponse(generator, media_type="text/event-stream")
 
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import AsyncIterable
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.ai_cores.chains.intent_classifier import intent_classifier
+from app.core.config import settings
+
+router = APIRouter(prefix="/intent", tags=["Intent"])
+logger = logging.getLogger(__name__)
+
+
+def read_ndjson_inputs(body: bytes) -> list[str]:
+    """Each line is either a JSON string or an object with an "input" field."""
+    return [parse_ndjson_line(line) for line in body.splitlines() if line.strip()]
+
+
+def parse_ndjson_line(line: bytes) -> str:
+    item = json.loads(line)
+    return item if isinstance(item, str) else item["input"]
+
+
+async def stream_verdicts(inputs, max_concurrency: int) -> AsyncIterable[str]:
+    async for index, text, verdict in intent_classifier.abatch_as_completed(
+        inputs, max_concurrency
+    ):
+        if isinstance(verdict, Exception):
+            logger.error(f"Intent classification failed for input {index}: {str(verdict)}")
+            row = {"index": index, "input": text, "error": str(verdict)}
+        else:
+            row = {
+                "index": index,
+                "input": text,
+                "intent": verdict.intent,
+                "source": verdict.source,
+            }
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+@router.post("/batch")
+async def classify_batch(
+    request: Request,
+    max_concurrency: int = Query(4, ge=1),
+):
+    """
+    Classify many inputs and stream NDJSON results as they complete, in
+    completion order; each row carries the `index` of its input.
+
+    The body is either JSON, a list of strings or {"inputs": [...]}, or, with
+    Content-Type application/x-ndjson, one input per line.
+    """
+    max_concurrency = min(max_concurrency, settings.INTENT_BATCH_MAX_CONCURRENCY)
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # The body is read before the response starts: once StreamingResponse
+        # runs, its disconnect listener competes for the same receive channel.
+        try:
+            inputs = read_ndjson_inputs(await request.body())
+        except (ValueError, KeyError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid NDJSON: {str(e)}")
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        inputs = body.get("inputs") if isinstance(body, dict) else body
+        if not isinstance(inputs, list) or not all(isinstance(i, str) for i in inputs):
+            raise HTTPException(status_code=422, detail="Expected a list of strings")
+    return StreamingResponse(
+        stream_verdicts(inputs, max_concurrency), media_type="application/x-ndjson"
+    )
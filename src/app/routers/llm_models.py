@@ -6,6 +6,7 @@ from sqlalchemy.future import select
 from typing import List
 from ..database import get_db
 from ..models import LLMModel
+from ..ai_cores.llms import llm_registry
 from ..schemas.llm_models import LLMModelCreate, LLMModelRead
 
 router = APIRouter(prefix="/api/llm_model", tags=["LLM Models"])
@@ -43,6 +44,7 @@ def update_llm_model(
         raise HTTPException(status_code=404, detail="LLM Model not found")
     model.name = model_data.name
     db.commit()
+    llm_registry.invalidate_models()
     db.refresh(model)
     return model
 
@@ -54,4 +56,5 @@ def delete_llm_model(model_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="LLM Model not found")
     db.delete(model)
     db.commit()
+    llm_registry.invalidate_models()
     return {"message": "LLM Model deleted successfully"}
@@ -1,25 +1,60 @@
 from typing import Any
 import logging
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import Message
-from app.database import get_db
+from app.database import get_async_db
+from app.ai_cores.message_writer import message_writer
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 logger = logging.getLogger(__name__)
 
 
 @router.get("/{thread_id}", response_model=dict[str, Any])
-def get_messages(thread_id: int, db: Session = Depends(get_db)):
+async def get_messages(
+    thread_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before_id: int | None = Query(None, description="Page of messages older than this id"),
+    since_id: int | None = Query(None, description="Messages newer than this id"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Keyset-paginated messages of a thread, oldest first within a page.
+
+    Without a cursor the latest page is returned. Pass `next_cursor` back as
+    `before_id` to load older pages, or poll with `since_id` set to the last id
+    seen to receive only new messages; `next_cursor` is then the `since_id` of
+    the following page. `next_cursor` is null when there is nothing more.
+    """
+    if before_id is not None and since_id is not None:
+        raise HTTPException(
+            status_code=400, detail="before_id and since_id are mutually exclusive"
+        )
     try:
-        messages = (
-            db.query(Message)
-            .filter(Message.thread_id == thread_id)
-            .order_by(Message.id.asc())
-            .all()
+        # Turns still queued in the write-behind writer have no id yet.
+        await message_writer.flush_thread(thread_id)
+        # Served by ix_messages_thread_id_id.
+        query = select(Message.id, Message.ai_generated, Message.content).where(
+            Message.thread_id == thread_id
         )
+        if since_id is not None:
+            query = query.where(Message.id > since_id).order_by(Message.id.asc())
+        else:
+            if before_id is not None:
+                query = query.where(Message.id < before_id)
+            query = query.order_by(Message.id.desc())
+        messages = (await db.execute(query.limit(limit + 1))).all()
+
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if since_id is None:
+            messages.reverse()
+            next_cursor = messages[0].id if has_more else None
+        else:
+            next_cursor = messages[-1].id if has_more else None
 
-        if not messages:
+        if not messages and before_id is None and since_id is None:
             logger.warning(f"No messages found for thread_id: {thread_id}")
             raise HTTPException(status_code=404, detail="No messages found")
 
@@ -27,12 +62,16 @@ def get_messages(thread_id: int, db: Session = Depends(get_db)):
             "success": True,
             "data": [
                 {
+                    "id": message.id,
                     "content": message.content,
                     "ai_generated": message.ai_generated,
                 }
                 for message in messages
             ],
+            "next_cursor": next_cursor,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching messages for thread_id {thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,39 +1,105 @@
 from typing import Any
 import logging
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.models import Thread
-from app.database import get_db
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Message, Thread
+from app.database import get_async_db
+from app.ai_cores.message_writer import message_writer
 
 router = APIRouter(prefix="/threads", tags=["Threads"])
 logger = logging.getLogger(__name__)
 
+PREVIEW_CHARS = 120
+
+
+async def get_thread_previews(
+    db: AsyncSession, thread_ids: list[int]
+) -> dict[int, dict]:
+    """
+    Message count and a preview of the last message for each thread, in one
+    aggregated query over ix_messages_thread_id_id.
+    """
+    for thread_id in thread_ids:
+        await message_writer.flush_thread(thread_id)
+    stats = (
+        select(
+            Message.thread_id,
+            func.count().label("n_messages"),
+            func.max(Message.id).label("last_id"),
+        )
+        .where(Message.thread_id.in_(thread_ids))
+        .group_by(Message.thread_id)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(
+            stats.c.thread_id,
+            stats.c.n_messages,
+            Message.ai_generated,
+            func.substr(Message.content, 1, PREVIEW_CHARS).label("preview"),
+        ).join(Message, Message.id == stats.c.last_id)
+    )
+    return {
+        row.thread_id: {
+            "n_messages": row.n_messages,
+            "last_message": {"content": row.preview, "ai_generated": row.ai_generated},
+        }
+        for row in rows
+    }
+
 
 @router.get("/{user_id}", response_model=dict[str, Any])
-def get_threads(user_id: int, db: Session = Depends(get_db)):
+async def get_threads(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before_id: int | None = Query(None, description="Page of threads older than this id"),
+    include_preview: bool = Query(
+        False, description="Add message count and last message preview"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Active threads of a user, newest first. Pass `next_cursor` back as
+    `before_id` to load the next page; it is null on the last page.
+    """
     try:
-        threads = (
-            db.query(Thread)
-            .filter(Thread.user_id == user_id, Thread.activated == True)
-            .order_by(Thread.id.desc())
-            .all()
+        # Only the listed columns, so Thread.messages is never loaded.
+        # Served by ix_threads_user_id_activated_id.
+        query = select(Thread.id, Thread.name, Thread.assistant_id).where(
+            Thread.user_id == user_id, Thread.activated == True
         )
+        if before_id is not None:
+            query = query.where(Thread.id < before_id)
+        threads = (
+            await db.execute(query.order_by(Thread.id.desc()).limit(limit + 1))
+        ).all()
+
+        has_more = len(threads) > limit
+        threads = threads[:limit]
+        next_cursor = threads[-1].id if has_more else None
 
-        if not threads:
+        if not threads and before_id is None:
             logger.warning(f"No threads found for user_id: {user_id}")
             raise HTTPException(status_code=404, detail="No threads found")
 
-        return {
-            "success": True,
-            "data": [
-                {
-                    "id": thread.id,
-                    "title": thread.name,
-                    "assistant_id": thread.assistant_id,
-                }
-                for thread in threads
-            ],
-        }
+        data = [
+            {
+                "id": thread.id,
+                "title": thread.name,
+                "assistant_id": thread.assistant_id,
+            }
+            for thread in threads
+        ]
+        if include_preview and data:
+            previews = await get_thread_previews(db, [thread["id"] for thread in data])
+            empty = {"n_messages": 0, "last_message": None}
+            for thread in data:
+                thread.update(previews.get(thread["id"], empty))
+
+        return {"success": True, "data": data, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching threads for user_id {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
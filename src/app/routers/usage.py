@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Any
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import TokenUsage
+from app.database import get_async_db
+from app.ai_cores.message_writer import message_writer
+from app.ai_cores.token_usage import usage_hour
+
+router = APIRouter(prefix="/usage", tags=["Usage"])
+logger = logging.getLogger(__name__)
+
+# Usage is rolled up when the message writer commits a turn. A thread's own
+# usage waits for that thread's pending writes; the per-user, per-assistant
+# and top-threads aggregates do not flush the whole writer and may lag by up
+# to one MESSAGE_WRITE_FLUSH_INTERVAL_MS.
+
+TOTALS = (
+    func.coalesce(func.sum(TokenUsage.prompt_tokens), 0).label("prompt_tokens"),
+    func.coalesce(func.sum(TokenUsage.completion_tokens), 0).label("completion_tokens"),
+    func.coalesce(func.sum(TokenUsage.n_calls), 0).label("n_calls"),
+)
+
+
+def in_range(query, start: datetime | None, end: datetime | None):
+    """
+    Usage is kept per hour: `start` is rounded down to its hour and an hour
+    is counted when it begins before `end`.
+    """
+    if start is not None:
+        query = query.where(TokenUsage.hour >= usage_hour(start))
+    if end is not None:
+        query = query.where(TokenUsage.hour < end)
+    return query
+
+
+def as_dict(row) -> dict:
+    return {
+        "prompt_tokens": row.prompt_tokens,
+        "completion_tokens": row.completion_tokens,
+        "total_tokens": row.prompt_tokens + row.completion_tokens,
+        "n_calls": row.n_calls,
+    }
+
+
+async def get_totals(
+    db: AsyncSession, column, key: int, start: datetime | None, end: datetime | None
+) -> dict:
+    query = in_range(select(*TOTALS).where(column == key), start, end)
+    return as_dict((await db.execute(query)).one())
+
+
+@router.get("/threads", response_model=dict[str, Any])
+async def get_top_threads(
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    limit: int = Query(20, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Threads with the most tokens in the time range, highest first."""
+    try:
+        total = (TOTALS[0] + TOTALS[1]).label("total_tokens")
+        query = in_range(
+            select(TokenUsage.thread_id, *TOTALS, total).group_by(TokenUsage.thread_id),
+            start,
+            end,
+        )
+        rows = await db.execute(query.order_by(total.desc()).limit(limit))
+        return {
+            "success": True,
+            "data": [{"thread_id": row.thread_id, **as_dict(row)} for row in rows],
+        }
+    except Exception as e:
+        logger.error(f"Error fetching top threads by usage: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/threads/{thread_id}", response_model=dict[str, Any])
+async def get_thread_usage(
+    thread_id: int,
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        await message_writer.flush_thread(thread_id)
+        # Served by the (thread_id, hour) primary key.
+        data = await get_totals(db, TokenUsage.thread_id, thread_id, start, end)
+        return {"success": True, "data": data}
+    except Exception as e:
+        logger.error(f"Error fetching usage for thread_id {thread_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/users/{user_id}", response_model=dict[str, Any])
+async def get_user_usage(
+    user_id: int,
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        # Served by ix_token_usage_user_id_hour.
+        data = await get_totals(db, TokenUsage.user_id, user_id, start, end)
+        return {"success": True, "data": data}
+    except Exception as e:
+        logger.error(f"Error fetching usage for user_id {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/assistants/{assistant_id}", response_model=dict[str, Any])
+async def get_assistant_usage(
+    assistant_id: int,
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        # Served by ix_token_usage_assistant_id_hour.
+        data = await get_totals(db, TokenUsage.assistant_id, assistant_id, start, end)
+        return {"success": True, "data": data}
+    except Exception as e:
+        logger.error(f"Error fetching usage for assistant_id {assistant_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
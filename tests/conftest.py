@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+import pytest
+
+# The app builds its engines at import time, so the database location and a
+# dummy API key have to be in place before anything under `app` is imported.
+_db_dir = tempfile.mkdtemp(prefix="chatbot-server-tests-")
+os.environ["DATABASE_URL"] = os.path.join(_db_dir, "test.sqlite")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["WARMUP_ON_STARTUP"] = "false"
+
+
+@pytest.fixture()
+def db_tables():
+    from app.ai_cores.admission import admission
+    from app.ai_cores.history_cache import history_cache
+    from app.ai_cores.llms import llm_registry
+    from app.ai_cores.summarizer import summarizer
+    from app.database import engine
+    from app.models import Base
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    history_cache.clear()
+    llm_registry.clear()
+    admission.clear()
+    summarizer.clear()
+    yield
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture()
+def seeded_thread(db_tables):
+    from app.database import SessionLocal
+    from app.models import User, LLMModel, Assistant, Thread
+
+    with SessionLocal() as session:
+        user = User(email="user@example.com", role="admin", is_active=True)
+        llm_model = LLMModel(name="gpt-4o-mini-2024-07-18")
+        session.add_all([user, llm_model])
+        session.flush()
+        assistant = Assistant(
+            user_id=user.id,
+            name="AI Assistant",
+            system_prompt="You are a helpful assistant.",
+            llm_model_id=llm_model.id,
+        )
+        session.add(assistant)
+        session.flush()
+        thread = Thread(user_id=user.id, assistant_id=assistant.id, name="Thread 1")
+        session.add(thread)
+        session.commit()
+        return thread.id
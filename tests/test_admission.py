@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import admission as admission_module
+from app.ai_cores import bc_graph
+from app.ai_cores.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    admission,
+    with_admission,
+)
+from app.ai_cores.chains.intent import Intent, parsed
+from app.ai_cores.fake_llm import FakeChatModel
+from app.ai_cores.message_writer import message_writer
+from app.database import SessionLocal
+from app.main import app
+from app.models import Thread
+
+
+def controller(limits: dict, max_queue: int = 8, max_wait: float = 1.0):
+    return AdmissionController(
+        limits={"m": limits}, default_rpm=0, default_tpm=0,
+        max_queue=max_queue, max_wait=max_wait,
+    )
+
+
+def test_request_bucket_rejects_beyond_max_wait():
+    gates = controller({"rpm": 60}, max_wait=0.5)
+
+    async def run():
+        for _ in range(60):
+            async with gates.admit("m", 10):
+                pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with gates.admit("m", 10):
+                pass
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert rejected.headers == {"Retry-After": "1"}
+    assert gates.stats()["m"]["admitted"] == 60
+    assert gates.stats()["m"]["rejected"] == 1
+    # Unlisted models are unlimited.
+    assert gates.gate("other").reserve(10**9, max_queue=0, max_wait=0) == 0
+
+
+def test_token_bucket_queues_then_sheds_and_reconciles_usage():
+    gates = controller({"tpm": 6000}, max_queue=1, max_wait=5)
+
+    async def run():
+        async with gates.admit("m", 6000) as ticket:
+            # The call reported far fewer tokens than estimated.
+            ticket.record_usage({"total_tokens": 5950})
+        start = time.perf_counter()
+        waiter = asyncio.create_task(_admit(gates, 100))  # 50 short: ~0.5 s
+        await asyncio.sleep(0.05)
+        assert gates.stats()["m"]["waiting"] == 1
+        with pytest.raises(AdmissionRejected) as shed:
+            await _admit(gates, 100)
+        await waiter
+        return shed.value, time.perf_counter() - start
+
+    shed, waited = asyncio.run(run())
+    assert shed.status_code == 503
+    assert 0.3 < waited < 0.9
+    assert gates.stats()["m"]["max_wait_seconds"] > 0.3
+
+
+def test_structured_output_reconciles_with_the_raw_usage(monkeypatch):
+    gates = controller({"tpm": 6000})
+    monkeypatch.setattr(admission_module, "admission", gates)
+    model = FakeChatModel(ttft=0, structured_response={"intent": "do-RAG"})
+    structured = model.with_structured_output(Intent, include_raw=True)
+
+    result = with_admission(structured, "m").invoke("What is clock skew?")
+    assert parsed(result) == Intent(intent="do-RAG")
+    used = result["raw"].usage_metadata["total_tokens"]
+    # Only the reported usage is charged, not the 512-token reply estimate.
+    assert 6000 - used - 1 <= gates.gate("m").tokens.level <= 6000 - used + 1
+
+
+async def _admit(gates, tokens):
+    async with gates.admit("m", tokens):
+        pass
+
+
+def test_chat_returns_429_with_retry_after(seeded_thread, monkeypatch):
+    async def model(inputs):
+        usage = {"input_tokens": 20, "output_tokens": 5, "total_tokens": 25}
+        return AIMessage(content="ok", usage_metadata=usage)
+
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(model))
+    monkeypatch.setattr(admission, "limits", {"gpt-4o-mini-2024-07-18": {"rpm": 1}})
+    monkeypatch.setattr(admission, "max_wait", 0.1)
+    admission.clear()
+
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        other = Thread(user_id=first.user_id, assistant_id=first.assistant_id, name="T2")
+        db.add(other)
+        db.commit()
+        other_id = other.id
+
+    async def post_two():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            ok = await c.post("/chat/", json={"thread_id": seeded_thread, "input_message": "a"})
+            limited = await c.post("/chat/", json={"thread_id": other_id, "input_message": "b"})
+        await message_writer.flush()
+        return ok, limited
+
+    try:
+        ok, limited = asyncio.run(post_two())
+    finally:
+        admission.clear()
+    assert ok.status_code == 200
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.llms import AssistantConfig, llm_registry
+from app.core.config import settings
+from app.database import SessionLocal
+from app.main import app
+from app.models import Assistant, Thread
+
+
+def test_turns_use_the_assistant_prompt_as_a_stable_prefix(seeded_thread, monkeypatch):
+    prompts = []
+
+    def model(prompt_value):
+        prompts.append(prompt_value.to_messages())
+        return AIMessage(content=f"answer {len(prompts)}")
+
+    key = ("openai", "gpt-4o-mini-2024-07-18")
+    monkeypatch.setattr(llm_registry, "_clients", {key: RunnableLambda(model)})
+    with SessionLocal() as db:
+        thread = db.get(Thread, seeded_thread)
+        assistant = db.get(Assistant, thread.assistant_id)
+        assistant.system_prompt = "Answer as {terse} as possible."
+        assistant_id, name, model_id = assistant.id, assistant.name, assistant.llm_model_id
+        other = Assistant(user_id=thread.user_id, name="Default", llm_model_id=model_id)
+        db.add(other)
+        db.flush()
+        default_thread = Thread(user_id=thread.user_id, assistant_id=other.id, name="D")
+        db.add(default_thread)
+        db.commit()
+        default_thread_id = default_thread.id
+
+    with TestClient(app) as client:
+
+        def chat(thread_id, text):
+            response = client.post(
+                "/chat/", json={"thread_id": thread_id, "input_message": text}
+            )
+            assert response.status_code == 200
+
+        chat(seeded_thread, "one")
+        chain = bc_graph.assistant_chains[assistant_id][2]
+        chat(seeded_thread, "two")
+        assert bc_graph.assistant_chains[assistant_id][2] is chain
+
+        update = {"name": name, "system_prompt": "Be brief.", "llm_model_id": model_id}
+        update |= {"public": False, "activated": True}
+        client.put(f"/api/assistant/{assistant_id}", json=update)
+        chat(seeded_thread, "three")
+        assert bc_graph.assistant_chains[assistant_id][2] is not chain
+        chat(default_thread_id, "four")
+
+    first, second, third, default = [
+        [(message.type, message.content) for message in prompt] for prompt in prompts
+    ]
+    assert first == [("system", "Answer as {terse} as possible."), ("human", "one")]
+    # Each turn starts with exactly what the previous one sent.
+    assert second == first + [("ai", "answer 1"), ("human", "two")]
+    assert third[0] == ("system", "Be brief.")
+    assert third[1:] == second[1:] + [("ai", "answer 2"), ("human", "three")]
+    assert default[0] == ("system", bc_graph.SYSTEM_PROMPT)
+
+
+def test_assistant_chains_are_bounded(monkeypatch):
+    monkeypatch.setattr(bc_graph, "assistant_chains", OrderedDict())
+    monkeypatch.setattr(settings, "ASSISTANT_CHAINS_MAX", 2)
+    configs = [AssistantConfig(i, "gpt-4o-mini", f"Prompt {i}.", None) for i in range(3)]
+    first = bc_graph.get_chat_chain(configs[0])
+    bc_graph.get_chat_chain(configs[1])
+    assert bc_graph.get_chat_chain(configs[0]) is first
+    bc_graph.get_chat_chain(configs[2])
+    assert list(bc_graph.assistant_chains) == [0, 2]
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.database import SessionLocal
+from app.main import app
+from app.models import Thread
+
+DELAY = 0.3
+
+
+async def slow_model(inputs):
+    await asyncio.sleep(DELAY)
+    return AIMessage(content=f"echo: {inputs['question']}")
+
+
+def create_threads(seeded_thread: int, n: int) -> list[int]:
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        threads = [
+            Thread(user_id=first.user_id, assistant_id=first.assistant_id, name=f"T{i}")
+            for i in range(n - 1)
+        ]
+        db.add_all(threads)
+        db.commit()
+        return [seeded_thread] + [t.id for t in threads]
+
+
+async def post_chats(thread_ids: list[int]) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *[
+                client.post(
+                    "/chat/", json={"thread_id": thread_id, "input_message": f"q{i}"}
+                )
+                for i, thread_id in enumerate(thread_ids)
+            ]
+        )
+    await message_writer.flush()
+    return responses
+
+
+def test_concurrent_chats_do_not_block_each_other(seeded_thread, monkeypatch):
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(slow_model))
+
+    # Different threads: turns of one thread are serialized on purpose.
+    thread_ids = create_threads(seeded_thread, 8)
+    start = time.perf_counter()
+    responses = asyncio.run(post_chats(thread_ids))
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    assert sorted(r.json()["message"] for r in responses) == [
+        f"echo: q{i}" for i in range(8)
+    ]
+    # Eight sequential calls would take 8 * DELAY.
+    assert elapsed < 3 * DELAY
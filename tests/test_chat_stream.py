@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import httpx
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+
+
+def parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: ") :])
+        events.append((event, data))
+    return events
+
+
+async def post_stream(thread_id: int) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(
+            "/chat/stream", json={"thread_id": thread_id, "input_message": "Hi"}
+        )
+    await message_writer.flush()
+    return response
+
+
+def test_stream_sends_tokens_and_persists_full_message(seeded_thread, monkeypatch):
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="Hello there friend")]))
+    monkeypatch.setattr(bc_graph, "chat_chain", bc_graph.create_chat_model().first | model)
+
+    response = asyncio.run(post_stream(seeded_thread))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    tokens = [data["token"] for event, data in events if event == "message"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Hello there friend"
+    assert events[-1] == ("end", {"message": "Hello there friend"})
+
+    with SessionLocal() as db:
+        stored = db.query(Message).filter(Message.thread_id == seeded_thread).all()
+    assert [(m.ai_generated, m.content) for m in stored] == [
+        (False, "Hi"),
+        (True, "Hello there friend"),
+    ]
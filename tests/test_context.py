@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.ai_cores import context
+from app.ai_cores.context import (
+    build_chat_context,
+    count_tokens,
+    get_last_messages,
+    get_token_budget,
+    select_window,
+)
+from app.core.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models import Message
+
+
+def seed_messages(thread_id: int, n: int, content: str = "x" * 40):
+    start = datetime(2025, 1, 1)
+    with SessionLocal() as db:
+        db.add_all(
+            Message(
+                thread_id=thread_id,
+                ai_generated=i % 2 == 1,
+                content=f"{i:03d}{content}",
+                created_at=start + timedelta(seconds=i),
+            )
+            for i in range(n)
+        )
+        db.commit()
+
+
+async def build(thread_id: int, budget: int):
+    async with AsyncSessionLocal() as db:
+        return await build_chat_context(db, thread_id, budget)
+
+
+def test_keeps_most_recent_messages_within_budget(seeded_thread, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_FETCH_BATCH", 4)
+    seed_messages(seeded_thread, 50)
+    per_message = count_tokens("000" + "x" * 40)
+
+    history = asyncio.run(build(seeded_thread, per_message * 7))
+
+    # Seven messages fit, but the oldest one would be an orphaned AI reply.
+    assert len(history) == 6
+    assert isinstance(history[0], HumanMessage)
+    assert isinstance(history[-1], AIMessage)
+    assert [m.content[:3] for m in history] == ["044", "045", "046", "047", "048", "049"]
+
+
+def test_leading_replies_are_only_dropped_when_cut():
+    tail = [(AIMessage("welcome"), 2), (HumanMessage("hi"), 1), (AIMessage("hello"), 1)]
+    assert select_window(tail, 4) == [message for message, _ in tail]
+    assert select_window(tail, 3) == [message for message, _ in tail[1:]]
+    assert select_window(tail, 1) == []
+
+
+def test_fetches_only_the_pages_it_needs(seeded_thread, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_FETCH_BATCH", 4)
+    seed_messages(seeded_thread, 50)
+    calls = []
+    original = context.fetch_messages_before
+
+    async def counting_fetch(*args, **kwargs):
+        calls.append(args)
+        return await original(*args, **kwargs)
+
+    monkeypatch.setattr(context, "fetch_messages_before", counting_fetch)
+    asyncio.run(build(seeded_thread, count_tokens("000" + "x" * 40) * 6))
+
+    assert len(calls) == 2
+
+
+def test_budget_overrides(seeded_thread, monkeypatch):
+    async def budget():
+        async with AsyncSessionLocal() as db:
+            return await get_token_budget(db, seeded_thread)
+
+    assert asyncio.run(budget()) == settings.HISTORY_TOKEN_BUDGET
+    monkeypatch.setattr(
+        settings, "HISTORY_TOKEN_BUDGET_BY_MODEL", {"gpt-4o-mini-2024-07-18": 123}
+    )
+    assert asyncio.run(budget()) == 123
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET_BY_ASSISTANT", {1: 45})
+    assert asyncio.run(budget()) == 45
+
+
+def test_last_n_messages_in_conversation_order(seeded_thread):
+    seed_messages(seeded_thread, 20)
+
+    async def last_n():
+        async with AsyncSessionLocal() as db:
+            return await get_last_messages(db, seeded_thread, 3)
+
+    history = asyncio.run(last_n())
+    assert [m.content[:3] for m in history] == ["017", "018", "019"]
+    assert [type(m) for m in history] == [AIMessage, HumanMessage, AIMessage]
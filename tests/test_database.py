@@ -0,0 +1,34 @@
+from sqlalchemy import text
+
+from app.database import (
+    create_db_engine,
+    engine,
+    get_async_database_url,
+    get_database_url,
+)
+
+
+def test_bare_path_is_a_sqlite_file():
+    assert str(get_database_url("db/chat-server.sqlite")) == "sqlite:///db/chat-server.sqlite"
+
+
+def test_full_urls_pass_through():
+    url = get_database_url("postgresql://chat:secret@db:5432/chat")
+    assert url.drivername == "postgresql"
+    assert get_async_database_url(url).drivername == "postgresql+asyncpg"
+    assert get_async_database_url(get_database_url("sqlite:///x.db")).drivername == (
+        "sqlite+aiosqlite"
+    )
+
+
+def test_sqlite_pragmas_are_set_on_connect():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_in_memory_sqlite_has_no_pool_sizing():
+    memory_engine = create_db_engine(get_database_url("sqlite://"))
+    with memory_engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
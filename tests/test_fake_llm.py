@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import HumanMessage
+
+from app.ai_cores.chains.intent import Intent
+from app.ai_cores.fake_llm import FakeChatModel
+from app.ai_cores.llms import llm_registry
+from app.database import SessionLocal
+from app.main import app
+from app.models import Assistant, LLMModel, Message, Thread
+
+
+def test_replies_are_deterministic_and_report_usage():
+    model = FakeChatModel(ttft=0.05, token_latency=0.01, output_tokens=6)
+    prompt = [HumanMessage(content="What is clock skew?")]
+
+    start = time.perf_counter()
+    first = model.invoke(prompt)
+    elapsed = time.perf_counter() - start
+
+    assert first.content == model.invoke(prompt).content
+    assert first.content != model.invoke([HumanMessage(content="other")]).content
+    assert len(first.content.split()) == 6
+    assert first.usage_metadata["output_tokens"] == 6
+    assert first.usage_metadata["input_tokens"] > 0
+    assert 0.1 <= elapsed < 0.3
+
+
+def test_streaming_pays_ttft_once():
+    model = FakeChatModel(ttft=0.1, token_latency=0.005, output_tokens=5)
+
+    async def stream():
+        start = time.perf_counter()
+        arrivals, chunks = [], []
+        async for chunk in model.astream([HumanMessage(content="hi")]):
+            arrivals.append(time.perf_counter() - start)
+            chunks.append(chunk)
+        return arrivals, chunks
+
+    arrivals, chunks = asyncio.run(stream())
+    assert len(chunks) == 5
+    assert arrivals[0] >= 0.1
+    assert arrivals[-1] - arrivals[0] < 0.1
+    total = chunks[0]
+    for chunk in chunks[1:]:
+        total += chunk
+    assert total.usage_metadata["output_tokens"] == 5
+
+
+def test_structured_output():
+    model = FakeChatModel(ttft=0, structured_response={"intent": "do-RAG"})
+    assert model.with_structured_output(Intent).invoke("x") == Intent(intent="do-RAG")
+
+
+def test_fake_provider_serves_chat_turns(seeded_thread, monkeypatch):
+    monkeypatch.setattr(llm_registry, "_clients", {})
+    with SessionLocal() as db:
+        thread = db.get(Thread, seeded_thread)
+        fake = LLMModel(name="fake/bench")
+        db.add(fake)
+        db.flush()
+        db.get(Assistant, thread.assistant_id).llm_model_id = fake.id
+        db.commit()
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/chat/", json={"thread_id": seeded_thread, "input_message": "hi"}
+        )
+    assert response.status_code == 200
+    assert isinstance(llm_registry.get_client("fake/bench"), FakeChatModel)
+    with SessionLocal() as db:
+        stored = db.query(Message).filter(Message.thread_id == seeded_thread).all()
+        assert [m.n_tokens is not None for m in stored] == [True, True]
@@ -0,0 +1,102 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.chains.intent_classifier import DO_RAG, NO_RAG, IntentVerdict
+from app.ai_cores.graph_registry import GraphConfig, GraphRegistry
+from app.ai_cores.llms import llm_registry
+from app.ai_cores.retrieval import RetrievedChunk, retrievers
+from app.core.config import settings
+from app.core.metrics import GRAPH_NODE_SECONDS, GRAPH_ROUTES
+from app.database import SessionLocal
+from app.main import app
+from app.models import AISearchIndex, Thread, assistant_index_association
+
+
+def test_each_configuration_is_compiled_once():
+    built = []
+    registry = GraphRegistry(lambda config: built.append(config) or object())
+
+    direct = registry.get()
+    assert registry.get(GraphConfig()) is direct
+    rag = registry.get(GraphConfig(retrieval_indexes=("docs",)))
+    assert registry.get(GraphConfig(retrieval_indexes=("docs",))) is rag
+    assert rag is not direct
+    assert built == [GraphConfig(), GraphConfig(retrieval_indexes=("docs",))]
+    assert registry.stats() == {"graphs": 2, "builds": 2}
+
+
+class StubRetriever:
+    def __init__(self):
+        self.queries = []
+
+    async def asearch(self, query, k):
+        self.queries.append((query, k))
+        return [RetrievedChunk("Setup slack is required minus arrival.", "sta.pdf", 0.9)]
+
+
+class StubClassifier:
+    async def ainvoke(self, text):
+        intent = DO_RAG if "slack" in text else NO_RAG
+        return IntentVerdict(intent, 1.0, "rules")
+
+
+def test_intent_routes_between_direct_answer_and_retrieval(seeded_thread, monkeypatch):
+    prompts = []
+
+    def model(prompt_value):
+        prompts.append(prompt_value.to_messages())
+        return AIMessage(content=f"answer {len(prompts)}")
+
+    key = ("openai", "gpt-4o-mini-2024-07-18")
+    monkeypatch.setattr(llm_registry, "_clients", {key: RunnableLambda(model)})
+    monkeypatch.setattr(bc_graph.graph_registry, "_graphs", {})
+    monkeypatch.setattr(bc_graph, "intent_classifier", StubClassifier())
+    with SessionLocal() as db:
+        index = AISearchIndex(index_name="docs")
+        db.add(index)
+        db.flush()
+        db.execute(
+            insert(assistant_index_association).values(
+                assistant_id=db.get(Thread, seeded_thread).assistant_id, index_id=index.id
+            )
+        )
+        db.commit()
+    retriever = StubRetriever()
+    retrievers.register("docs", retriever)
+    graph = GraphConfig(retrieval_indexes=("docs",))
+
+    def count(metric, **labels):
+        key = tuple(labels[name] for name in metric.labelnames)
+        if hasattr(metric, "_series"):
+            return sum(metric._series[key][0]) if key in metric._series else 0
+        return metric._values.get(key, 0)
+
+    before = {
+        route: count(GRAPH_ROUTES, graph=graph.name, route=route)
+        for route in ("model", "retrieve")
+    }
+    try:
+        with TestClient(app) as client:
+            for text in ("hello there", "what is setup slack?", "thanks"):
+                response = client.post(
+                    "/chat/", json={"thread_id": seeded_thread, "input_message": text}
+                )
+                assert response.status_code == 200, response.text
+    finally:
+        retrievers.unregister("docs")
+
+    assert bc_graph.graph_registry.stats()["graphs"] == 1
+    assert retriever.queries == [("what is setup slack?", settings.RETRIEVAL_TOP_K)]
+    direct, rag, after = prompts
+    # Excerpts are not kept in the thread's history.
+    assert not any("excerpts" in message.content for message in direct + after)
+    # Excerpts sit right before the question, after the cacheable prefix.
+    assert rag[-2].type == "system" and "[sta.pdf]" in rag[-2].content
+    assert rag[-1].content == "what is setup slack?"
+    assert count(GRAPH_ROUTES, graph=graph.name, route="model") - before["model"] == 2
+    assert count(GRAPH_ROUTES, graph=graph.name, route="retrieve") - before["retrieve"] == 1
+    for node in ("intent", "retrieve", "model", "summarize"):
+        assert count(GRAPH_NODE_SECONDS, graph=graph.name, node=node) >= 1
@@ -0,0 +1,84 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import event
+
+from app.ai_cores import bc_graph
+from app.ai_cores.history_cache import HistoryCache, history_cache, message_size
+from app.ai_cores.message_writer import message_writer
+from app.database import async_engine
+
+
+async def echo_model(inputs):
+    return AIMessage(content=f"{len(inputs['history'])} messages of history")
+
+
+def run_turn(thread_id: int, text: str) -> str:
+    async def turn():
+        config = {"configurable": {"thread_id": thread_id}}
+        result = await bc_graph.get_chat_graph().ainvoke(
+            {"messages": [HumanMessage(content=text)]}, config
+        )
+        await message_writer.flush()
+        return result["messages"][-1].content
+
+    return asyncio.run(turn())
+
+
+def test_hot_thread_costs_no_history_queries(seeded_thread, monkeypatch):
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(echo_model))
+    statements = []
+    before = history_cache.stats()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert run_turn(seeded_thread, "one") == "0 messages of history"
+        assert any(s.lstrip().startswith("SELECT") for s in statements)
+        statements.clear()
+        assert run_turn(seeded_thread, "two") == "2 messages of history"
+        assert run_turn(seeded_thread, "three") == "4 messages of history"
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert not [s for s in statements if s.lstrip().startswith("SELECT")]
+    stats = history_cache.stats()
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 1
+
+
+def test_write_through_respects_token_budget():
+    cache = HistoryCache(max_bytes=1 << 20)
+    clock = cache.begin_load(1)
+    cache.put(1, token_budget=20, tail=[], complete=True, load_clock=clock)
+    for i in range(10):
+        cache.append(1, [HumanMessage(content=f"question {i}" + "." * 30)])
+
+    history = cache.get(1)
+    assert [m.content.split(".")[0] for m in history] == ["question 9"]
+    assert len(cache._entries[1].messages) == 2
+
+
+def test_evicts_least_recently_used_by_bytes():
+    message = HumanMessage(content="x" * 100)
+    cache = HistoryCache(max_bytes=message_size(message) * 2)
+    for thread_id in (1, 2, 3):
+        clock = cache.begin_load(thread_id)
+        cache.put(thread_id, 1000, [(message, 10)], True, clock)
+        cache.get(1)
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_load_racing_a_write_is_not_cached():
+    cache = HistoryCache(max_bytes=1 << 20)
+    clock = cache.begin_load(1)
+    cache.append(1, [HumanMessage(content="written during load")])
+    cache.put(1, 1000, [], True, clock)
+
+    assert cache.get(1) is None
@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.ai_cores.embeddings import get_embedder
+from app.ai_cores.ingestion import (
+    FileTask,
+    IngestionWorker,
+    chunk_page,
+    is_staged,
+    iter_pages,
+    load_staged,
+    process_file,
+    staging_path,
+)
+from app.ai_cores.segments import append_segment, index_path, open_index
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import AISearchIndex, File
+
+PAGES = [
+    "setup slack is the required time minus the data arrival time",
+    "hold violations are fixed by inserting delay cells on the short path",
+    "clock tree synthesis balances insertion delay across the sinks",
+]
+
+
+@pytest.fixture()
+def files(db_tables, tmp_path, monkeypatch):
+    """Adds text files to index "docs"; returns a function creating them."""
+    monkeypatch.setattr(settings, "RETRIEVAL_DATA_DIR", str(tmp_path / "indexes"))
+    monkeypatch.setattr(settings, "INGEST_DATA_DIR", str(tmp_path / "files"))
+    with SessionLocal() as db:
+        index = AISearchIndex(index_name="docs")
+        db.add(index)
+        db.commit()
+        index_id = index.id
+
+    def add(name: str, pages: list[str] | None, **values) -> int:
+        if pages is not None:
+            (tmp_path / "files" / "dir").mkdir(parents=True, exist_ok=True)
+            (tmp_path / "files" / "dir" / name).write_text("\f".join(pages))
+        with SessionLocal() as db:
+            file = File(
+                index_id=index_id,
+                name=name,
+                file_dir_name="dir",
+                size=1.0,
+                process_type="text",
+                **values,
+            )
+            db.add(file)
+            db.commit()
+            return file.id
+
+    return add
+
+
+def make_worker(**overrides) -> IngestionWorker:
+    options = dict(
+        processes=1,
+        commit_files=16,
+        lease_seconds=60,
+        poll_seconds=0.05,
+        embedder_name="hashing-128",
+        chunk_words=200,
+        overlap_words=40,
+    )
+    return IngestionWorker(SessionLocal, **(options | overrides))
+
+
+def statuses() -> dict[str, tuple[str, int]]:
+    with SessionLocal() as db:
+        return {file.name: (file.status, file.n_pages) for file in db.query(File)}
+
+
+def test_pages_split_on_form_feeds_and_chunks_overlap(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("one two\nthree\fsecond page\f\n")
+    assert list(iter_pages(str(path), "text")) == ["one two\nthree", "second page"]
+    assert chunk_page("a b c d e f g", 3, 1) == ["a b c", "c d e", "e f g"]
+    assert chunk_page("a b", 3, 1) == ["a b"] and chunk_page("  ", 3, 1) == []
+
+
+def test_claims_are_exclusive_and_expired_leases_are_requeued(files):
+    first, second = files("a.txt", PAGES), files("b.txt", PAGES)
+    worker, other = make_worker(), make_worker()
+    with SessionLocal() as db:
+        assert [task.file_id for task in worker.claim(db, 1)] == [first]
+        assert [task.file_id for task in other.claim(db, 5)] == [second]
+        assert worker.claim(db, 5) == []
+
+        assert worker.requeue_expired(db) == 0
+        stale = datetime.now() - timedelta(seconds=120)
+        db.query(File).filter(File.id == first).update({"last_change_at": stale})
+        db.commit()
+        assert worker.requeue_expired(db) == 1
+        assert [task.file_id for task in other.claim(db, 5)] == [first]
+
+
+def test_run_indexes_queued_files(files):
+    files("sta.txt", PAGES[:2])
+    files("cts.txt", [PAGES[2]] * 3)
+    files("missing.txt", None)
+    worker = make_worker(commit_files=1)
+    worker.run(once=True)
+
+    assert statuses() == {
+        "sta.txt": ("uploaded", 2),
+        "cts.txt": ("uploaded", 3),
+        "missing.txt": ("failed", 0),
+    }
+    assert worker.stats() == {
+        "files": 2,
+        "pages": 5,
+        "chunks": 5,
+        "failed": 1,
+        "resumed": 0,
+        "deleted": 0,
+        "compactions": 0,
+    }
+    index = open_index("docs")
+    assert len(index) == 5
+    result = index.search("how do I fix hold violations", 1)[0]
+    assert (result.source, result.page) == ("sta.txt", 2)
+
+
+def test_resume_reuses_staged_and_appended_files(files):
+    expired = dict(status="processing", last_change_at=datetime(2020, 1, 1))
+    appended = files("appended.txt", PAGES[:1], **expired)
+    staged = files("staged.txt", PAGES[1:], **expired)
+    files("done.txt", PAGES, status="uploaded", n_pages=3)
+    new = files("new.txt", PAGES)
+    # A worker staged two files and appended one of them, then crashed.
+    tasks = [
+        FileTask(
+            file_id,
+            "docs",
+            f"{settings.INGEST_DATA_DIR}/dir/{name}",
+            "text",
+            staging_path("docs", file_id),
+        )
+        for file_id, name in [(appended, "appended.txt"), (staged, "staged.txt")]
+    ]
+    for task in tasks:
+        process_file(task, "hashing-128", 200, 40)
+    chunks, vectors, _ = load_staged(tasks[0])
+    append_segment(index_path("docs"), chunks, vectors, get_embedder("hashing-128"))
+
+    worker = make_worker()
+    worker.run(once=True)
+
+    assert statuses() == {
+        "appended.txt": ("uploaded", 1),
+        "staged.txt": ("uploaded", 2),
+        "done.txt": ("uploaded", 3),
+        "new.txt": ("uploaded", 3),
+    }
+    assert worker.stats()["resumed"] == 2 and worker.stats()["chunks"] == 5
+    file_ids = [chunk.file_id for chunk in open_index("docs").iter_chunks()]
+    assert sorted(file_ids) == [appended, staged, staged, new, new, new]
+    assert not any(is_staged(task) for task in tasks)
+
+
+def test_deletes_are_tombstoned_and_segments_compacted(files, monkeypatch):
+    first = [files("kept0.txt", PAGES[:1]), files("removed.txt", PAGES[1:])]
+    make_worker().run(once=True)
+    second = files("kept1.txt", PAGES[:1])
+    make_worker().run(once=True)
+    assert [len(segment.index) for segment in open_index("docs").segments] == [3, 1]
+
+    with SessionLocal() as db:
+        db.query(File).filter(File.id == first[1]).update({"status": "wait-for-delete"})
+        db.commit()
+    monkeypatch.setattr(settings, "RETRIEVAL_COMPACT_MIN_SEGMENTS", 2)
+    worker = make_worker()
+    worker.run(once=True)
+
+    assert statuses()["removed.txt"] == ("deleted", 2)
+    assert worker.stats()["deleted"] == 1 and worker.stats()["compactions"] == 1
+    index = open_index("docs")
+    assert [len(segment.index) for segment in index.segments] == [2]
+    assert [chunk.file_id for chunk in index.iter_chunks()] == [first[0], second]
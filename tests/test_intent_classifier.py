@@ -0,0 +1,129 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+from fastapi.testclient import TestClient
+
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores.chains.intent import Intent
+from app.ai_cores.chains.intent_classifier import (
+    DO_RAG,
+    NO_RAG,
+    IntentClassifier,
+    LinearIntentModel,
+    match_rules,
+    normalize_input,
+)
+
+
+def fake_llm(calls: list):
+    def classify(inputs):
+        calls.append(inputs["input"])
+        return Intent(intent=DO_RAG)
+
+    return RunnableLambda(classify)
+
+
+def test_rules():
+    assert match_rules(normalize_input("Good morning!")).intent == NO_RAG
+    assert match_rules(normalize_input("What is a MOSFET?")).intent == DO_RAG
+    assert match_rules(normalize_input("Anyway, I want this do RAG.")).intent == DO_RAG
+    assert match_rules(normalize_input("How's the weather today?")).intent == NO_RAG
+    assert match_rules(normalize_input("Summarize our meeting")) is None
+    # A greeting in front of a question, or a generic word, is not decisive.
+    assert match_rules(normalize_input("okay what is an op amp?")) is None
+    assert match_rules(normalize_input("thanks, what is a bandgap")) is None
+    assert match_rules(normalize_input("Plan my page layout")) is None
+
+
+def test_model_round_trip(tmp_path):
+    samples = [
+        ("how does electromigration affect interconnects", DO_RAG),
+        ("what causes electromigration", DO_RAG),
+        ("write an email to my manager", NO_RAG),
+        ("write a birthday card", NO_RAG),
+    ]
+    model = LinearIntentModel(n_features=1 << 12).fit(samples, epochs=50)
+    model.save(tmp_path / "model.json")
+    loaded = LinearIntentModel.load(tmp_path / "model.json")
+
+    assert loaded.predict("electromigration in copper lines").intent == DO_RAG
+    assert loaded.predict("write an email").intent == NO_RAG
+    assert loaded.predict_proba("electromigration") == model.predict_proba(
+        "electromigration"
+    )
+
+
+def test_falls_back_to_llm_below_threshold_and_caches():
+    calls = []
+    classifier = IntentClassifier(
+        model=None, threshold=0.8, cache_size=10, llm_chain=fake_llm(calls)
+    )
+
+    assert classifier.invoke("Hello").source == "rules"
+    verdict = asyncio.run(classifier.ainvoke("Summarize our meeting"))
+    assert (verdict.intent, verdict.source) == (DO_RAG, "llm")
+    assert classifier.invoke("summarize our  meeting!").source == "cache"
+    assert calls == ["Summarize our meeting"]
+
+
+def test_batch_deduplicates_and_bounds_concurrency():
+    calls = []
+    running = [0, 0]  # current, peak
+
+    async def classify(inputs):
+        calls.append(inputs["input"])
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return Intent(intent=DO_RAG)
+
+    classifier = IntentClassifier(
+        model=None, threshold=0.8, cache_size=100, llm_chain=RunnableLambda(classify)
+    )
+    inputs = ["Hello"] + [f"Summarize meeting {i}" for i in range(8)] * 2
+
+    async def run():
+        return [
+            result
+            async for result in classifier.abatch_as_completed(
+                inputs, max_concurrency=3, chunk_size=5
+            )
+        ]
+
+    results = asyncio.run(run())
+    assert sorted(index for index, _, _ in results) == list(range(len(inputs)))
+    assert all(inputs[index] == text for index, text, _ in results)
+    assert results[0][2].source == "rules"
+    assert len(calls) == 8
+    assert running[1] <= 3
+
+
+def test_batch_endpoint_streams_ndjson(monkeypatch):
+    from app.main import app
+    from app.ai_cores.chains.intent_classifier import intent_classifier
+
+    calls = []
+    monkeypatch.setattr(intent_classifier, "_llm_chain", fake_llm(calls))
+    monkeypatch.setattr(intent_classifier, "_cache", OrderedDict())
+    with TestClient(app) as client:
+        response = client.post("/intent/batch", json=["Hello", "Plan my week", "Hello"])
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert sorted(row["index"] for row in rows) == [0, 1, 2]
+
+        body = '{"input": "Plan my week"}\n"What is a MOSFET?"\n'
+        response = client.post(
+            "/intent/batch",
+            content=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        rows = sorted(
+            (json.loads(line) for line in response.text.splitlines()),
+            key=lambda row: row["index"],
+        )
+        assert [row["intent"] for row in rows] == [DO_RAG, DO_RAG]
+        assert rows[0]["source"] == "cache"
+        assert calls == ["Plan my week"]
@@ -0,0 +1,109 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import insert
+
+from app.ai_cores.llms import llm_registry, parse_deployment
+from app.core.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.main import app
+from app.models import AISearchIndex, Assistant, LLMModel, Thread, assistant_index_association
+
+
+def fake_client_factory(built: list):
+    def create(provider, deployment, http_clients):
+        built.append((provider, deployment))
+        return RunnableLambda(lambda prompt: AIMessage(content=f"{provider}/{deployment}"))
+
+    return create
+
+
+def test_parse_deployment():
+    assert parse_deployment("azure/gpt-4o") == ("azure", "gpt-4o")
+    assert parse_deployment("gpt-4o-mini") == (settings.LLM_PROVIDER, "gpt-4o-mini")
+
+
+def test_turns_use_the_assistant_model_and_follow_updates(seeded_thread, monkeypatch):
+    built = []
+    monkeypatch.setattr(llm_registry, "client_factory", fake_client_factory(built))
+    monkeypatch.setattr(llm_registry, "_clients", {})
+
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        azure_model = LLMModel(name="azure/gpt-4o")
+        db.add(azure_model)
+        db.flush()
+        assistant = Assistant(
+            user_id=first.user_id, name="Azure", llm_model_id=azure_model.id
+        )
+        db.add(assistant)
+        db.flush()
+        azure_threads = [
+            Thread(user_id=first.user_id, assistant_id=assistant.id, name=f"T{i}")
+            for i in range(2)
+        ]
+        db.add_all(azure_threads)
+        db.commit()
+        azure_ids = [t.id for t in azure_threads]
+        assistant_id = assistant.id
+        default_model_id = db.get(Assistant, first.assistant_id).llm_model_id
+
+    with TestClient(app) as client:
+
+        def chat(thread_id: int) -> str:
+            response = client.post(
+                "/chat/", json={"thread_id": thread_id, "input_message": "hi"}
+            )
+            return response.json()["message"]
+
+        assert chat(seeded_thread) == "openai/gpt-4o-mini-2024-07-18"
+        assert chat(azure_ids[0]) == "azure/gpt-4o"
+        assert chat(azure_ids[1]) == "azure/gpt-4o"
+        assert chat(seeded_thread) == "openai/gpt-4o-mini-2024-07-18"
+        assert len(built) == 2
+
+        client.put(
+            f"/api/assistant/{assistant_id}",
+            json={
+                "name": "Azure",
+                "llm_model_id": default_model_id,
+                "public": False,
+                "activated": True,
+            },
+        )
+        assert chat(azure_ids[0]) == "openai/gpt-4o-mini-2024-07-18"
+
+        client.put(f"/api/llm_model/{default_model_id}", json={"name": "azure/gpt-4o"})
+        assert chat(azure_ids[1]) == "azure/gpt-4o"
+        # Still only the two clients built above.
+        assert len(built) == 2
+
+
+def test_resolved_assistants_expire(seeded_thread, monkeypatch):
+    with SessionLocal() as db:
+        assistant_id = db.get(Thread, seeded_thread).assistant_id
+        index = AISearchIndex(index_name="docs")
+        db.add(index)
+        db.flush()
+        db.execute(
+            insert(assistant_index_association).values(
+                assistant_id=assistant_id, index_id=index.id
+            )
+        )
+        db.commit()
+        index_id = index.id
+
+    async def resolve():
+        async with AsyncSessionLocal() as db:
+            return (await llm_registry.resolve_assistant(db, assistant_id)).retrieval_indexes
+
+    assert asyncio.run(resolve()) == ("docs",)
+    # Deactivated without going through a router that invalidates the cache.
+    with SessionLocal() as db:
+        db.get(AISearchIndex, index_id).is_active = False
+        db.commit()
+    assert asyncio.run(resolve()) == ("docs",)
+    monkeypatch.setattr(settings, "ASSISTANT_CACHE_TTL_SECONDS", 0)
+    assert asyncio.run(resolve()) == ()
@@ -0,0 +1,133 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy.exc import OperationalError
+
+from app.ai_cores import bc_graph
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.message_writer import MessageWriter, message_writer
+from app.database import AsyncSessionLocal, SessionLocal
+from app.main import app
+from app.models import Message
+
+
+def stored(thread_id: int) -> list[str]:
+    with SessionLocal() as db:
+        rows = db.query(Message).filter(Message.thread_id == thread_id)
+        return [m.content for m in rows.order_by(Message.created_at, Message.id)]
+
+
+def turn(i: int) -> list:
+    return [HumanMessage(content=f"q{i}"), AIMessage(content=f"a{i}")]
+
+
+def test_group_commit_and_durability_barrier(seeded_thread):
+    writer = MessageWriter(AsyncSessionLocal, max_batch=1000, flush_interval=10)
+
+    async def run():
+        for i in range(10):
+            writer.submit(seeded_thread, turn(i))
+        await asyncio.sleep(0.05)
+        assert stored(seeded_thread) == []
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(run())
+    assert writer.n_flushes == 1
+    assert stored(seeded_thread) == [f"{r}{i}" for i in range(10) for r in "qa"]
+
+
+def test_batch_size_triggers_flush(seeded_thread):
+    writer = MessageWriter(AsyncSessionLocal, max_batch=4, flush_interval=10)
+
+    async def run():
+        committed = [writer.submit(seeded_thread, turn(i)) for i in range(2)]
+        await asyncio.wait_for(asyncio.gather(*committed), timeout=1)
+        await writer.close()
+
+    asyncio.run(run())
+    assert len(stored(seeded_thread)) == 4
+
+
+def test_close_flushes_pending_writes(seeded_thread):
+    writer = MessageWriter(AsyncSessionLocal, max_batch=1000, flush_interval=10)
+
+    async def run():
+        writer.submit(seeded_thread, turn(0))
+        await writer.close()
+
+    asyncio.run(run())
+    assert stored(seeded_thread) == ["q0", "a0"]
+
+
+def test_reads_see_unflushed_writes(seeded_thread, monkeypatch):
+    monkeypatch.setattr(message_writer, "flush_interval", 10)
+
+    async def run():
+        await bc_graph.add_messages(seeded_thread, turn(0), durable=True)
+        await bc_graph.add_messages(seeded_thread, turn(1))
+        history_cache.clear()
+        async with AsyncSessionLocal() as db:
+            before_flush = await bc_graph.get_chat_history(db, seeded_thread)
+        await message_writer.flush()
+        history_cache.clear()
+        async with AsyncSessionLocal() as db:
+            after_flush = await bc_graph.get_chat_history(db, seeded_thread)
+        return before_flush, after_flush
+
+    before_flush, after_flush = asyncio.run(run())
+    expected = ["q0", "a0", "q1", "a1"]
+    assert [m.content for m in before_flush] == expected
+    assert [m.content for m in after_flush] == expected
+
+
+def test_a_bad_write_only_fails_itself(seeded_thread):
+    writer = MessageWriter(AsyncSessionLocal, max_batch=1000, flush_interval=10)
+
+    async def run():
+        good = writer.submit(seeded_thread, turn(0))
+        # Violates NOT NULL on messages.content.
+        bad = writer.submit(seeded_thread, [HumanMessage(content="q1")])
+        writer._unflushed[seeded_thread][-1].rows[0]["content"] = None
+        await writer.flush_thread(seeded_thread)
+        await writer.close()
+        return good.exception(), bad.exception()
+
+    good_error, bad_error = asyncio.run(run())
+    assert good_error is None and bad_error is not None
+    assert stored(seeded_thread) == ["q0", "a0"]
+    assert writer.stats()["failed_writes"] == 1
+
+
+def test_transient_errors_are_retried(seeded_thread):
+    failures = [OperationalError("INSERT", {}, Exception("database is locked"))]
+
+    def session_factory():
+        if failures:
+            raise failures.pop()
+        return AsyncSessionLocal()
+
+    writer = MessageWriter(
+        session_factory, max_batch=1000, flush_interval=10, max_retries=2, retry_backoff=0
+    )
+
+    async def run():
+        committed = writer.submit(seeded_thread, turn(0))
+        await writer.flush()
+        await writer.close()
+        return committed.exception()
+
+    assert asyncio.run(run()) is None
+    assert stored(seeded_thread) == ["q0", "a0"]
+    assert writer.stats()["retries"] == 1 and writer.stats()["flushes"] == 1
+
+
+def test_chat_on_a_missing_thread_skips_the_model(seeded_thread, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        bc_graph, "chat_chain", RunnableLambda(lambda inputs: calls.append(inputs))
+    )
+    response = TestClient(app).post("/chat/", json={"thread_id": 999, "input_message": "hi"})
+    assert response.status_code == 404 and calls == []
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+
+client = TestClient(app)
+
+
+def seed_messages(thread_id: int, n: int) -> list[int]:
+    with SessionLocal() as db:
+        messages = [
+            Message(thread_id=thread_id, ai_generated=i % 2 == 1, content=f"m{i}")
+            for i in range(n)
+        ]
+        db.add_all(messages)
+        db.commit()
+        return [m.id for m in messages]
+
+
+def test_latest_page_then_older_pages(seeded_thread):
+    ids = seed_messages(seeded_thread, 7)
+
+    page = client.get(f"/messages/{seeded_thread}", params={"limit": 3}).json()
+    assert [m["id"] for m in page["data"]] == ids[4:]
+    assert page["next_cursor"] == ids[4]
+
+    page = client.get(
+        f"/messages/{seeded_thread}",
+        params={"limit": 3, "before_id": page["next_cursor"]},
+    ).json()
+    assert [m["id"] for m in page["data"]] == ids[1:4]
+
+    page = client.get(
+        f"/messages/{seeded_thread}",
+        params={"limit": 3, "before_id": page["next_cursor"]},
+    ).json()
+    assert [m["content"] for m in page["data"]] == ["m0"]
+    assert page["next_cursor"] is None
+
+
+def test_poll_for_new_messages(seeded_thread):
+    ids = seed_messages(seeded_thread, 3)
+
+    page = client.get(f"/messages/{seeded_thread}", params={"since_id": ids[-1]})
+    assert page.status_code == 200
+    assert page.json()["data"] == []
+
+    new_ids = seed_messages(seeded_thread, 3)
+    page = client.get(
+        f"/messages/{seeded_thread}", params={"since_id": ids[-1], "limit": 2}
+    ).json()
+    assert [m["id"] for m in page["data"]] == new_ids[:2]
+    assert page["next_cursor"] == new_ids[1]
+
+
+def test_errors(seeded_thread):
+    assert client.get(f"/messages/{seeded_thread}").status_code == 404
+    response = client.get(
+        f"/messages/{seeded_thread}", params={"since_id": 1, "before_id": 5}
+    )
+    assert response.status_code == 400
+
+
+def test_reads_see_unflushed_chat_turns(seeded_thread, monkeypatch):
+    async def model(inputs):
+        return AIMessage(content=f"echo: {inputs['question']}")
+
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(model))
+    # Nothing would be committed within the test without the read barrier.
+    monkeypatch.setattr(message_writer, "flush_interval", 60)
+
+    async def chat_then_read():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            await c.post("/chat/", json={"thread_id": seeded_thread, "input_message": "hi"})
+            messages = await c.get(f"/messages/{seeded_thread}")
+            threads = await c.get("/threads/1", params={"include_preview": True})
+        await message_writer.flush()
+        return messages, threads.json()["data"][0]
+
+    messages, thread = asyncio.run(chat_then_read())
+    assert messages.status_code == 200
+    assert [m["content"] for m in messages.json()["data"]] == ["hi", "echo: hi"]
+    assert thread["n_messages"] == 2
@@ -0,0 +1,96 @@
+import asyncio
+import re
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import HumanMessage
+
+from app.ai_cores.fake_llm import FakeChatModel
+from app.ai_cores.llms import LLMTimingCallback, llm_registry
+from app.core.metrics import LLM_TTFT_SECONDS, MetricsRegistry
+from app.main import app
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """Value of the sample `name` whose labels include `labels`."""
+    for line in text.splitlines():
+        match = re.match(r"^([a-z_]+)(\{(.*)\})? (\S+)$", line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(3) or ""))
+        if all(found.get(k) == v for k, v in labels.items()):
+            return float(match.group(4))
+    raise KeyError(f"{name} {labels}")
+
+
+def test_histogram_exposition():
+    registry = MetricsRegistry(prefix="t_")
+    latency = registry.histogram("latency_seconds", "Latency.", ("route",), (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, route="/a")
+    registry.register_stats("cache", lambda: {"hits": 3, "name": "skipped"})
+    registry.register_stats("gate", lambda: {"m1": {"waiting": 2}}, label="model")
+
+    text = registry.render()
+    assert "# TYPE t_latency_seconds histogram" in text
+    assert sample(text, "t_latency_seconds_bucket", route="/a", le="0.1") == 1
+    assert sample(text, "t_latency_seconds_bucket", route="/a", le="1") == 2
+    assert sample(text, "t_latency_seconds_bucket", route="/a", le="+Inf") == 3
+    assert sample(text, "t_latency_seconds_count", route="/a") == 3
+    assert sample(text, "t_latency_seconds_sum", route="/a") == 5.55
+    assert sample(text, "t_cache_hits") == 3
+    assert sample(text, "t_gate_waiting", model="m1") == 2
+    assert "t_cache_name" not in text
+
+
+def test_streamed_call_records_time_to_first_token():
+    callback = LLMTimingCallback("fake/ttft-test")
+    model = FakeChatModel(ttft=0.1, token_latency=0.02, output_tokens=6, callbacks=[callback])
+
+    async def stream():
+        async for _ in model.astream([HumanMessage(content="hi")]):
+            pass
+
+    asyncio.run(stream())
+    ttft = LLM_TTFT_SECONDS._series[("fake/ttft-test",)]
+    assert sum(ttft[0]) == 1
+    assert 0.1 <= ttft[1] < 0.15
+    assert callback._starts == {} and callback._streaming == set()
+
+
+def test_metrics_endpoint_covers_http_graph_db_and_llm(seeded_thread, monkeypatch):
+    model = "openai/gpt-4o-mini-2024-07-18"
+    fake = FakeChatModel(
+        ttft=0.01, token_latency=0, output_tokens=3, callbacks=[LLMTimingCallback(model)]
+    )
+    monkeypatch.setattr(llm_registry, "_clients", {tuple(model.split("/")): fake})
+
+    with TestClient(app) as client:
+        before = client.get("/metrics").text
+        client.post("/chat/", json={"thread_id": seeded_thread, "input_message": "hi"})
+        client.get(f"/messages/{seeded_thread}")
+        client.get("/no/such/path")
+        response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    def delta(name, **labels):
+        try:
+            old = sample(before, name, **labels)
+        except KeyError:
+            old = 0
+        return sample(text, name, **labels) - old
+
+    http = "chatbot_http_request_duration_seconds_count"
+    assert delta(http, method="POST", route="/chat/", status="200") == 1
+    assert delta(http, method="GET", route="/messages/{thread_id}", status="200") == 1
+    assert delta(http, method="GET", route="unmatched", status="404") == 1
+    assert delta("chatbot_llm_time_to_first_token_seconds_count", model=model) == 1
+    assert delta("chatbot_llm_request_duration_seconds_count", model=model, outcome="ok") == 1
+    assert delta("chatbot_graph_node_duration_seconds_count", node="model") == 1
+    assert delta("chatbot_db_query_duration_seconds_count", engine="async", statement="SELECT") >= 1
+    assert delta("chatbot_db_query_duration_seconds_count", engine="async", statement="INSERT") >= 1
+    # Only the scrape itself is in flight.
+    assert sample(text, "chatbot_http_requests_in_flight", method="GET") == 1
+    assert sample(text, "chatbot_message_writer_flushes") >= 1
+    assert sample(text, "chatbot_thread_mailbox_turns") >= 1
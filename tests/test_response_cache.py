@@ -0,0 +1,82 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.ai_cores.response_cache import ResponseCache, response_cache
+from app.core.config import settings
+from app.database import SessionLocal
+from app.models import Thread
+
+
+def test_exact_and_canonical_hits():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.store("ns", "What is a MOSFET?", "A transistor.")
+    cache.store("ns", "Is a BJT faster than a MOSFET?", "It depends.")
+
+    assert cache.lookup("ns", "  what is a mosfet ") == "A transistor."
+    assert cache.lookup("ns", "Please, what is the MOSFET") == "A transistor."
+    assert cache.lookup("ns", "Is a MOSFET faster than a BJT?") is None
+    assert cache.lookup("ns", "What is a MOSFET device?") is None
+    assert cache.lookup("other-prompt-or-model", "What is a MOSFET?") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["canonical_hits"], stats["misses"]) == (1, 1, 3)
+
+
+def test_numbers_and_technical_words_must_match():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.store("ns", "How do I reduce leakage in a 7nm FinFET process?", "7")
+    cache.store("ns", "What is the max data rate of a DDR4 interface?", "DDR4")
+
+    assert cache.lookup("ns", "How do I reduce leakage in a 5nm FinFET process?") is None
+    assert cache.lookup("ns", "What is the max data rate of a DDR5 interface?") is None
+    assert cache.lookup("ns", "how do i reduce leakage in 7nm finfet processes") == "7"
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    cache = ResponseCache(max_entries=2, ttl=60)
+    for question in ("alpha", "bravo", "charlie"):
+        cache.store("ns", question, question.upper())
+    assert cache.lookup("ns", "alpha") is None
+    assert cache.lookup("ns", "the alpha") is None
+    assert cache.lookup("ns", "charlie") == "CHARLIE"
+
+    expired = ResponseCache(max_entries=2, ttl=-1)
+    expired.store("ns", "alpha", "ALPHA")
+    assert expired.lookup("ns", "alpha") is None
+    assert expired.lookup("ns", "the alpha") is None
+
+
+def test_chat_uses_cache_only_for_opted_in_context_free_turns(seeded_thread, monkeypatch):
+    calls = []
+
+    async def model(inputs):
+        calls.append(inputs["question"])
+        return AIMessage(content=f"answer {len(calls)}")
+
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        other = Thread(user_id=first.user_id, assistant_id=first.assistant_id, name="T2")
+        db.add(other)
+        db.commit()
+        other_id, assistant_id = other.id, first.assistant_id
+
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(model))
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ASSISTANT_IDS", [assistant_id])
+    response_cache.clear()
+
+    async def ask(thread_id: int, question: str) -> str:
+        config = {"configurable": {"thread_id": thread_id}}
+        result = await bc_graph.get_chat_graph().ainvoke(
+            {"messages": [HumanMessage(content=question)]}, config
+        )
+        await message_writer.flush()
+        return result["messages"][-1].content
+
+    assert asyncio.run(ask(seeded_thread, "What is a MOSFET?")) == "answer 1"
+    assert asyncio.run(ask(other_id, "what is a mosfet")) == "answer 1"
+    # Follow-up turns carry history and always go upstream.
+    assert asyncio.run(ask(seeded_thread, "What is a MOSFET?")) == "answer 2"
+    assert len(calls) == 2
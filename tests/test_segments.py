@@ -0,0 +1,160 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai_cores import segments
+from app.ai_cores.embeddings import HashingEmbedder
+from app.ai_cores.retrieval import RetrieverRegistry
+from app.ai_cores.segments import (
+    IndexSnapshot,
+    append_segment,
+    compact,
+    delete_files,
+    read_manifest,
+)
+from app.ai_cores.vector_index import Chunk
+from app.core.config import settings
+
+TOPICS = [
+    "setup slack is the required time minus the data arrival time",
+    "hold violations are fixed by inserting delay cells on the short path",
+    "clock tree synthesis balances insertion delay across the sinks",
+    "the floorplan places macros along the die boundary",
+]
+EMBEDDER = HashingEmbedder(64)
+
+
+def add_file(path: str, file_id: int, n_chunks: int = 3) -> dict:
+    topic = TOPICS[file_id % len(TOPICS)]
+    chunks = [
+        Chunk(f"{topic} part {i}", f"doc{file_id}.pdf", i, file_id) for i in range(n_chunks)
+    ]
+    return append_segment(path, chunks, EMBEDDER.embed([c.text for c in chunks]), EMBEDDER)
+
+
+def file_ids(snapshot: IndexSnapshot) -> list[int]:
+    return sorted(chunk.file_id for chunk in snapshot.iter_chunks())
+
+
+@pytest.fixture()
+def path(tmp_path):
+    return str(tmp_path / "docs")
+
+
+def test_snapshots_answer_at_their_version(path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_COMPACT_MIN_SEGMENTS", 2)
+    for file_id in range(3):
+        add_file(path, file_id)
+    before = IndexSnapshot.open(path)
+    hold = before.search(TOPICS[1], 3)
+    assert [r.source for r in hold] == ["doc1.pdf"] * 3
+
+    assert delete_files(path, [1, 99]) == 3
+    assert delete_files(path, [1]) == 0
+    add_file(path, 5)
+    after_deletes = IndexSnapshot.open(path)
+    assert compact(path)["version"] == after_deletes.version + 1
+    compacted = IndexSnapshot.open(path)
+
+    # The old snapshot still sees file 1, although its segment is gone.
+    assert before.is_stale() and before.search(TOPICS[1], 3) == hold
+    assert file_ids(before) == [0] * 3 + [1] * 3 + [2] * 3
+    for snapshot in (after_deletes, compacted):
+        assert file_ids(snapshot) == [0] * 3 + [2] * 3 + [5] * 3
+        results = snapshot.search(TOPICS[1], 20)
+        assert len(results) == 9 and "doc1.pdf" not in {r.source for r in results}
+        assert not snapshot.has_file(1) and snapshot.has_file(5)
+    assert len(after_deletes.segments) == 3 and len(compacted.segments) == 1
+    on_disk = [name for name in os.listdir(path) if name.startswith("seg-")]
+    assert on_disk == [compacted.segments[0].name]
+
+
+def test_snapshots_notice_every_new_version(path):
+    add_file(path, 0)
+    snapshot = IndexSnapshot.open(path)
+    assert not snapshot.is_stale()
+    # Two publishes between checks may leave a manifest with the same inode.
+    add_file(path, 1)
+    delete_files(path, [0])
+    assert snapshot.is_stale()
+    latest = snapshot.reopen()
+    assert latest.version == snapshot.version + 2 and not latest.is_stale()
+    assert file_ids(latest) == [1] * 3
+
+
+def test_tombstones_mask_partitioned_segments(path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_PARTITION_MIN_ROWS", 16)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 64)).astype(np.float32)
+    chunks = [Chunk(str(i), file_id=i % 4) for i in range(400)]
+    append_segment(path, chunks, vectors, EMBEDDER)
+    delete_files(path, [0])
+
+    snapshot = IndexSnapshot.open(path)
+    assert snapshot.segments[0].index.centroids is not None and len(snapshot) == 300
+    for n_probe in (1, 20):
+        _, ids = snapshot.search_vectors(vectors[:40], 100, n_probe=n_probe)
+        found = [i for i in ids.ravel() if i >= 0]
+        assert found and all(i % 4 for i in found)
+    _, ids = snapshot.search_vectors(vectors[1], 400, n_probe=20)
+    assert (ids[0, :300] >= 0).all() and (ids[0, 300:] == -1).all()
+
+
+def test_compaction_keeps_deletes_made_while_merging(path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_COMPACT_MIN_SEGMENTS", 2)
+    for file_id in range(3):
+        add_file(path, file_id)
+    write_index = segments.write_index
+
+    def delete_while_writing(*args):
+        meta = write_index(*args)
+        delete_files(path, [0, 2])
+        return meta
+
+    monkeypatch.setattr(segments, "write_index", delete_while_writing)
+    manifest = compact(path)
+    monkeypatch.setattr(segments, "write_index", write_index)
+
+    assert [(e["count"], e["deleted"]) for e in manifest["segments"]] == [(9, 6)]
+    assert file_ids(IndexSnapshot.open(path)) == [1] * 3
+    # Mostly deleted now, so the next pass drops the deleted rows.
+    manifest = compact(path)
+    assert [(e["count"], e["deleted"]) for e in manifest["segments"]] == [(3, 0)]
+    assert compact(path) is None
+
+
+def test_searches_stay_consistent_while_writers_run(path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_DATA_DIR", os.path.dirname(path))
+    monkeypatch.setattr(settings, "RETRIEVAL_COMPACT_MIN_SEGMENTS", 3)
+    monkeypatch.setattr(settings, "RETRIEVAL_STALE_CHECK_SECONDS", 0)
+    add_file(path, 0)
+    registry = RetrieverRegistry()
+    errors, done = [], threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                snapshot = registry.get("docs")
+                results = snapshot.search(TOPICS[0], 50)
+                # Every live file has all its chunks, or none of them.
+                counts = np.bincount([int(r.source[3:-4]) for r in results])
+                assert set(counts) <= {0, 3} and len(results) == len(snapshot)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    reader = threading.Thread(target=search)
+    reader.start()
+    for file_id in range(1, 12):
+        add_file(path, file_id)
+        if file_id % 3 == 0:
+            delete_files(path, [file_id - 2])
+        compact(path)
+    done.set()
+    reader.join()
+
+    assert errors == []
+    assert read_manifest(path)["version"] > 12
+    assert registry.get("docs").version == read_manifest(path)["version"]
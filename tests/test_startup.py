@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+CHECK = """
+import sys
+import app.main
+from app.ai_cores import bc_graph
+from app.ai_cores.llms import llm_registry
+
+assert bc_graph.default_chain is None and bc_graph.graph_registry.stats()["graphs"] == 0
+assert llm_registry.stats()["clients"] == 0
+assert "langchain_openai" not in sys.modules
+"""
+
+
+def test_importing_the_app_builds_no_ai_objects():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_warm_up_builds_graph_and_default_client(monkeypatch):
+    from langchain_core.runnables import RunnableLambda
+
+    from app.ai_cores import bc_graph
+    from app.ai_cores.llms import llm_registry
+
+    built = []
+    monkeypatch.setattr(
+        llm_registry, "client_factory", lambda *args: built.append(args) or RunnableLambda(str)
+    )
+    monkeypatch.setattr(llm_registry, "_clients", {})
+    monkeypatch.setattr(bc_graph.graph_registry, "_graphs", {})
+    monkeypatch.setattr(bc_graph, "default_chain", None)
+    bc_graph.warm_up()
+    assert bc_graph.graph_registry.stats()["graphs"] == 1
+    assert bc_graph.default_chain is not None
+    assert len(built) == 1
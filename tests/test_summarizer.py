@@ -0,0 +1,94 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores.history_cache import history_cache
+from app.ai_cores.message_writer import message_writer
+from app.ai_cores.llms import llm_registry
+from app.ai_cores.summarizer import summarizer
+from app.core.config import settings
+from app.database import SessionLocal
+from app.main import app
+from app.models import ThreadSummary
+
+
+def test_rolling_summary_folds_only_new_messages_off_the_request_path(
+    seeded_thread, monkeypatch
+):
+    chat_prompts, summary_prompts = [], []
+
+    async def model(prompt_value):
+        messages = prompt_value.to_messages()
+        if "running summary" in messages[0].content:
+            summary_prompts.append(messages[1].content)
+            await asyncio.sleep(0.3)
+            folded = re.findall(r"question (\d+)", messages[1].content)
+            return AIMessage(content="covers " + " ".join(folded))
+        chat_prompts.append(messages)
+        return AIMessage(content=f"answer to question {len(chat_prompts)} " + "x" * 40)
+
+    key = ("openai", "gpt-4o-mini-2024-07-18")
+    monkeypatch.setattr(llm_registry, "_clients", {key: RunnableLambda(model)})
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 120)
+    monkeypatch.setattr(summarizer, "min_delta_tokens", 100)
+
+    async def run():
+        latencies = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for i in range(1, 13):
+                start = time.perf_counter()
+                response = await client.post(
+                    "/chat/",
+                    json={"thread_id": seeded_thread, "input_message": f"question {i} " + "y" * 40},
+                )
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await message_writer.flush()
+                if i % 4 == 0:
+                    await summarizer.drain()
+        await summarizer.drain()
+        await message_writer.flush()
+        return latencies
+
+    latencies = asyncio.run(run())
+
+    # Summarizing (0.3 s per call) never delayed a chat response.
+    assert max(latencies) < 0.25
+    assert len(summary_prompts) >= 2
+    # Every question was folded in at most once, in order.
+    folded = [int(n) for prompt in summary_prompts for n in re.findall(r"User: question (\d+)", prompt)]
+    assert folded == sorted(set(folded))
+    # Each call starts from the previous summary.
+    assert "(none yet)" in summary_prompts[0]
+    assert all("Summary so far:\ncovers" in prompt for prompt in summary_prompts[1:])
+
+    with SessionLocal() as db:
+        stored = db.get(ThreadSummary, seeded_thread)
+        assert stored.content == "covers " + " ".join(
+            re.findall(r"question (\d+)", summary_prompts[-1].split("New messages:")[1])
+        )
+    # Later turns send: system prompt, summary, then the recent window.
+    last = chat_prompts[-1]
+    assert last[0].content == "You are a helpful assistant."
+    assert last[1].type == "system"
+    assert last[1].content.startswith("Summary of the earlier conversation:\ncovers")
+    assert "question 12" in last[-1].content
+
+
+def test_threads_evicted_from_the_history_cache_are_still_summarized(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(summarizer, "schedule", scheduled.append)
+    monkeypatch.setattr(summarizer, "min_delta_tokens", 10)
+    monkeypatch.setattr(summarizer, "_pending_tokens", OrderedDict())
+    assert history_cache.overflows(12345) is None
+
+    summarizer.observe(12345, [HumanMessage("short")])
+    assert scheduled == []
+    summarizer.observe(12345, [HumanMessage("x" * 80)])
+    assert scheduled == [12345]
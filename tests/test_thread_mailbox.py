@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import select
+
+from app.ai_cores import bc_graph
+from app.ai_cores.message_writer import message_writer
+from app.ai_cores.thread_mailbox import ThreadBusyError, ThreadMailbox
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+
+
+def test_concurrent_posts_to_one_thread_keep_request_order(seeded_thread, monkeypatch):
+    calls = []
+
+    async def model(inputs):
+        calls.append(inputs["question"])
+        await asyncio.sleep(0.05)
+        # Report how much context the turn saw.
+        return AIMessage(content=f"{len(inputs['history'])}:{inputs['question']}")
+
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(model))
+    n = 12
+
+    async def post_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            responses = await asyncio.gather(
+                *[
+                    c.post(
+                        "/chat/",
+                        json={"thread_id": seeded_thread, "input_message": f"q{i}"},
+                    )
+                    for i in range(n)
+                ]
+            )
+        await message_writer.flush()
+        return responses
+
+    responses = asyncio.run(post_all())
+    assert all(r.status_code == 200 for r in responses)
+    # Rapid inputs were coalesced into fewer upstream calls.
+    assert len(calls) < n
+
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(Message.ai_generated, Message.content)
+            .where(Message.thread_id == seeded_thread)
+            .order_by(Message.id)
+        ).all()
+    humans = [content for ai, content in rows if not ai]
+    assert humans == [f"q{i}" for i in range(n)]
+    assert len(rows) == n + len(calls)
+    for position, (ai, content) in enumerate(rows):
+        if ai:
+            # Everything before this answer, and nothing after it, was context.
+            assert int(content.split(":")[0]) == position - 1
+
+
+def test_bounded_waiting():
+    mailbox = ThreadMailbox(max_wait=0.05, max_pending=1, max_batch=1)
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_turn(messages):
+            await gate.wait()
+            return len(messages)
+
+        first = asyncio.create_task(mailbox.submit(1, HumanMessage("a"), slow_turn))
+        await asyncio.sleep(0)
+        timed_out = asyncio.create_task(mailbox.submit(1, HumanMessage("b"), slow_turn))
+        await asyncio.sleep(0)
+        # max_pending=1: a third input is rejected right away.
+        try:
+            await mailbox.submit(1, HumanMessage("c"), slow_turn)
+            raise AssertionError("expected ThreadBusyError")
+        except ThreadBusyError:
+            pass
+        # Another thread is not affected.
+        other = await mailbox.submit(2, HumanMessage("d"), lambda m: asyncio.sleep(0, 7))
+        try:
+            await timed_out
+            raise AssertionError("expected ThreadBusyError")
+        except ThreadBusyError:
+            pass
+        gate.set()
+        return await first, other
+
+    assert asyncio.run(scenario()) == (1, 7)
+    assert mailbox.stats()["threads"] == 0
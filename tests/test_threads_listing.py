@@ -0,0 +1,61 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import SessionLocal, async_engine
+from app.main import app
+from app.models import Message, Thread
+
+client = TestClient(app)
+
+
+def seed_threads(seeded_thread: int, n: int) -> list[int]:
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        threads = [
+            Thread(user_id=first.user_id, assistant_id=first.assistant_id, name=f"T{i}")
+            for i in range(n)
+        ]
+        db.add_all(threads)
+        db.flush()
+        for i, thread in enumerate(threads):
+            db.add_all(
+                Message(thread_id=thread.id, ai_generated=j % 2 == 1, content=f"{i}-{j}")
+                for j in range(i)
+            )
+        db.commit()
+        return [seeded_thread] + [t.id for t in threads]
+
+
+def test_pages_never_touch_messages(seeded_thread):
+    ids = seed_threads(seeded_thread, 4)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        page = client.get("/threads/1", params={"limit": 3}).json()
+        older = client.get(
+            "/threads/1", params={"limit": 3, "before_id": page["next_cursor"]}
+        ).json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    assert [t["id"] for t in page["data"]] == ids[::-1][:3]
+    assert [t["id"] for t in older["data"]] == ids[::-1][3:]
+    assert older["next_cursor"] is None
+    assert len(statements) == 2
+    assert not any("messages" in s for s in statements)
+
+
+def test_preview_and_count(seeded_thread):
+    ids = seed_threads(seeded_thread, 3)
+
+    data = client.get("/threads/1", params={"include_preview": True}).json()["data"]
+    by_id = {t["id"]: t for t in data}
+
+    assert by_id[ids[0]]["n_messages"] == 0
+    assert by_id[ids[0]]["last_message"] is None
+    assert by_id[ids[3]]["n_messages"] == 2
+    assert by_id[ids[3]]["last_message"] == {"content": "2-1", "ai_generated": True}
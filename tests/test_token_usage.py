@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.ai_cores import bc_graph
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message, Thread, TokenUsage
+
+
+async def metered_model(inputs):
+    n_history = len(inputs["history"])
+    usage = {"input_tokens": 100 + n_history, "output_tokens": 7, "total_tokens": 107 + n_history}
+    return AIMessage(content="ok", usage_metadata=usage)
+
+
+def test_usage_is_recorded_per_message_and_rolled_up(seeded_thread, monkeypatch):
+    monkeypatch.setattr(bc_graph, "chat_chain", RunnableLambda(metered_model))
+    with SessionLocal() as db:
+        first = db.get(Thread, seeded_thread)
+        other = Thread(user_id=first.user_id, assistant_id=first.assistant_id, name="T2")
+        db.add(other)
+        db.commit()
+        other_id, user_id, assistant_id = other.id, first.user_id, first.assistant_id
+
+    with TestClient(app) as client:
+        for thread_id, text in [(seeded_thread, "a"), (seeded_thread, "b"), (other_id, "c")]:
+            response = client.post("/chat/", json={"thread_id": thread_id, "input_message": text})
+            assert response.status_code == 200
+
+        thread = client.get(f"/usage/threads/{seeded_thread}").json()["data"]
+        # Aggregates do not flush the writer; reading a thread flushes it.
+        client.get(f"/usage/threads/{other_id}")
+        user = client.get(f"/usage/users/{user_id}").json()["data"]
+        assistant = client.get(f"/usage/assistants/{assistant_id}").json()["data"]
+        top = client.get("/usage/threads", params={"limit": 1}).json()["data"]
+        future = client.get(
+            f"/usage/users/{user_id}",
+            params={"start": (datetime.now() + timedelta(hours=2)).isoformat()},
+        ).json()["data"]
+
+    with SessionLocal() as db:
+        rows = db.query(Message).filter(Message.thread_id == seeded_thread)
+        n_tokens = [m.n_tokens for m in rows.order_by(Message.id)]
+        assert db.query(TokenUsage).count() == 2
+
+    # Human rows carry the prompt tokens, AI rows the completion tokens.
+    assert n_tokens == [100, 7, 102, 7]
+    assert thread == {
+        "prompt_tokens": 202, "completion_tokens": 14, "total_tokens": 216, "n_calls": 2
+    }
+    assert user["n_calls"] == assistant["n_calls"] == 3
+    assert user["prompt_tokens"] == 302
+    assert top == [{"thread_id": seeded_thread, **thread}]
+    assert future["n_calls"] == 0
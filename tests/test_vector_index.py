@@ -0,0 +1,138 @@
+import asyncio
+
+import numpy as np
+
+from app.ai_cores.embeddings import HashingEmbedder, get_embedder
+from app.ai_cores.retrieval import RetrieverRegistry
+from app.ai_cores.segments import append_segment, open_index
+from app.ai_cores.vector_index import (
+    Chunk,
+    VectorIndex,
+    build_index,
+    lock_file,
+    unlock_file,
+)
+from app.core.config import settings
+
+TOPICS = [
+    "setup slack is the required time minus the data arrival time",
+    "hold violations are fixed by inserting delay cells on the short path",
+    "clock tree synthesis balances insertion delay across the sinks",
+    "the floorplan places macros along the die boundary",
+    "static IR drop is checked against the power grid budget",
+]
+
+
+def make_chunks(n_per_topic: int) -> list[Chunk]:
+    return [
+        Chunk(f"{topic} variant {i}", source=f"doc{t}.pdf", page=i, file_id=t)
+        for t, topic in enumerate(TOPICS)
+        for i in range(n_per_topic)
+    ]
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = get_embedder("hashing-64")
+    first = embedder.embed(["Setup slack", "hold time", ""])
+    again = HashingEmbedder(64).embed(["setup SLACK", "hold time", ""])
+    assert first.shape == (3, 64) and first.dtype == np.float32
+    assert np.array_equal(first, again)
+    assert np.allclose(np.linalg.norm(first[:2], axis=1), 1)
+    assert not first[2].any()
+
+
+def test_search_finds_the_matching_chunks(tmp_path):
+    path = str(tmp_path / "docs")
+    meta = build_index(path, make_chunks(20), HashingEmbedder(128), n_lists=0)
+    assert meta["count"] == 100
+    index = VectorIndex.open(path)
+
+    results = index.search("how do I fix hold violations", 3)
+    assert len(results) == 3
+    assert all(result.source == "doc1.pdf" for result in results)
+    assert results[0].score >= results[1].score >= results[2].score
+
+    batch = index.search_batch([TOPICS[2], TOPICS[4]], 2)
+    assert [r.source for r in batch[0]] == ["doc2.pdf"] * 2
+    assert [r.source for r in batch[1]] == ["doc4.pdf"] * 2
+    assert batch[0] == index.search(TOPICS[2], 2)
+
+    scores, ids = index.search_vectors(index.embedder.embed(["delay cells"]), 200)
+    assert scores.shape == (1, 200) and (ids[0, 100:] == -1).all()
+
+
+def test_partitions_agree_with_an_exact_scan(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 32)).astype(np.float32)
+    vectors = centers[rng.integers(0, 20, 5000)] + 0.3 * rng.standard_normal((5000, 32))
+
+    class VectorEmbedder:
+        name, dim = "test-vectors", 32
+
+        def embed(self, texts):
+            return vectors[[int(text) for text in texts]].astype(np.float32)
+
+    path = str(tmp_path / "vectors")
+    chunks = (Chunk(str(i)) for i in range(len(vectors)))
+    build_index(path, chunks, VectorEmbedder(), n_lists=50)
+    index = VectorIndex.open(path, embedder=VectorEmbedder())
+    assert len(index.centroids) == 50 and index.lists[-1] == 5000
+
+    queries = vectors[:200]
+    _, exact = index.search_vectors(queries, 10, n_probe=50)
+    _, probed = index.search_vectors(queries, 10, n_probe=8)
+    # A row's own partition is always probed, so it finds itself first.
+    assert (probed[:, 0] == np.arange(200)).all()
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact, probed)])
+    assert recall > 0.9
+
+
+def test_rebuild_keeps_open_readers(tmp_path):
+    path = str(tmp_path / "docs")
+    build_index(path, make_chunks(5))
+    old = VectorIndex.open(path)
+    build_index(path, make_chunks(2)[:2], HashingEmbedder(64))
+
+    assert old.embedder.name == settings.RETRIEVAL_EMBEDDER
+    assert len(old) == 25 and old.search(TOPICS[0], 1)[0].source == "doc0.pdf"
+    assert len(VectorIndex.open(path)) == 2
+    results = asyncio.run(old.asearch(TOPICS[3], 2))
+    assert [r.page for r in results] and all(r.source == "doc3.pdf" for r in results)
+
+
+def test_registry_loads_by_name_and_follows_new_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RETRIEVAL_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RETRIEVAL_STALE_CHECK_SECONDS", 0)
+    registry = RetrieverRegistry()
+    assert registry.get("docs") is None
+
+    embedder = HashingEmbedder(256)
+    chunks = make_chunks(2)
+    append_segment(str(tmp_path / "docs"), chunks, embedder.embed([c.text for c in chunks]))
+    first = registry.get("docs")
+    assert registry.get("docs") is first and len(first) == 10
+    append_segment(str(tmp_path / "docs"), chunks[:1], embedder.embed([chunks[0].text]))
+
+    second = registry.get("docs")
+    assert second.version == first.version + 1 and len(second) == 11
+    assert second.segments[0].index is first.segments[0].index
+    assert len(open_index("docs")) == 11
+    assert registry.stats() == {"retrievers": 1, "loads": 2, "misses": 1}
+
+
+    # Between checks searches keep the snapshot without reading the manifest.
+    monkeypatch.setattr(settings, "RETRIEVAL_STALE_CHECK_SECONDS", 60)
+    append_segment(str(tmp_path / "docs"), chunks[:1], embedder.embed([chunks[0].text]))
+    assert asyncio.run(registry.aget("docs")) is second
+    monkeypatch.setattr(settings, "RETRIEVAL_STALE_CHECK_SECONDS", 0)
+    assert len(asyncio.run(registry.aget("docs"))) == 12
+
+
+def test_file_locks_exclude_other_holders(tmp_path):
+    path = tmp_path / "docs.lock"
+    with open(path, "a") as first, open(path, "a") as second:
+        assert lock_file(first, blocking=False)
+        assert not lock_file(second, blocking=False)
+        unlock_file(first)
+        assert lock_file(second, blocking=False)
+        unlock_file(second)